@@ -1,5 +1,10 @@
+import time
+
 __version__ = '2.18.0'
 
+# When shub started to be imported, see shub.profiling
+IMPORT_START = time.perf_counter()
+
 
 # Links to documentation to use over the project sources
 DOCS_LINK = "https://shub.readthedocs.io/en/stable/"
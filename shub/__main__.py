@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import sys
 
@@ -8,4 +9,7 @@ prog_name = os.path.basename(sys.argv and sys.argv[0] or __file__)
 if prog_name == '__main__.py':
     # shub invoked via python -m shub
     prog_name = __package__
+# Let worker processes (see shub.export.map_in_processes) start from the frozen
+# binary
+multiprocessing.freeze_support()
 shub.tool.cli(prog_name=prog_name)
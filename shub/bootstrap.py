@@ -11,6 +11,7 @@ from io import BytesIO
 
 from shub.exceptions import (
     BadParameterException, NotFoundException, RemoteErrorException)
+from shub.utils import get_http_session
 
 
 EXAMPLE_REPO = "scrapinghub/custom-images-examples"
@@ -77,7 +78,7 @@ def cli(project, target_dir):
 
 def get_available_projects():
     try:
-        resp = requests.get(AVAILABLE_PROJECTS_URL)
+        resp = get_http_session().get(AVAILABLE_PROJECTS_URL)
         resp.raise_for_status()
     except (requests.HTTPError, requests.ConnectionError) as e:
         raise RemoteErrorException(
@@ -101,7 +102,7 @@ def list_projects(projects):
 
 def get_repo_zip(repo):
     zip_url = "https://github.com/%s/archive/master.zip" % repo
-    resp = requests.get(zip_url)
+    resp = get_http_session().get(zip_url)
     return zipfile.ZipFile(BytesIO(resp.content))
 
 
@@ -0,0 +1,413 @@
+"""
+On-disk cache of the data of finished jobs.
+
+Once a job has finished, its items, log entries and requests never change, so
+they can be served from disk instead of being fetched again. Each cached job
+resource lives in its own directory, holding:
+
+* ``data.gz``: the resource's JSON lines, in chunks of ``CACHE_CHUNK_SIZE``
+  lines, each compressed as an independent gzip member;
+* ``index.json``: the number of entries and the byte offset of each chunk, so
+  any range of entries can be read by seeking to the relevant chunks only.
+
+The index is written last, and entries are only visible once it exists. The
+cache is capped in size, evicting the least recently used entries first.
+
+Summaries of finished jobs, as listed by ``shub jobs``, are cached separately
+(see `JobListCache`), and so are the responses of read-only API calls (see
+`HTTPCache`).
+"""
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from itertools import islice
+from urllib.parse import urlsplit
+
+import click
+
+from shub.exceptions import print_warning
+
+
+# Number of JSON lines compressed together
+CACHE_CHUNK_SIZE = 1000
+# Default maximum size of the cache in bytes, can be overridden through the
+# SHUB_JOB_CACHE_SIZE environment variable
+CACHE_MAX_SIZE = 1024 ** 3
+
+# Remove leftovers of interrupted cache writes after this many seconds
+STALE_TMPDIR_AGE = 24 * 60 * 60
+
+DATA_FILENAME = 'data.gz'
+INDEX_FILENAME = 'index.json'
+
+# Number of seconds the responses of read-only API calls are served from the
+# HTTP cache before being revalidated, by URL path suffix
+HTTP_CACHE_TTLS = {
+    '/api/settings/get.json': 5 * 60,
+    '/api/eggs/list.json': 5 * 60,
+    '/api/scrapyd/listprojects.json': 10 * 60,
+    '/bootstrap_projects.yml': 24 * 60 * 60,
+}
+
+
+def get_cache_dir():
+    return os.path.join(click.get_app_dir('scrapinghub'), 'cache', 'jobs')
+
+
+def get_job_list_cache_dir():
+    return os.path.join(click.get_app_dir('scrapinghub'), 'cache', 'joblists')
+
+
+def get_http_cache_dir():
+    return os.path.join(click.get_app_dir('scrapinghub'), 'cache', 'http')
+
+
+class JobCache:
+    """Cache of finished job resources, keyed by job key and resource name."""
+
+    def __init__(self, path=None, max_size=None):
+        self.path = path or get_cache_dir()
+        if max_size is None:
+            max_size = int(os.environ.get('SHUB_JOB_CACHE_SIZE',
+                                          CACHE_MAX_SIZE))
+        self.max_size = max_size
+
+    def _entry_path(self, job_key, resource):
+        return os.path.join(self.path, *job_key.split('/'), resource)
+
+    def get(self, job_key, resource):
+        """
+        Return a `CachedResource` for the given job resource (e.g. 'items'),
+        or `None` if it is not cached.
+        """
+        path = self._entry_path(job_key, resource)
+        try:
+            cached = CachedResource(path)
+        except (OSError, ValueError):
+            return None
+        # Mark as recently used
+        os.utime(os.path.join(path, INDEX_FILENAME))
+        return cached
+
+    def writer(self, job_key, resource):
+        """
+        Return a `CacheWriter` filling the cache for the given job resource.
+        The data only becomes available once the writer is committed.
+        """
+        return CacheWriter(self, self._entry_path(job_key, resource))
+
+    def _iter_entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            if INDEX_FILENAME in filenames:
+                index_path = os.path.join(dirpath, INDEX_FILENAME)
+                try:
+                    yield (os.path.getmtime(index_path),
+                           os.path.getsize(os.path.join(dirpath, DATA_FILENAME)),
+                           dirpath)
+                except OSError:
+                    pass
+
+    def evict(self):
+        """
+        Remove least recently used entries until under the size cap, as well
+        as stale leftovers of interrupted writes.
+        """
+        for name in os.listdir(self.path):
+            tmpdir = os.path.join(self.path, name)
+            try:
+                if (name.startswith('.tmp-') and time.time() -
+                        os.path.getmtime(tmpdir) > STALE_TMPDIR_AGE):
+                    shutil.rmtree(tmpdir, ignore_errors=True)
+            except OSError:
+                pass
+        entries = sorted(self._iter_entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            size -= entry_size
+
+
+class CachedResource:
+    """Read access to a cached job resource."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILENAME)) as f:
+            index = json.load(f)
+        self.total = index['total']
+        self.chunk_size = index['chunk_size']
+        self.offsets = index['offsets']
+
+    def iter_lines(self, start=0, stop=None):
+        """Yield the JSON lines of the entries `start` to `stop - 1`."""
+        stop = self.total if stop is None else min(stop, self.total)
+        start = max(start, 0)
+        if start >= stop:
+            return
+        first_chunk = start // self.chunk_size
+        last_chunk = (stop - 1) // self.chunk_size
+        with open(os.path.join(self.path, DATA_FILENAME), 'rb') as f:
+            f.seek(self.offsets[first_chunk])
+            for chunk_nr in range(first_chunk, last_chunk + 1):
+                data = f.read(self.offsets[chunk_nr + 1] -
+                              self.offsets[chunk_nr])
+                # Not splitlines(), which also splits on characters that JSON
+                # strings may contain
+                lines = zlib.decompress(data, wbits=31).decode('utf-8')
+                lines = lines.split('\n')[:-1]
+                chunk_start = chunk_nr * self.chunk_size
+                yield from lines[max(start - chunk_start, 0):
+                                 stop - chunk_start]
+
+
+class CacheWriter:
+    """
+    Write a job resource into the cache. Data is written to a temporary
+    directory which replaces the cache entry on `commit`. Writing stops
+    silently once the data outgrows the cache size.
+    """
+
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path
+        os.makedirs(cache.path, exist_ok=True)
+        self._tmpdir = tempfile.mkdtemp(prefix='.tmp-', dir=cache.path)
+        self._data = open(os.path.join(self._tmpdir, DATA_FILENAME), 'wb')
+        self._chunk = []
+        self._offsets = [0]
+        self.total = 0
+        self.too_large = False
+
+    def write(self, json_line):
+        if self.too_large:
+            return
+        self._chunk.append(json_line)
+        self.total += 1
+        if len(self._chunk) >= CACHE_CHUNK_SIZE:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        compressor = zlib.compressobj(wbits=31)
+        data = compressor.compress(
+            ('\n'.join(self._chunk) + '\n').encode('utf-8'))
+        data += compressor.flush()
+        self._data.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._chunk = []
+        if self._offsets[-1] > self.cache.max_size:
+            self.too_large = True
+
+    def commit(self):
+        if self._chunk:
+            self._write_chunk()
+        self._data.close()
+        if self.too_large:
+            self.abort()
+            return
+        with open(os.path.join(self._tmpdir, INDEX_FILENAME), 'w') as f:
+            json.dump({'total': self.total, 'chunk_size': CACHE_CHUNK_SIZE,
+                       'offsets': self._offsets}, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            os.rename(self._tmpdir, self.path)
+        except OSError:
+            # Filled concurrently by another process
+            self.abort()
+            return
+        self.cache.evict()
+
+    def abort(self):
+        try:
+            self._data.close()
+        except OSError:
+            # Flushing fails as writing did, e.g. on a full disk
+            pass
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class JobListCache:
+    """
+    Cache of the summaries of the finished jobs of a project that match some
+    listing filters (e.g. a spider name), newest first.
+
+    Finished jobs do not change, so once cached, only the jobs that finished
+    since the most recent cached one (the high-water mark) need to be fetched.
+    Each listing is cached in a JSON lines file whose first line holds the
+    high-water mark and the start of the cached time range.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_job_list_cache_dir()
+
+    def _file_path(self, project_id, filters):
+        digest = hashlib.sha1(
+            json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.path,
+                            '{}-{}.jl'.format(project_id, digest[:16]))
+
+    def iter_finished(self, fetch, project_id, filters, since=None,
+                      until=None):
+        """
+        Yield the summaries of the finished jobs of the given project and
+        filters, newest first, within the `since` to `until` time range (in
+        milliseconds, both optional).
+
+        `fetch` is called with a start timestamp (or `None`), and must return
+        the summaries of the matching jobs that finished from then on, newest
+        first. Jobs fetched anew are yielded as they come in, and cached once
+        they all have been, before the cached ones are yielded.
+        """
+        path = self._file_path(project_id, filters)
+        header = _read_header(path)
+        if header and (header['since'] is None or
+                       since is not None and since >= header['since']):
+            fetch_since = header['hwm']
+        else:
+            # The cache does not hold the older jobs we need
+            header = None
+            fetch_since = since
+        fetched = []
+        fetched_keys = set()
+        hwm = header['hwm'] if header else 0
+        for summary in fetch(fetch_since):
+            fetched.append(json.dumps(summary))
+            fetched_keys.add(summary['key'])
+            hwm = max(hwm, _job_ts(summary))
+            if _in_range(summary, since, until):
+                yield summary
+        new_header = {'hwm': hwm,
+                      'since': header['since'] if header else since}
+        try:
+            self._write(path, new_header, fetched, fetched_keys,
+                        path if header else None)
+        except OSError as e:
+            print_warning("Cannot write to the job list cache ({}), not "
+                          "caching this listing".format(e))
+            if header:
+                for line in _iter_cached_lines(path):
+                    summary = json.loads(line)
+                    if (summary['key'] not in fetched_keys and
+                            _in_range(summary, since, until)):
+                        yield summary
+            return
+        for line in islice(_iter_cached_lines(path), len(fetched), None):
+            summary = json.loads(line)
+            if _in_range(summary, since, until):
+                yield summary
+
+    def _write(self, path, header, fetched, fetched_keys, cached_path=None):
+        tmp_path = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.path)
+            with open(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header) + '\n')
+                for line in fetched:
+                    f.write(line + '\n')
+                if cached_path:
+                    for line in _iter_cached_lines(cached_path):
+                        if json.loads(line)['key'] not in fetched_keys:
+                            f.write(line + '\n')
+            os.replace(tmp_path, path)
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class HTTPCache:
+    """
+    Cache of the responses of read-only API calls, keyed by method, URL
+    (including its query string) and credentials. Keys are hashed, so that
+    API keys are never written to disk.
+
+    Responses are served from the cache for the TTL of their endpoint (see
+    `HTTP_CACHE_TTLS`). Once expired, responses that came with an ETag are
+    kept, so that they can be revalidated rather than fetched again.
+    """
+
+    def __init__(self, path=None, ttls=None):
+        self.path = path or get_http_cache_dir()
+        self.ttls = HTTP_CACHE_TTLS if ttls is None else ttls
+
+    def ttl(self, url):
+        """Return the TTL of the endpoint of `url`, or None if not cached."""
+        path = urlsplit(url).path
+        for suffix, ttl in self.ttls.items():
+            if path.endswith(suffix):
+                return ttl
+        return None
+
+    def key(self, method, url, credentials=None):
+        return hashlib.sha256('\n'.join(
+            (method, url, credentials or '')).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached entry with the given key, a dict holding the
+        ``expires`` timestamp, ``etag``, ``headers`` and ``content`` of the
+        response, or `None` if there is none.
+        """
+        try:
+            with open(os.path.join(self.path, key + '.json'),
+                      encoding='utf-8') as f:
+                entry = json.load(f)
+            entry['content'] = base64.b64decode(entry['content'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return entry
+
+    def set(self, key, entry):
+        """
+        Store `entry` (see `get`) under the given key. This is best-effort:
+        nothing is stored if the cache directory cannot be written.
+        """
+        entry = dict(entry, content=base64.b64encode(
+            entry['content']).decode('ascii'))
+        tmp_path = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.path)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, os.path.join(self.path, key + '.json'))
+        except OSError:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+
+def _job_ts(summary):
+    return summary.get('ts') or summary.get('finished_time') or 0
+
+
+def _in_range(summary, since, until):
+    ts = _job_ts(summary)
+    return (since is None or ts >= since) and (until is None or ts <= until)
+
+
+def _read_header(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+        return {'hwm': header['hwm'], 'since': header['since']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _iter_cached_lines(path):
+    with open(path, encoding='utf-8') as f:
+        # Skip the header
+        next(f, None)
+        for line in f:
+            yield line.rstrip('\n')
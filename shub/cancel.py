@@ -1,9 +1,13 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
 import click
 
 from scrapinghub import ScrapinghubAPIError
 from scrapinghub.client.utils import parse_job_key
 
-from shub.utils import get_scrapinghub_client_from_config
+from shub.utils import get_scrapinghub_client_from_config, select_job_specs
 from shub.config import get_target_conf
 from shub.exceptions import (
     ShubException,
@@ -25,6 +29,13 @@ project (as defined in scrapinghub.yml):
 
     shub cancel 1/1 1/2 1/3
 
+Instead of listing job keys, you can select the running and pending
+jobs to cancel by spider, tags, state, and age:
+
+    shub cancel 12345 --spider myspider --state pending --older-than 2h
+
+Use --dry-run to only count the selected jobs.
+
 The cancel command requires a confirmation that could be skipped
 with the flag --force/-f:
 
@@ -34,47 +45,137 @@ with the flag --force/-f:
 
 SHORT_HELP = "Cancel multiple jobs from Scrapy Cloud"
 
+CANCEL_STATES = ('running', 'pending')
+# Number of jobs cancelled per request
+CANCEL_BATCH_SIZE = 1000
+# Number of requests to cancel jobs sent at once
+CANCEL_CONCURRENCY = 4
+# Number of times a request to cancel jobs is retried after a server error or
+# being throttled
+CANCEL_RETRIES = 5
+
+_DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days',
+                   'w': 'weeks'}
+
+
+def _parse_duration(ctx, param, value):
+    if value is None:
+        return None
+    match = re.match(r'^(\d+)([smhdw])$', value)
+    if not match:
+        raise BadParameterException(
+            'Durations must be given as a number followed by s, m, h, d or w, '
+            'e.g. 2h', param_hint='older-than')
+    return timedelta(**{_DURATION_UNITS[match.group(2)]: int(match.group(1))})
+
 
 @click.command(help=HELP, short_help=SHORT_HELP)
-@click.argument("target_or_key")
+@click.argument("target_or_key", required=False)
 @click.argument("keys", nargs=-1)
 @click.option('--force', '-f', is_flag=True,
               help='It ignores the confirmation prompt')
-def cli(target_or_key, keys, force):
+@click.option('--spider', help='select the jobs of this spider')
+@click.option('--tag', multiple=True, help='select jobs with this tag')
+@click.option('--state', multiple=True, type=click.Choice(CANCEL_STATES),
+              help='select jobs in this state (default: running and pending)')
+@click.option('--older-than', callback=_parse_duration, metavar='DURATION',
+              help='select jobs that have been in their state for longer than '
+                   'this, e.g. 30m, 2h or 1d')
+@click.option('--dry-run', is_flag=True,
+              help='count the selected jobs without cancelling them')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1),
+              default=CANCEL_CONCURRENCY,
+              help='send up to N cancel requests at once')
+def cli(target_or_key, keys, force, spider, tag, state, older_than, dry_run,
+        concurrency):
     # target_or_key contains a target or just another job key
-    if "/" in target_or_key:
+    if target_or_key and "/" in target_or_key:
         keys = (target_or_key,) + keys
         target = "default"
     else:
-        target = target_or_key
+        target = target_or_key or "default"
+    selectors = spider or tag or state or older_than
+    if selectors and keys:
+        raise BadParameterException(
+            'Job keys cannot be combined with job selectors',
+            param_hint='keys')
+    if not selectors and not keys:
+        raise BadParameterException('Please provide job keys or selectors',
+                                    param_hint='keys')
 
     targetconf = get_target_conf(target)
     project_id = targetconf.project_id
-    client = get_scrapinghub_client_from_config(targetconf)
+    client = get_scrapinghub_client_from_config(
+        targetconf, pool_size=concurrency, retries=CANCEL_RETRIES)
     project = client.get_project(project_id)
 
-    try:
-        job_keys = [validate_job_key(project_id, key) for key in keys]
-    except (BadParameterException, SubcommandException) as err:
-        click.echo('Error during keys validation: %s' % str(err))
-        exit(1)
+    if selectors:
+        until = None
+        if older_than:
+            until = datetime.now(timezone.utc) - older_than
+        job_keys = [key for key, _ in select_job_specs(
+            target, spider, tag, state or CANCEL_STATES, until=until)]
+    else:
+        try:
+            job_keys = [str(validate_job_key(project_id, key))
+                        for key in keys]
+        except (BadParameterException, SubcommandException) as err:
+            click.echo('Error during keys validation: %s' % str(err))
+            exit(1)
+
+    if dry_run:
+        click.echo('%s jobs would be cancelled' % len(job_keys))
+        return
+    if not job_keys:
+        click.echo('No jobs to cancel')
+        return
 
     if not force:
-        jobs_str = ", ".join([str(job) for job in job_keys])
+        if selectors:
+            jobs_str = ", ".join(job_keys[:10])
+            if len(job_keys) > 10:
+                jobs_str += ", ..."
+        else:
+            jobs_str = ", ".join(job_keys)
         click.confirm(
             'Do you want to cancel these %s jobs? \n\n%s \n\nconfirm?'
             % (len(job_keys), jobs_str),
             abort=True
         )
 
+    cancelled = 0
     try:
-        output = project.jobs.cancel(
-            keys=[str(job) for job in job_keys]
-        )
+        for count in cancel_jobs(project, job_keys, concurrency=concurrency):
+            cancelled += count
+            if len(job_keys) > CANCEL_BATCH_SIZE:
+                click.echo('Cancelled %s of %s jobs' % (cancelled,
+                                                        len(job_keys)),
+                           err=True)
     except (ValueError, ScrapinghubAPIError) as err:
         raise ShubException(str(err))
 
-    click.echo(output)
+    click.echo({'count': cancelled})
+
+
+def cancel_jobs(project, job_keys, batch_size=None,
+                concurrency=CANCEL_CONCURRENCY):
+    """
+    Cancel the jobs of a python-scrapinghub `project` with the given keys,
+    in batches of `batch_size` jobs, sending up to `concurrency` requests at
+    once. Yield the number of jobs cancelled by each request as it completes.
+    """
+    batch_size = batch_size or CANCEL_BATCH_SIZE
+    batches = [job_keys[start:start + batch_size]
+               for start in range(0, len(job_keys), batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(project.jobs.cancel, keys=batch)
+                   for batch in batches]
+        try:
+            for future in as_completed(futures):
+                yield future.result()['count']
+        finally:
+            for future in futures:
+                future.cancel()
 
 
 def validate_job_key(project_id, short_key):
@@ -2,12 +2,13 @@ import os
 from urllib.parse import urljoin
 from tempfile import mkdtemp
 import click
-import requests
 from shutil import rmtree
 
 from shub.config import get_target_conf
 from shub.fetch_eggs import fetch_eggs
-from shub.utils import decompress_egg_files, _deploy_dependency_egg
+from shub.utils import (
+    decompress_egg_files, get_http_session, _deploy_dependency_egg,
+)
 
 SHORT_HELP = "Sync eggs from one project with other project"
 
@@ -66,8 +67,8 @@ def copy_eggs(project, endpoint, apikey, new_project, new_endpoint, new_apikey,
 def get_eggs_versions(project, endpoint, apikey):
     click.echo(f'Getting eggs list from project {project}...')
     list_endpoint = urljoin(endpoint, "eggs/list.json")
-    response = requests.get(list_endpoint, params={"project": project},
-                            auth=(apikey, ''))
+    response = get_http_session().get(
+        list_endpoint, params={"project": project}, auth=(apikey, ''))
     response.raise_for_status()
     obj = response.json()
     return {x['name']: x['version'] for x in obj['eggs']}
@@ -0,0 +1,271 @@
+"""
+Comparison of the items of two jobs for ``shub items --diff``. Items are
+matched through a key field with an external hash join: both jobs are streamed
+into on-disk buckets according to the hash of their key, and the buckets are
+then compared one at a time, so that only a single bucket of one job is held
+in memory. Buckets that still hold more than `DIFF_BUCKET_SIZE` items are split
+again, with another hash, before being compared.
+"""
+import hashlib
+import json
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from shub.exceptions import print_warning
+
+
+# Number of items per bucket to aim for
+DIFF_BUCKET_SIZE = 50000
+# Maximum number of buckets, each of which is an open file for both jobs while
+# partitioning
+DIFF_MAX_BUCKETS = 256
+# Maximum number of times a bucket is split again. Buckets only stay too large
+# at that point if they hold many items with the same key
+DIFF_MAX_SPLITS = 3
+# Number of added, removed and changed items reported
+DIFF_SAMPLE_SIZE = 5
+
+
+def bucket_count(items_count):
+    """Return the number of buckets to partition jobs of `items_count` items."""
+    return min(max(1, math.ceil(items_count / DIFF_BUCKET_SIZE)),
+               DIFF_MAX_BUCKETS)
+
+
+class ItemsDiff:
+    """
+    Added, removed, changed and unchanged item counts between two jobs, whose
+    items are matched through their `key` field, with samples of the
+    differences and the number of changes of every field.
+    """
+
+    def __init__(self, key, job_keys):
+        self.key = key
+        self.job_keys = job_keys
+        self.items = [0, 0]
+        self.missing_key = [0, 0]
+        self.duplicate_keys = [0, 0]
+        self.added = 0
+        self.removed = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.changed_fields = {}
+        self.samples = {'added': [], 'removed': [], 'changed': []}
+
+    def _sample(self, kind, entry):
+        if len(self.samples[kind]) < DIFF_SAMPLE_SIZE:
+            self.samples[kind].append(entry)
+
+    def compare_buckets(self, path_a, path_b):
+        """Compare the items of the two bucket files of the same hashes."""
+        lines_a = {}
+        for key_json, line in _read_bucket(path_a):
+            if key_json in lines_a:
+                self.duplicate_keys[0] += 1
+            else:
+                lines_a[key_json] = line
+        seen_b = set()
+        for key_json, line in _read_bucket(path_b):
+            if key_json in seen_b:
+                self.duplicate_keys[1] += 1
+                continue
+            seen_b.add(key_json)
+            old_line = lines_a.pop(key_json, None)
+            if old_line is None:
+                self.added += 1
+                self._sample('added', line)
+            elif old_line == line:
+                self.unchanged += 1
+            else:
+                self._compare_items(json.loads(old_line), json.loads(line))
+        for line in lines_a.values():
+            self.removed += 1
+            self._sample('removed', line)
+
+    def _compare_items(self, old, new):
+        changes = {
+            field: [old.get(field), new.get(field)]
+            for field in sorted(set(old) | set(new))
+            if old.get(field) != new.get(field)
+        }
+        if not changes:
+            self.unchanged += 1
+            return
+        self.changed += 1
+        for field in changes:
+            self.changed_fields[field] = self.changed_fields.get(field, 0) + 1
+        self._sample('changed', {'key': old[self.key], 'changes': changes})
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'jobs': {
+                job_key: {
+                    'items': self.items[i],
+                    'missing_key': self.missing_key[i],
+                    'duplicate_keys': self.duplicate_keys[i],
+                }
+                for i, job_key in enumerate(self.job_keys)
+            },
+            'added': self.added,
+            'removed': self.removed,
+            'changed': self.changed,
+            'unchanged': self.unchanged,
+            'changed_fields': dict(sorted(self.changed_fields.items(),
+                                          key=lambda item: -item[1])),
+            'samples': {
+                'added': [json.loads(line) for line in self.samples['added']],
+                'removed': [json.loads(line)
+                            for line in self.samples['removed']],
+                'changed': self.samples['changed'],
+            },
+        }
+
+    def format_table(self):
+        diff = self.to_dict()
+        lines = ['Key: {}'.format(self.key), '',
+                 '{:<16}'.format('') + ''.join(
+                     '{:>16}'.format(job_key) for job_key in self.job_keys)]
+        for label, name in (('Items', 'items'), ('Missing key', 'missing_key'),
+                            ('Duplicate keys', 'duplicate_keys')):
+            lines.append('{:<16}'.format(label) + ''.join(
+                '{:>16,}'.format(stats[name])
+                for stats in diff['jobs'].values()))
+        lines.append('')
+        for name in ('added', 'removed', 'changed', 'unchanged'):
+            lines.append('{:<16}{:>16,}'.format(name.capitalize(), diff[name]))
+        if diff['changed_fields']:
+            lines += ['', '{:<30} {:>12}'.format('Field', 'Changes')]
+            for field, count in diff['changed_fields'].items():
+                lines.append('{:<30} {:>12,}'.format(field, count))
+        for name in ('added', 'removed', 'changed'):
+            if diff['samples'][name]:
+                lines += ['', '{} items (sample)'.format(name.capitalize())]
+                lines += [json.dumps(entry)
+                          for entry in diff['samples'][name]]
+        return '\n'.join(lines)
+
+
+def _key_hash(key_json, level=0):
+    # Salted by level, so that splitting a bucket again spreads its items
+    return int.from_bytes(hashlib.blake2b(
+        key_json.encode('utf-8'), digest_size=8,
+        salt=level.to_bytes(8, 'big')).digest(), 'big')
+
+
+def _partition(json_lines, key, paths):
+    """
+    Write every item holding the `key` field as a JSON line, prefixed with the
+    JSON encoding of its key and a tab, to the bucket file its key hashes to.
+    Return the number of items, the number of items without that field, and
+    the number of items written to every bucket.
+
+    Meta fields (prefixed with ``_``, such as the job-specific ``_key``) other
+    than `key` are dropped, as they differ between jobs for identical items.
+    """
+    files = []
+    counts = [0] * len(paths)
+    items = missing = 0
+    try:
+        for path in paths:
+            files.append(open(path, 'w', encoding='utf-8'))
+        for line in json_lines:
+            items += 1
+            item = json.loads(line)
+            if key not in item:
+                missing += 1
+                continue
+            # JSON encoding escapes tabs and newlines
+            key_json = json.dumps(item[key], sort_keys=True)
+            item = {field: value for field, value in item.items()
+                    if field == key or not field.startswith('_')}
+            idx = _key_hash(key_json) % len(files)
+            files[idx].write('{}\t{}\n'.format(key_json, json.dumps(item)))
+            counts[idx] += 1
+    finally:
+        for f in files:
+            f.close()
+    return items, missing, counts
+
+
+def _split_bucket(path, paths, level):
+    """
+    Move the lines of the bucket file at `path` to the bucket files at `paths`
+    according to the hash of their key at the given split `level`, and return
+    the number of lines written to every bucket.
+    """
+    files = []
+    counts = [0] * len(paths)
+    try:
+        for sub_path in paths:
+            files.append(open(sub_path, 'w', encoding='utf-8'))
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                key_json = line.partition('\t')[0]
+                idx = _key_hash(key_json, level) % len(files)
+                files[idx].write(line)
+                counts[idx] += 1
+    finally:
+        for f in files:
+            f.close()
+    os.remove(path)
+    return counts
+
+
+def _read_bucket(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            key_json, _, item_line = line.rstrip('\n').partition('\t')
+            yield key_json, item_line
+
+
+def _compare_bucket_pair(diff, path_a, path_b, count_a, level=0):
+    """
+    Compare two bucket files, first splitting them if the one of the first job
+    (`count_a` items, which are held in memory) is over `DIFF_BUCKET_SIZE`.
+    """
+    if count_a <= DIFF_BUCKET_SIZE or level >= DIFF_MAX_SPLITS:
+        diff.compare_buckets(path_a, path_b)
+        return
+    level += 1
+    buckets = bucket_count(count_a)
+    sub_paths = [['{}.{}'.format(path, i) for i in range(buckets)]
+                 for path in (path_a, path_b)]
+    counts_a = _split_bucket(path_a, sub_paths[0], level)
+    _split_bucket(path_b, sub_paths[1], level)
+    for sub_path_a, sub_path_b, sub_count_a in zip(*sub_paths, counts_a):
+        _compare_bucket_pair(diff, sub_path_a, sub_path_b, sub_count_a, level)
+
+
+def diff_items(json_lines_a, json_lines_b, key, job_keys, buckets=1):
+    """
+    Compare two iterables of items given as JSON lines, matching items through
+    their `key` field, and return an `ItemsDiff`.
+
+    Both iterables are consumed concurrently and partitioned into `buckets`
+    temporary files each (see `bucket_count`), which are split again while
+    larger than `DIFF_BUCKET_SIZE`, so that memory usage is bounded by that
+    size rather than by the number of items.
+    """
+    diff = ItemsDiff(key, job_keys)
+    with tempfile.TemporaryDirectory(prefix='shub-diff-') as tmpdir:
+        paths = [[os.path.join(tmpdir, '{}-{}.jl'.format(side, i))
+                  for i in range(buckets)] for side in ('a', 'b')]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(_partition, json_lines, key, side_paths)
+                for json_lines, side_paths in zip(
+                    (json_lines_a, json_lines_b), paths)
+            ]
+            results = [future.result() for future in futures]
+        for i, (items, missing, _) in enumerate(results):
+            diff.items[i], diff.missing_key[i] = items, missing
+        for path_a, path_b, count_a in zip(*paths, results[0][2]):
+            _compare_bucket_pair(diff, path_a, path_b, count_a)
+    for job_key, missing in zip(job_keys, diff.missing_key):
+        if missing:
+            print_warning("{:,} items of job {} have no {} field, and were "
+                          "not compared".format(missing, job_key, key))
+    return diff
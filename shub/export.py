@@ -0,0 +1,907 @@
+"""
+Output stage shared by the commands that download job data (``shub items``,
+``shub log`` and ``shub requests``).
+"""
+import csv
+import io
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import click
+
+from shub.exceptions import (
+    BadParameterException, ShubException, print_warning,
+)
+
+
+# Flush the output once this many bytes have been buffered
+OUTPUT_BUFFER_SIZE = 256 * 1024
+# Maximum number of entries fetched ahead of the output
+PRODUCER_QUEUE_SIZE = 10000
+# Minimum number of seconds between two checkpoints of a resumable download
+CHECKPOINT_INTERVAL = 1
+# Suffix of the sidecar file holding the checkpoint of a resumable download
+STATE_FILE_SUFFIX = '.shub-state'
+# Number of items converted at once by the CSV, Parquet, Arrow and SQLite
+# writers
+EXPORT_BATCH_SIZE = 10000
+# Number of rows inserted into SQLite per transaction
+SQLITE_TRANSACTION_SIZE = 100000
+
+# Output formats, mapped to their file extension
+FORMATS = {
+    'jsonl': 'jl',
+    'jsonl.gz': 'jl.gz',
+    'jsonl.zst': 'jl.zst',
+    'csv': 'csv',
+    'parquet': 'parquet',
+    'arrow': 'arrow',
+}
+# Output formats that can be converted by worker processes
+PARALLEL_FORMATS = ('jsonl.gz', 'jsonl.zst', 'csv')
+
+_DONE = object()
+
+
+class _Failure:
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def _put(entries, obj, stopped):
+    """Put `obj` into the `entries` queue unless `stopped` gets set first."""
+    while not stopped.is_set():
+        try:
+            entries.put(obj, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class BackgroundIterator:
+    """
+    Iterate through `iterable` in a daemon thread, handing its entries over
+    through a queue holding at most `maxsize` entries. This way, fetching data
+    from the network does not stall while the consumer is busy writing it,
+    e.g. when stdout is piped into a slow process.
+
+    Exceptions raised by `iterable` are re-raised in the consumer.
+    """
+
+    def __init__(self, iterable, maxsize=PRODUCER_QUEUE_SIZE):
+        self._iterable = iterable
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        try:
+            for entry in self._iterable:
+                if not _put(self._queue, entry, self._stopped):
+                    return
+        except BaseException as exc:
+            _put(self._queue, _Failure(exc), self._stopped)
+        else:
+            _put(self._queue, _DONE, self._stopped)
+
+    def __iter__(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _DONE:
+                return
+            if isinstance(entry, _Failure):
+                raise entry.exc
+            yield entry
+
+    def has_pending(self):
+        """Return whether entries are ready to be consumed without waiting."""
+        return not self._queue.empty()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def iter_concurrently(iterables, concurrency, maxsize=PRODUCER_QUEUE_SIZE):
+    """
+    Consume up to `concurrency` of the given iterables at a time in worker
+    threads, and yield their entries as they arrive. Entries coming from the
+    same iterable keep their relative order.
+
+    Exceptions raised by any of the iterables are re-raised in the consumer.
+    """
+    iterables = list(iterables)
+    entries = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def consume(iterable):
+        try:
+            for entry in iterable:
+                if not _put(entries, entry, stopped):
+                    return
+        except BaseException as exc:
+            _put(entries, _Failure(exc), stopped)
+        else:
+            _put(entries, _DONE, stopped)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    for iterable in iterables:
+        executor.submit(consume, iterable)
+    try:
+        remaining = len(iterables)
+        while remaining:
+            entry = entries.get()
+            if entry is _DONE:
+                remaining -= 1
+            elif isinstance(entry, _Failure):
+                raise entry.exc
+            else:
+                yield entry
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def add_json_field(json_lines, name, value):
+    """
+    Insert a `name` field holding `value` at the start of every JSON object in
+    `json_lines`, without decoding them.
+    """
+    prefix = json.dumps({name: value})[:-1]
+    for line in json_lines:
+        rest = line[line.index('{') + 1:]
+        if rest.lstrip().startswith('}'):
+            yield prefix + '}'
+        else:
+            yield prefix + ', ' + rest
+
+
+def add_item_field(items, name, value):
+    """
+    Insert a `name` field holding `value` at the start of every decoded item
+    in `items`.
+    """
+    for item in items:
+        yield {name: value, **item}
+
+
+class TransferStats:
+    """Count entries and bytes written, and report throughput."""
+
+    def __init__(self):
+        self.items = 0
+        self.bytes = 0
+        self.started = time.time()
+
+    def add(self, nbytes, items=1):
+        self.items += items
+        self.bytes += nbytes
+
+    def summary(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        megabytes = self.bytes / 1024 / 1024
+        return (
+            "{:,} items ({:.2f} MB) in {:.1f}s: {:,.1f} items/s, {:.2f} MB/s"
+            "".format(self.items, megabytes, elapsed, self.items / elapsed,
+                      megabytes / elapsed)
+        )
+
+    def report(self):
+        click.echo(self.summary(), err=True)
+
+
+def write_lines(lines, stream=None, stats=False,
+                buffer_size=OUTPUT_BUFFER_SIZE, on_flush=None):
+    """
+    Write the given text lines, newline-terminated and UTF-8-encoded, to the
+    binary `stream` (stdout by default).
+
+    `lines` is consumed in a background thread (see `BackgroundIterator`), and
+    output is written in batches of up to `buffer_size` bytes. The buffer is
+    also flushed whenever no more lines are readily available, so that output
+    in follow mode is not delayed.
+
+    Return a `TransferStats` instance. If `stats` is set, its summary is also
+    printed to stderr at the end. If given, `on_flush` is called with the
+    number of lines written so far after every flush.
+    """
+    if stream is None:
+        # Don't let text written earlier end up after our output
+        sys.stdout.flush()
+        stream = sys.stdout.buffer
+    transfer_stats = TransferStats()
+    buf = bytearray()
+
+    def flush():
+        if buf:
+            stream.write(buf)
+            stream.flush()
+            buf.clear()
+            if on_flush:
+                on_flush(transfer_stats.items)
+
+    producer = BackgroundIterator(lines)
+    try:
+        for line in producer:
+            if isinstance(line, str):
+                line = line.encode('utf-8')
+            buf += line
+            buf += b'\n'
+            transfer_stats.add(len(line) + 1)
+            if len(buf) >= buffer_size or not producer.has_pending():
+                flush()
+    finally:
+        producer.stop()
+        flush()
+        if stats:
+            transfer_stats.report()
+    return transfer_stats
+
+
+def check_output_options(output, resume, tail, query=None):
+    """Validate the --output and --resume options of a download command."""
+    if resume and not output:
+        raise BadParameterException('--resume requires --output',
+                                    param_hint='resume')
+    if resume and tail is not None:
+        raise BadParameterException('--resume cannot be combined with --tail',
+                                    param_hint='resume')
+    if resume and query:
+        # Checkpoints rely on the entries being sequential
+        raise BadParameterException(
+            '--resume cannot be combined with server-side filters',
+            param_hint='resume')
+
+
+def write_lines_resumable(iter_lines, job_key, path, resume=False,
+                          stats=False):
+    """
+    Write the lines of a job resource to the file at `path` like `write_lines`
+    does, checkpointing the key of the last entry written, along with the file
+    size, to a sidecar state file as it goes.
+
+    `iter_lines` is called with the key of the entry to start after (or
+    `None`), and must return one line per entry from there on. If `resume` is
+    set and a checkpoint exists, the file is truncated to the checkpointed size
+    and the download continues after the checkpointed key. The state file is
+    removed once the download is complete.
+    """
+    state_path = path + STATE_FILE_SUFFIX
+    state = None
+    if resume:
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            if os.path.exists(path):
+                print_warning(f"No checkpoint found for {path}, starting "
+                              f"over")
+    if state and state['job'] != job_key:
+        raise BadParameterException(
+            "{} holds a download of job {}, not {}".format(
+                path, state['job'], job_key),
+            param_hint='output')
+    if state:
+        f = open(path, 'r+b')
+        f.truncate(state['offset'])
+        f.seek(state['offset'])
+        startafter = state['last_key']
+        # Entry keys are sequential: {job_key}/0, {job_key}/1, ...
+        first = int(startafter.rsplit('/', 1)[1]) + 1
+    else:
+        f = open(path, 'wb')
+        startafter = None
+        first = 0
+    last_checkpoint = 0
+
+    def checkpoint(lines_written, force=False):
+        nonlocal last_checkpoint
+        if not lines_written:
+            return
+        if not force and time.time() - last_checkpoint < CHECKPOINT_INTERVAL:
+            return
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as state_file:
+            json.dump({
+                'job': job_key,
+                'last_key': f'{job_key}/{first + lines_written - 1}',
+                'offset': f.tell(),
+            }, state_file)
+        os.replace(tmp_path, state_path)
+        last_checkpoint = time.time()
+
+    written = 0
+
+    def on_flush(lines_written):
+        nonlocal written
+        written = lines_written
+        checkpoint(lines_written)
+
+    with f:
+        try:
+            transfer_stats = write_lines(iter_lines(startafter), stream=f,
+                                         stats=stats, on_flush=on_flush)
+        except BaseException:
+            checkpoint(written, force=True)
+            raise
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
+    return transfer_stats
+
+
+def write_files(outputs, concurrency, fmt='jsonl', stats=False, workers=1,
+                columns=None):
+    """
+    Given (path, items) pairs, write each `items` iterable to the file at
+    `path` like `write_items` does, processing up to `concurrency` files at a
+    time, each through `workers` processes. If `stats` is set, a throughput
+    summary for all files is printed to stderr at the end.
+    """
+    total_stats = TransferStats()
+
+    def write_file(output):
+        path, items = output
+        with open(path, 'wb') as f:
+            return write_items(items, fmt, stream=f, workers=workers,
+                               columns=columns)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for file_stats in executor.map(write_file, outputs):
+            total_stats.add(file_stats.bytes, items=file_stats.items)
+    if stats:
+        total_stats.report()
+    return total_stats
+
+
+def format_needs_json(fmt, workers=1):
+    """
+    Return whether the given output format consumes JSON lines, as opposed to
+    decoded items. Worker processes always take JSON lines.
+    """
+    return fmt.startswith('jsonl') or workers > 1
+
+
+def write_items(items, fmt='jsonl', stream=None, stats=False, workers=1,
+                columns=None):
+    """
+    Write `items` to the binary `stream` (stdout by default) in the given
+    output format (see `FORMATS`). For JSON lines formats, `items` must be JSON
+    strings, and decoded items otherwise (see `format_needs_json`).
+
+    If `workers` is greater than one, items must be JSON strings, which are
+    decoded and converted in batches by that many processes (only for the
+    `PARALLEL_FORMATS`).
+
+    For CSV, `columns` fixes the columns, which are otherwise those of the
+    first batch of items (see `CsvItemWriter`).
+
+    Like `write_lines`, items are consumed in a background thread, and a
+    `TransferStats` instance is returned. Byte counts are those of the JSON
+    lines before compression, or those of the output for other formats.
+    """
+    if stream is None:
+        sys.stdout.flush()
+        stream = sys.stdout.buffer
+    if workers > 1:
+        return _write_items_in_processes(items, fmt, stream, stats, workers,
+                                         columns)
+    if fmt == 'jsonl':
+        return write_lines(items, stream=stream, stats=stats)
+    if format_needs_json(fmt):
+        compressed = _CompressedStream(stream, _get_compressor(fmt))
+        try:
+            return write_lines(items, stream=compressed, stats=stats)
+        finally:
+            compressed.close()
+    counting_stream = _CountingStream(stream)
+    if fmt == 'csv':
+        writer = CsvItemWriter(counting_stream, columns=columns)
+    else:
+        writer = ITEM_WRITERS[fmt](counting_stream)
+    transfer_stats = TransferStats()
+    producer = BackgroundIterator(items)
+    try:
+        for item in producer:
+            writer.write(item)
+            transfer_stats.add(0)
+        writer.close()
+    finally:
+        producer.stop()
+        transfer_stats.bytes = counting_stream.bytes
+        if stats:
+            transfer_stats.report()
+    return transfer_stats
+
+
+def map_in_processes(func, args_iter, workers):
+    """
+    Yield (args, result) pairs, where `result` is ``func(*args)`` computed by
+    one of `workers` processes, for each tuple of `args_iter`, in order. Only
+    up to twice as many calls as there are workers are submitted ahead of the
+    consumer, and `args_iter` is only advanced when submitting.
+    """
+    args_iter = iter(args_iter)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque((args, executor.submit(func, *args))
+                        for args in islice(args_iter, 2 * workers))
+        while pending:
+            args, future = pending.popleft()
+            result = future.result()
+            next_args = next(args_iter, None)
+            if next_args is not None:
+                pending.append((next_args,
+                                executor.submit(func, *next_args)))
+            yield args, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write_items_in_processes(json_lines, fmt, stream, stats, workers,
+                              columns=None):
+    if fmt not in PARALLEL_FORMATS:
+        raise BadParameterException(
+            "Only the {} formats can be converted by worker processes".format(
+                ', '.join(PARALLEL_FORMATS)),
+            param_hint='workers')
+    transfer_stats = TransferStats()
+    producer = BackgroundIterator(json_lines)
+    batches = _iter_batches(producer, EXPORT_BATCH_SIZE)
+    try:
+        if fmt == 'csv':
+            chunks = _iter_csv_in_processes(batches, workers, columns)
+        else:
+            chunks = (result for _, result in map_in_processes(
+                _compress_lines, ((fmt, batch) for batch in batches),
+                workers))
+        for data, nbytes, nitems in chunks:
+            stream.write(data)
+            transfer_stats.add(nbytes, items=nitems)
+        stream.flush()
+    finally:
+        producer.stop()
+        if stats:
+            transfer_stats.report()
+    return transfer_stats
+
+
+def _compress_lines(fmt, json_lines):
+    """
+    Compress a batch of JSON lines into an independent gzip member or zstd
+    frame, so that batches can simply be concatenated.
+    """
+    data = ('\n'.join(json_lines) + '\n').encode('utf-8')
+    compressor = _get_compressor(fmt)
+    return (compressor.compress(data) + compressor.flush(), len(data),
+            len(json_lines))
+
+
+def _encode_csv_rows(columns, json_lines):
+    """
+    Decode a batch of JSON lines into CSV rows of the given columns, as
+    `CsvItemWriter` does. Return the encoded rows, the number of lines, and
+    the fields not in `columns`, in the order they were first seen.
+    """
+    items = [json.loads(line) for line in json_lines]
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for item in items:
+        writer.writerow([CsvItemWriter._format_value(item.get(column))
+                         for column in columns])
+    known = set(columns)
+    dropped = list(dict.fromkeys(
+        key for item in items for key in item if key not in known))
+    return out.getvalue().encode('utf-8'), len(items), dropped
+
+
+def _iter_csv_in_processes(batches, workers, columns=None):
+    """
+    Yield (data, bytes, items) chunks of CSV output for the given batches of
+    JSON lines, converted by worker processes.
+
+    As with `CsvItemWriter`, the columns are the given ones, or those of the
+    first batch, and the fields first seen later on are dropped, with a
+    warning listing them.
+    """
+    first = next(batches, None)
+    if first is None:
+        return
+    if columns is None:
+        columns = list(dict.fromkeys(
+            key for line in first for key in json.loads(line)))
+    columns = tuple(columns)
+    header = io.StringIO()
+    csv.writer(header).writerow(columns)
+    header = header.getvalue().encode('utf-8')
+    dropped = {}
+
+    def iter_args():
+        yield columns, first
+        for batch in batches:
+            yield columns, batch
+
+    for _, (data, nitems, batch_dropped) in map_in_processes(
+            _encode_csv_rows, iter_args(), workers):
+        dropped.update(dict.fromkeys(batch_dropped))
+        if header:
+            data, header = header + data, None
+        yield data, len(data), nitems
+    _warn_dropped_csv_fields(dropped)
+
+
+def _warn_dropped_csv_fields(fields):
+    if fields:
+        print_warning(
+            "These fields were not among the CSV columns, and were not "
+            "exported: %s" % ', '.join(fields))
+
+
+def _get_compressor(fmt):
+    if fmt == 'jsonl.gz':
+        # wbits=31 makes zlib write a gzip header and trailer
+        return zlib.compressobj(wbits=31)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('You need the zstandard package installed to '
+                          'export items as zstd-compressed JSON lines, e.g. '
+                          'through pip install shub[zstd]')
+    return zstandard.ZstdCompressor().compressobj()
+
+
+class _CompressedStream:
+    """
+    Binary stream compressing what is written to it into `stream`. The
+    compressor is only flushed on close, so the frequent flushes done by
+    `write_lines` do not hurt the compression ratio.
+    """
+
+    def __init__(self, stream, compressor):
+        self.stream = stream
+        self.compressor = compressor
+
+    def write(self, data):
+        compressed = self.compressor.compress(bytes(data))
+        if compressed:
+            self.stream.write(compressed)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.write(self.compressor.flush())
+        self.stream.flush()
+
+
+class _CountingStream:
+    """Binary stream counting the bytes written through it to `stream`."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+        self.closed = False
+
+    def write(self, data):
+        self.bytes += len(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        self.closed = True
+
+
+class _BatchItemWriter:
+    """
+    Base class for writers converting decoded items in batches of
+    `batch_size`, so that memory usage does not depend on the job size.
+    """
+
+    def __init__(self, stream, batch_size=None):
+        self.stream = stream
+        self.batch_size = batch_size or EXPORT_BATCH_SIZE
+        self._batch = []
+
+    def write(self, item):
+        self._batch.append(item)
+        if len(self._batch) >= self.batch_size:
+            self._write_batch(self._batch)
+            self._batch = []
+
+    def close(self):
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+        self.stream.flush()
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+
+class CsvItemWriter(_BatchItemWriter):
+    """
+    Write items as CSV. The columns are the given ones, or else those of the
+    first batch of items. Fields not in the columns cannot be added to the
+    already written header row, so they are dropped, and a warning listing
+    them is printed at the end. Nested values are written as JSON.
+    """
+
+    def __init__(self, stream, batch_size=None, columns=None):
+        super().__init__(stream, batch_size)
+        self.columns = list(columns) if columns is not None else None
+        self.header_written = False
+        self.dropped = {}
+
+    def _write_batch(self, batch):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if self.columns is None:
+            self.columns = list(dict.fromkeys(k for item in batch for k in item))
+        if not self.header_written:
+            writer.writerow(self.columns)
+            self.header_written = True
+        known = set(self.columns)
+        for item in batch:
+            for key in item:
+                if key not in known:
+                    self.dropped[key] = None
+            writer.writerow([self._format_value(item.get(column))
+                             for column in self.columns])
+        self.stream.write(out.getvalue().encode('utf-8'))
+
+    @staticmethod
+    def _format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
+
+    def close(self):
+        super().close()
+        _warn_dropped_csv_fields(self.dropped)
+
+
+class _ArrowBatchItemWriter(_BatchItemWriter):
+    """
+    Base class for writers of pyarrow-based formats. The schema is inferred
+    from the first batch of items. Fields that are null throughout that batch
+    are written as strings, with values that are not strings written as JSON,
+    and fields first seen later on are dropped, with a warning listing them
+    printed at the end.
+    """
+
+    def __init__(self, stream, batch_size=None):
+        super().__init__(stream, batch_size)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('You need the pyarrow package installed to '
+                              'export items as Parquet or Arrow, e.g. '
+                              'through pip install shub[parquet]')
+        self.pyarrow = pyarrow
+        self.schema = None
+        self.dropped_fields = []
+        self._json_fields = set()
+        self._writer = None
+
+    def _infer_schema(self, batch):
+        pa = self.pyarrow
+        fields = []
+        for field in pa.Table.from_pylist(batch).schema:
+            if pa.types.is_null(field.type):
+                self._json_fields.add(field.name)
+                field = field.with_type(pa.string())
+            fields.append(field)
+        return pa.schema(fields)
+
+    def _prepare_batch(self, batch):
+        known = set(self.schema.names)
+        dropped = set(self.dropped_fields)
+        for item in batch:
+            for key in item:
+                if key not in known and key not in dropped:
+                    dropped.add(key)
+                    self.dropped_fields.append(key)
+        if not self._json_fields:
+            return batch
+        return [{
+            key: (json.dumps(value)
+                  if key in self._json_fields and value is not None and
+                  not isinstance(value, str) else value)
+            for key, value in item.items()
+        } for item in batch]
+
+    def _write_batch(self, batch):
+        pa = self.pyarrow
+        if self.schema is None:
+            self.schema = self._infer_schema(batch)
+        batch = self._prepare_batch(batch)
+        try:
+            table = pa.Table.from_pylist(batch, schema=self.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ShubException(
+                f"Unable to convert items with the schema {self.schema} "
+                f"inferred from the first batch: {e}")
+        if self._writer is None:
+            self._writer = self._open_writer(self.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+        if self._writer is not None:
+            self._writer.close()
+        self.stream.flush()
+        if self.dropped_fields:
+            print_warning(
+                "These fields were first seen after the schema was inferred "
+                "from the first batch of items, and were not exported: %s"
+                % ', '.join(self.dropped_fields))
+
+    def _open_writer(self, schema):
+        raise NotImplementedError
+
+
+class ParquetItemWriter(_ArrowBatchItemWriter):
+    """Write items as Parquet, one row group per batch."""
+
+    def _open_writer(self, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.stream, schema)
+
+
+class ArrowItemWriter(_ArrowBatchItemWriter):
+    """Write items in the Arrow IPC streaming format, one record batch per
+    batch."""
+
+    def _open_writer(self, schema):
+        return self.pyarrow.ipc.new_stream(self.stream, schema)
+
+
+def _quote_identifier(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class SqliteItemWriter(_BatchItemWriter):
+    """
+    Insert items into `table` of the SQLite database at `path`, which is
+    created if needed, or appended to otherwise. Each batch is inserted
+    through a single ``executemany`` call, and transactions are only committed
+    every `SQLITE_TRANSACTION_SIZE` rows. Columns are added as new fields are
+    seen, nested values are stored as JSON text, and indexes on the
+    `index_fields` are created at the end, once all rows are in.
+    """
+
+    def __init__(self, path, table, index_fields=(), batch_size=None):
+        super().__init__(None, batch_size)
+        self.path = path
+        self.table = table
+        self.index_fields = index_fields
+        self.connection = sqlite3.connect(path)
+        self.columns = [
+            row[1] for row in self.connection.execute(
+                'PRAGMA table_info({})'.format(_quote_identifier(table)))
+        ]
+        self._uncommitted = 0
+
+    def _add_columns(self, batch):
+        known = set(self.columns)
+        new_columns = [key for key in dict.fromkeys(
+            k for item in batch for k in item) if key not in known]
+        if not new_columns:
+            return
+        if not self.columns:
+            self.connection.execute('CREATE TABLE {} ({})'.format(
+                _quote_identifier(self.table),
+                ', '.join(map(_quote_identifier, new_columns))))
+        else:
+            for column in new_columns:
+                self.connection.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                    _quote_identifier(self.table), _quote_identifier(column)))
+        self.columns.extend(new_columns)
+
+    @staticmethod
+    def _format_value(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
+
+    def _write_batch(self, batch):
+        self._add_columns(batch)
+        self.connection.executemany(
+            'INSERT INTO {} ({}) VALUES ({})'.format(
+                _quote_identifier(self.table),
+                ', '.join(map(_quote_identifier, self.columns)),
+                ', '.join('?' * len(self.columns))),
+            ([self._format_value(item.get(column))
+              for column in self.columns] for item in batch),
+        )
+        self._uncommitted += len(batch)
+        if self._uncommitted >= SQLITE_TRANSACTION_SIZE:
+            self.connection.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        try:
+            if self._batch:
+                self._write_batch(self._batch)
+                self._batch = []
+            for field in self.index_fields:
+                if field not in self.columns:
+                    print_warning(f"Not indexing {field}, no item has this "
+                                  f"field")
+                    continue
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+                        _quote_identifier(f'{self.table}_{field}'),
+                        _quote_identifier(self.table),
+                        _quote_identifier(field)))
+            self.connection.commit()
+        finally:
+            self.connection.close()
+
+
+def write_sqlite(items, path, table, index_fields=(), stats=False):
+    """
+    Insert decoded `items` into `table` of the SQLite database at `path` (see
+    `SqliteItemWriter`). Like `write_items`, items are consumed in a background
+    thread, and a `TransferStats` instance is returned, counting the bytes the
+    database grew by. Rows inserted since the last commit are lost if
+    interrupted.
+    """
+    size_before = os.path.getsize(path) if os.path.exists(path) else 0
+    try:
+        writer = SqliteItemWriter(path, table, index_fields)
+    except sqlite3.Error as e:
+        raise BadParameterException(f"Unable to open {path}: {e}",
+                                    param_hint='to-sqlite')
+    transfer_stats = TransferStats()
+    producer = BackgroundIterator(items)
+    try:
+        for item in producer:
+            writer.write(item)
+            transfer_stats.add(0)
+        writer.close()
+    except sqlite3.Error as e:
+        raise ShubException(f"Unable to write to {path}: {e}")
+    finally:
+        producer.stop()
+        # Rolls back the current transaction if not done yet
+        writer.connection.close()
+        transfer_stats.bytes = os.path.getsize(path) - size_before
+        if stats:
+            transfer_stats.report()
+    return transfer_stats
+
+
+ITEM_WRITERS = {
+    'csv': CsvItemWriter,
+    'parquet': ParquetItemWriter,
+    'arrow': ArrowItemWriter,
+}
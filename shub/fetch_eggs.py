@@ -1,10 +1,10 @@
 from urllib.parse import urljoin
 
 import click
-import requests
 
 from shub.config import get_target_conf
 from shub.exceptions import InvalidAuthException, RemoteErrorException
+from shub.utils import get_http_session
 
 
 HELP = """
@@ -30,8 +30,8 @@ def cli(target):
 def fetch_eggs(project, endpoint, apikey, destfile):
     auth = (apikey, '')
     url = urljoin(endpoint, "eggs/bundle.zip")
-    rsp = requests.get(url=url, params={'project': project}, auth=auth,
-                       stream=True, timeout=300)
+    rsp = get_http_session().get(url=url, params={'project': project},
+                                 auth=auth, stream=True, timeout=300)
 
     _assert_response_is_valid(rsp)
 
@@ -1,7 +1,7 @@
 import click
-import requests
 
 from shub.image.utils import load_status_url
+from shub.utils import get_http_session
 
 SHORT_HELP = "Check a deploy task's status url saved in a temporary file."
 
@@ -16,7 +16,7 @@ temporary file.
 @click.option("--id", type=int, help="status id to check deploy results")
 def cli(id):
     status_url = load_status_url(id)
-    status_req = requests.get(status_url, timeout=300)
+    status_req = get_http_session().get(status_url, timeout=300)
     status_req.raise_for_status()
     result = status_req.json()
     click.echo(f"Deploy results: {result}")
@@ -14,6 +14,7 @@ from shub.config import load_shub_config, list_targets_callback
 from shub.exceptions import ShubException
 from shub.image import utils
 from shub.image import list as list_mod
+from shub.utils import get_http_session
 
 
 VALIDSPIDERNAME = re.compile('^[a-z0-9][-._a-z0-9]+$', re.I)
@@ -82,7 +83,7 @@ def deploy_cmd(target, version, username, password, email,
 
     click.echo(f"Deploying {image_name}")
     utils.debug_log(f'Deploy parameters: {params}')
-    req = requests.post(
+    req = get_http_session().post(
         urljoin(endpoint, '/api/releases/deploy.json'),
         data=params,
         auth=(apikey, ''),
@@ -191,7 +192,7 @@ def _retry_on_requests_error(exception):
        wait_exponential_multiplier=CHECK_RETRY_EXP_MULTIPLIER,
        wait_exponential_max=CHECK_RETRY_EXP_MAX)
 def _check_status_url(status_url):
-    status_req = requests.get(status_url, timeout=300)
+    status_req = get_http_session().get(status_url, timeout=300)
     status_req.raise_for_status()
     return status_req.json()
 
@@ -2,12 +2,12 @@ import json
 
 import click
 import docker
-import requests
 from urllib.parse import urljoin
 
 from shub.exceptions import ShubException
 from shub.config import load_shub_config, list_targets_callback
 from shub.image import utils
+from shub.utils import get_http_session
 
 
 SETTING_TYPES = ['project_settings',
@@ -90,7 +90,7 @@ def list_cmd(image_name, project, endpoint, apikey):
 
 def _get_project_settings(project, endpoint, apikey):
     utils.debug_log(f'Getting settings for {project} project:')
-    req = requests.get(
+    req = get_http_session().get(
         urljoin(endpoint, '/api/settings/get.json'),
         params={'project': project},
         auth=(apikey, ''),
@@ -1,6 +1,22 @@
+import os
+
 import click
+from scrapinghub.hubstorage.serialization import MSGPACK_AVAILABLE
 
-from shub.utils import job_resource_iter, get_job
+from shub.cache import JobCache
+from shub.diff import bucket_count, diff_items
+from shub.exceptions import BadParameterException
+from shub.export import (
+    FORMATS, PARALLEL_FORMATS, add_item_field, add_json_field, format_needs_json,
+    check_output_options, iter_concurrently, write_files, write_items,
+    write_lines_resumable, write_sqlite,
+)
+from shub.summary import ItemsSummary, SUMMARY_FORMATS, print_summary
+from shub.utils import (
+    build_resource_query, job_resource_iter, job_resource_sample,
+    jobs_resource_iter, get_job, get_job_specs, get_jobs, select_job_specs,
+    POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, SAMPLE_PARALLEL, TRANSPORTS,
+)
 
 
 HELP = """
@@ -29,18 +45,318 @@ If the job is still running, you can watch the items as they are being scraped
 by providing the -f flag:
 
     shub items -f 2/15
+
+To spot-check a large job, fetch a range of items, or a random sample of them
+made of short runs of consecutive items:
+
+    shub items 2/15 --range 1000000:1001000
+
+    shub items 2/15 --sample 10000
+
+You can fetch the items of several jobs at once, either by listing their IDs
+or by selecting jobs of a target through their spider, tags, state, and the
+date they entered it. Items are then interleaved, with an additional "_job"
+field holding the job key, unless you ask for one file per job with
+--output-dir:
+
+    shub items 2/15 2/16 3/4
+
+    shub items production --spider myspider --since 2026-01-01 -o exports/
+
+The -f flag also works with several jobs, e.g. to watch the items of all
+running jobs of a target:
+
+    shub items -f production --running
+
+Items can also be exported as gzip- or zstd-compressed JSON lines, CSV, or (if
+pyarrow is installed) Parquet or Arrow:
+
+    shub items 2/15 -F parquet > items.parquet
+
+Decoding items and converting them to CSV or compressing them can be spread
+over several processes:
+
+    shub items 2/15 -F jsonl.zst --workers 4 > items.jl.zst
+
+Or be loaded into a table of an SQLite database, with a "_job" column holding
+the job key:
+
+    shub items 2/15 2/16 --to-sqlite items.db --table products --index url
+
+Instead of the items themselves, you can print how often each field is filled,
+and with which types of values, as a table or as JSON:
+
+    shub items 2/15 --summary
+
+To compare the items of two jobs, e.g. before and after a spider change, match
+them through a key field with --diff. This reports how many items were added,
+removed, and changed, with examples, and works for jobs of any size:
+
+    shub items --diff 2/15 2/16 --key url
+
+When writing JSON lines to a file with --output, shub keeps track of its
+progress, so that an interrupted download can be continued with --resume:
+
+    shub items 2/15 --output items.jl --resume
+
+To download less data, you can have Scrapy Cloud send only some fields of the
+items, or only the items matching filter expressions:
+
+    shub items 2/15 --fields name,price --filter '["price", ">", [100]]'
 """
 
 SHORT_HELP = "Fetch items from Scrapy Cloud"
 
 
+JOB_STATES = ('pending', 'running', 'finished', 'deleted')
+
+
 @click.command(help=HELP, short_help=SHORT_HELP)
-@click.argument('job_id')
+@click.argument('job_ids', nargs=-1, metavar='JOB_ID...')
 @click.option('-f', '--follow', help='output new items as they are scraped',
               is_flag=True)
 @click.option('-n', '--tail', help='output last N items only', type=int)
-def cli(job_id, follow, tail):
-    job = get_job(job_id)
-    for item in job_resource_iter(job, job.items, output_json=True,
-                                  follow=follow, tail=tail):
-        click.echo(item)
+@click.option('--range', 'range_', metavar='START:END',
+              help='output items START (counting from 0) to END - 1 only')
+@click.option('--sample', type=click.IntRange(min=1),
+              help='output a random sample of about N items')
+@click.option('--poll-min', type=click.FloatRange(min=0, min_open=True),
+              default=POLL_MIN_INTERVAL,
+              help='when following, minimum seconds to wait before polling '
+                   'again after an empty poll')
+@click.option('--poll-max', type=click.FloatRange(min=0, min_open=True),
+              default=POLL_MAX_INTERVAL,
+              help='when following, maximum seconds to wait between polls')
+@click.option('-j', '--parallel', type=click.IntRange(min=1), default=1,
+              help='download finished jobs through N parallel connections')
+@click.option('--stats', is_flag=True,
+              help='print download throughput to stderr when done')
+@click.option('--spider', help='select the jobs of this spider')
+@click.option('--tag', multiple=True, help='select jobs with this tag')
+@click.option('--state', multiple=True, type=click.Choice(JOB_STATES),
+              help='select jobs in this state (default: finished)')
+@click.option('--since', type=click.DateTime(),
+              help='select jobs that entered their state after this date')
+@click.option('--running', is_flag=True,
+              help='select running jobs, same as --state running')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1), default=4,
+              help='download up to N jobs at once')
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False),
+              help='write the items of each job to its own file in this '
+                   'directory')
+@click.option('-F', '--format', 'fmt', type=click.Choice(list(FORMATS)),
+              default='jsonl', help='output format (default: jsonl)')
+@click.option('--cache/--no-cache', default=True,
+              help='serve finished jobs from, and store them in, the local '
+                   'job data cache (default: enabled)')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='write the items of a single job to this file')
+@click.option('--resume', is_flag=True,
+              help='continue an interrupted download into the --output file')
+@click.option('--fields', multiple=True,
+              help='only fetch these comma-separated item fields')
+@click.option('--filter', 'filter_', multiple=True,
+              help='only fetch items matching this JSON filter expression, '
+                   'e.g. \'["size", ">", [30000]]\'')
+@click.option('--transport', type=click.Choice(TRANSPORTS), default='auto',
+              help='wire format for downloading items; auto uses msgpack '
+                   'unless exporting JSON lines (default: auto)')
+@click.option('--to-sqlite', type=click.Path(dir_okay=False),
+              help='insert the items into this SQLite database')
+@click.option('--table', default='items',
+              help='with --to-sqlite, name of the table to insert the items '
+                   'into (default: items)')
+@click.option('--index', multiple=True,
+              help='with --to-sqlite, index this field once done')
+@click.option('--summary', type=click.Choice(SUMMARY_FORMATS), is_flag=False,
+              flag_value='table',
+              help='print the fill rate and value types of each field instead '
+                   'of the items, as a table (default) or JSON')
+@click.option('--diff', is_flag=True,
+              help='compare the items of two jobs instead of outputting them')
+@click.option('--key', metavar='FIELD',
+              help='with --diff, field identifying the same item in both jobs')
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=1,
+              help='decode and convert items in N processes, for the '
+                   'jsonl.gz, jsonl.zst and csv formats')
+def cli(job_ids, follow, tail, range_, sample, poll_min, poll_max, parallel,
+        stats, spider,
+        tag, state, since, running, concurrency, output_dir, fmt, cache,
+        output, resume, fields, filter_, transport, to_sqlite, table, index,
+        summary, diff, key, workers):
+    if transport == 'msgpack' and not MSGPACK_AVAILABLE:
+        raise BadParameterException(
+            'You need the msgpack package installed to download items as '
+            'msgpack, e.g. through pip install shub[msgpack]',
+            param_hint='transport')
+    query = build_resource_query(fields=fields, filters=filter_)
+    check_output_options(output, resume, tail, query)
+    start, stop = _parse_range(range_) if range_ else (None, None)
+    if range_ or sample:
+        if range_ and sample:
+            raise BadParameterException(
+                '--range and --sample cannot be combined', param_hint='range')
+        if follow or tail is not None or resume:
+            raise BadParameterException(
+                '--range and --sample cannot be combined with --follow, '
+                '--tail or --resume', param_hint='range')
+        if set(query) - {'fields'}:
+            raise BadParameterException(
+                '--range and --sample cannot be combined with --filter',
+                param_hint='range')
+    if diff:
+        if len(job_ids) != 2 or not key:
+            raise BadParameterException(
+                '--diff needs two job IDs and a --key field',
+                param_hint='diff')
+        if (follow or tail is not None or range_ or sample or output
+                or output_dir or to_sqlite or summary or workers > 1):
+            raise BadParameterException(
+                '--diff cannot be combined with other options than --fields, '
+                '--filter, --parallel and --transport', param_hint='diff')
+        if query.get('fields') and key not in query['fields']:
+            query['fields'].append(key)
+    elif key:
+        raise BadParameterException('--key only applies to --diff',
+                                    param_hint='key')
+    if resume and fmt != 'jsonl':
+        raise BadParameterException('Only jsonl downloads can be resumed',
+                                    param_hint='resume')
+    if running:
+        state += ('running',)
+    selectors = spider or tag or state or since
+    if not job_ids and not selectors:
+        raise BadParameterException('Please provide a job ID or selector',
+                                    param_hint='job_id')
+    if selectors:
+        if len(job_ids) > 1 or job_ids and '/' in job_ids[0]:
+            raise BadParameterException(
+                'Job IDs cannot be combined with job selectors, only a '
+                'target can', param_hint='job_id')
+        target = job_ids[0] if job_ids else 'default'
+        jobs = get_jobs(select_job_specs(target, spider, tag, state, since),
+                        pool_size=concurrency * parallel)
+    elif len(job_ids) == 1:
+        jobs = [get_job(job_ids[0], pool_size=parallel)]
+    else:
+        jobs = get_jobs([get_job_specs(job_id) for job_id in job_ids],
+                        pool_size=concurrency * parallel)
+    multiple = len(jobs) > 1 or selectors
+    if follow and multiple and output_dir:
+        raise BadParameterException(
+            'Several jobs cannot be followed into --output-dir',
+            param_hint='follow')
+    if output and (multiple or output_dir):
+        raise BadParameterException(
+            '--output only supports a single job, use --output-dir instead',
+            param_hint='output')
+    if to_sqlite and (output or output_dir):
+        raise BadParameterException(
+            '--to-sqlite cannot be combined with --output or --output-dir',
+            param_hint='to-sqlite')
+    if summary and (output or output_dir or to_sqlite):
+        raise BadParameterException(
+            '--summary cannot be combined with --output, --output-dir or '
+            '--to-sqlite', param_hint='summary')
+    if workers > 1 and (fmt not in PARALLEL_FORMATS or to_sqlite or summary):
+        raise BadParameterException(
+            '--workers only supports the {} formats, without --to-sqlite or '
+            '--summary'.format(', '.join(PARALLEL_FORMATS)),
+            param_hint='workers')
+
+    output_json = ((diff or format_needs_json(fmt, workers)) and not to_sqlite
+                   and not summary)
+    job_cache = JobCache() if cache else None
+
+    def iter_items(job, startafter=None):
+        if sample:
+            return job_resource_sample(
+                job, job.items, sample, output_json=output_json,
+                parallel=max(parallel, SAMPLE_PARALLEL), cache=job_cache,
+                query=query, transport=transport,
+            )
+        if start:
+            startafter = f'{job.key}/{start - 1}'
+        return job_resource_iter(
+            job, job.items, output_json=output_json, follow=follow, tail=tail,
+            poll_min=poll_min, poll_max=poll_max, parallel=parallel,
+            cache=job_cache, startafter=startafter, query=query,
+            transport=transport, stop=stop,
+        )
+
+    def iter_job_items(add_job=True):
+        """Interleave the items of all jobs, adding their job key."""
+        if not add_job:
+            add_field = _keep_entries
+        elif output_json:
+            add_field = add_json_field
+        else:
+            add_field = add_item_field
+        if follow:
+            return (
+                item
+                for job, entry in jobs_resource_iter(
+                    jobs, 'items', output_json=output_json,
+                    poll_min=poll_min, poll_max=poll_max, query=query)
+                for item in add_field([entry], '_job', job.key)
+            )
+        return iter_concurrently(
+            (add_field(iter_items(job), '_job', job.key) for job in jobs),
+            concurrency,
+        )
+
+    if diff:
+        buckets = bucket_count(max(
+            job.items.stats()['totals']['input_values'] for job in jobs))
+        click.echo(diff_items(
+            iter_items(jobs[0]), iter_items(jobs[1]), key,
+            [job.key for job in jobs], buckets=buckets,
+        ).format_table())
+    elif summary:
+        if multiple:
+            entries = iter_job_items(add_job=False)
+        else:
+            entries = iter_items(jobs[0])
+        print_summary(entries, ItemsSummary(), summary)
+    elif output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        write_files(
+            [(os.path.join(output_dir, '{}.{}'.format(
+                job.key.replace('/', '_'), FORMATS[fmt])), iter_items(job))
+             for job in jobs],
+            concurrency, fmt=fmt, stats=stats, workers=workers,
+            columns=query.get('fields'),
+        )
+    elif output and fmt == 'jsonl':
+        write_lines_resumable(lambda startafter: iter_items(jobs[0], startafter),
+                              jobs[0].key, output, resume=resume, stats=stats)
+    elif output:
+        with open(output, 'wb') as f:
+            write_items(iter_items(jobs[0]), fmt, stream=f, stats=stats,
+                        workers=workers, columns=query.get('fields'))
+    elif to_sqlite:
+        write_sqlite(iter_job_items(), to_sqlite, table, index_fields=index,
+                     stats=stats)
+    elif not multiple:
+        write_items(iter_items(jobs[0]), fmt, stats=stats, workers=workers,
+                    columns=query.get('fields'))
+    else:
+        columns = query.get('fields')
+        write_items(iter_job_items(), fmt, stats=stats, workers=workers,
+                    columns=columns and columns + ['_job'])
+
+
+def _keep_entries(entries, name, value):
+    return entries
+
+
+def _parse_range(range_):
+    try:
+        start, stop = (int(x) for x in range_.split(':'))
+    except ValueError:
+        start = stop = -1
+    if not 0 <= start < stop:
+        raise BadParameterException(
+            'Ranges must be given as START:END, with 0 <= START < END',
+            param_hint='range')
+    return start, stop
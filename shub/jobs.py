@@ -0,0 +1,148 @@
+import heapq
+import json
+from datetime import datetime, timezone
+from itertools import islice
+
+import click
+from scrapinghub import ScrapinghubAPIError
+
+from shub.cache import JobListCache
+from shub.config import get_target_conf
+from shub.exceptions import RemoteErrorException
+from shub.export import write_lines
+from shub.utils import get_scrapinghub_client_from_config, iter_job_summaries
+
+
+HELP = """
+List the jobs of a project on Scrapy Cloud, most recent first.
+
+By default, shub lists the finished jobs of your default project (as defined
+in scrapinghub.yml). You may also supply a project ID or an identifier defined
+in scrapinghub.yml:
+
+    shub jobs production
+
+Jobs can be selected by state, spider, tags, and date:
+
+    shub jobs --state running --state pending
+
+    shub jobs --spider myspider --tag nightly --since 2026-01-01
+
+Jobs are printed as a table as they are fetched, or as JSON lines with -F:
+
+    shub jobs -F jsonl -n 100
+
+The summaries of finished jobs never change, so shub keeps them in a local
+cache, and later listings only fetch the jobs that finished since.
+"""
+
+SHORT_HELP = "List jobs of a project on Scrapy Cloud"
+
+
+JOB_STATES = ('pending', 'running', 'finished', 'deleted')
+LIST_FORMATS = ('table', 'jsonl')
+
+_TABLE_ROW = '{:<16} {:<24} {:<9} {:<16} {:>10} {:>7}  {}'
+
+
+@click.command(help=HELP, short_help=SHORT_HELP)
+@click.argument('target', required=False, default='default')
+@click.option('--spider', help='list the jobs of this spider')
+@click.option('--tag', multiple=True, help='list jobs with this tag')
+@click.option('--state', multiple=True, type=click.Choice(JOB_STATES),
+              help='list jobs in this state (default: finished)')
+@click.option('--since', type=click.DateTime(),
+              help='list jobs that entered their state after this date')
+@click.option('--until', type=click.DateTime(),
+              help='list jobs that entered their state before this date')
+@click.option('-n', '--count', type=click.IntRange(min=1),
+              help='list the N most recent jobs only')
+@click.option('-F', '--format', 'fmt', type=click.Choice(LIST_FORMATS),
+              default='table', help='output format (default: table)')
+@click.option('--cache/--no-cache', default=True,
+              help='serve finished jobs from, and store them in, the local '
+                   'job list cache (default: enabled)')
+def cli(target, spider, tag, state, since, until, count, fmt, cache):
+    targetconf = get_target_conf(target)
+    client = get_scrapinghub_client_from_config(targetconf)
+    filters = {}
+    if spider:
+        filters['spider'] = spider
+    if tag:
+        filters['has_tag'] = list(tag)
+    try:
+        project = client.get_project(targetconf.project_id)
+        summaries = iter_jobs(
+            project, state or ('finished',), filters, _timestamp(since),
+            _timestamp(until), cache=JobListCache() if cache else None)
+        if count:
+            summaries = islice(summaries, count)
+        if fmt == 'jsonl':
+            lines = (json.dumps(summary) for summary in summaries)
+        else:
+            lines = _iter_table(summaries)
+        write_lines(lines)
+    except ScrapinghubAPIError as e:
+        raise RemoteErrorException(str(e))
+
+
+def iter_jobs(project, states, filters, since=None, until=None, cache=None):
+    """
+    Yield the summaries of the jobs of a python-scrapinghub `project` in the
+    given states, matching the listing `filters` (see `iter_job_summaries`)
+    and whose state changed between `since` and `until` (timestamps in
+    milliseconds), most recent first. Jobs are fetched page by page, and
+    finished jobs are served from the `JobListCache` if given.
+    """
+    streams = []
+    live_states = [s for s in states if s != 'finished']
+    if live_states:
+        streams.append(iter_job_summaries(
+            project, state=live_states, **filters,
+            **_time_filters(since, until)))
+    if 'finished' in states:
+        streams.append(_iter_finished(project, filters, since, until, cache))
+    # Live and finished jobs are listed separately, each most recent first
+    yield from heapq.merge(*streams, key=_state_ts, reverse=True)
+
+
+def _iter_finished(project, filters, since, until, cache):
+    if cache is None:
+        return iter_job_summaries(project, state='finished', **filters,
+                                  **_time_filters(since, until))
+
+    def fetch(startts):
+        return iter_job_summaries(project, state='finished', **filters,
+                                  **_time_filters(startts, None))
+
+    return cache.iter_finished(fetch, project.key, filters, since, until)
+
+
+def _state_ts(summary):
+    return summary.get('ts') or summary.get('finished_time') or 0
+
+
+def _time_filters(since, until):
+    filters = {}
+    if since is not None:
+        filters['startts'] = since
+    if until is not None:
+        filters['endts'] = until
+    return filters
+
+
+def _timestamp(dt):
+    return None if dt is None else int(dt.timestamp() * 1000)
+
+
+def _iter_table(summaries):
+    yield _TABLE_ROW.format('Job', 'Spider', 'State', 'Close reason', 'Items',
+                            'Errors', 'Updated')
+    for summary in summaries:
+        ts = summary.get('ts') or summary.get('finished_time')
+        yield _TABLE_ROW.format(
+            summary['key'], summary.get('spider') or '',
+            summary.get('state') or '', summary.get('close_reason') or '',
+            summary.get('items') or 0, summary.get('errors') or 0,
+            datetime.fromtimestamp(ts / 1000, timezone.utc).strftime(
+                '%Y-%m-%d %H:%M:%S') if ts else '')
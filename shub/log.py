@@ -1,7 +1,16 @@
 import logging
 from datetime import datetime
 
-from shub.utils import job_resource_iter, get_job
+from shub.cache import JobCache
+from shub.exceptions import BadParameterException
+from shub.export import (
+    add_json_field, check_output_options, write_lines, write_lines_resumable,
+)
+from shub.utils import (
+    build_resource_query, job_resource_iter, jobs_resource_iter, get_job,
+    get_job_specs, get_jobs, select_job_specs, POLL_MIN_INTERVAL,
+    POLL_MAX_INTERVAL,
+)
 
 import click
 
@@ -31,27 +40,125 @@ If the job is still running, you can watch the log as it is being written by
 providing the -f flag:
 
     shub log -f 2/15
+
+You can watch the logs of several jobs at once, or of all running jobs of a
+target, in which case every line is prefixed with its job key:
+
+    shub log -f 2/15 2/16
+
+    shub log -f production --running
+
+When writing to a file with --output, shub keeps track of its progress, so
+that an interrupted download can be continued with --resume:
+
+    shub log 2/15 --output job.log --resume
+
+To download less data, you can have Scrapy Cloud send only the log entries of
+a minimum level, within a time range, or matching filter expressions:
+
+    shub log 2/15 --level WARNING --start-time 2026-01-02T10:00:00
 """
 
 SHORT_HELP = "Fetch log from Scrapy Cloud"
 
 
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
 @click.command(help=HELP, short_help=SHORT_HELP)
-@click.argument('job_id')
+@click.argument('job_ids', nargs=-1, metavar='JOB_ID...')
 @click.option('-f', '--follow', help='output new log entries as they are '
               'produced', is_flag=True)
 @click.option('-n', '--tail', help='output last N log entries only', type=int)
 @click.option('--json', 'json_', help='output log entries in JSON', is_flag=True, default=False)
-def cli(job_id, follow, tail, json_):
-    job = get_job(job_id)
-    for item in job_resource_iter(job, job.logs, follow=follow, tail=tail, output_json=json_):
+@click.option('--poll-min', type=click.FloatRange(min=0, min_open=True),
+              default=POLL_MIN_INTERVAL,
+              help='when following, minimum seconds to wait before polling '
+                   'again after an empty poll')
+@click.option('--poll-max', type=click.FloatRange(min=0, min_open=True),
+              default=POLL_MAX_INTERVAL,
+              help='when following, maximum seconds to wait between polls')
+@click.option('-j', '--parallel', type=click.IntRange(min=1), default=1,
+              help='download finished jobs through N parallel connections')
+@click.option('--stats', is_flag=True,
+              help='print download throughput to stderr when done')
+@click.option('--cache/--no-cache', default=True,
+              help='serve finished jobs from, and store them in, the local '
+                   'job data cache (default: enabled)')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='write the log to this file')
+@click.option('--resume', is_flag=True,
+              help='continue an interrupted download into the --output file')
+@click.option('--level', type=click.Choice(LOG_LEVELS, case_sensitive=False),
+              help='only fetch log entries of this level or above')
+@click.option('--start-time', type=click.DateTime(),
+              help='only fetch log entries written from this time on')
+@click.option('--end-time', type=click.DateTime(),
+              help='only fetch log entries written until this time')
+@click.option('--filter', 'filter_', multiple=True,
+              help='only fetch log entries matching this JSON filter '
+                   'expression, e.g. \'["message", "contains", ["retry"]]\'')
+@click.option('--running', is_flag=True,
+              help='fetch the logs of all running jobs of the given target')
+def cli(job_ids, follow, tail, json_, poll_min, poll_max, parallel, stats,
+        cache, output, resume, level, start_time, end_time, filter_, running):
+    query = build_resource_query(filters=filter_, level=level,
+                                 start_time=start_time, end_time=end_time)
+    check_output_options(output, resume, tail, query)
+    if not job_ids and not running:
+        raise BadParameterException('Please provide a job ID',
+                                    param_hint='job_id')
+    if running or len(job_ids) > 1:
+        if running and (len(job_ids) > 1 or job_ids and '/' in job_ids[0]):
+            raise BadParameterException(
+                '--running only accepts a target, not job IDs',
+                param_hint='job_id')
+        if tail is not None or output:
+            raise BadParameterException(
+                '--tail and --output only support a single job',
+                param_hint='job_id')
+        if running:
+            target = job_ids[0] if job_ids else 'default'
+            job_specs = select_job_specs(target, states=('running',))
+        else:
+            job_specs = [get_job_specs(job_id) for job_id in job_ids]
+        write_lines(_iter_prefixed_entries(
+            get_jobs(job_specs), json_, follow=follow, poll_min=poll_min,
+            poll_max=poll_max, query=query,
+        ), stats=stats)
+        return
+    job = get_job(job_ids[0], pool_size=parallel)
+    job_cache = JobCache() if cache else None
+
+    def iter_entries(startafter=None):
+        entries = job_resource_iter(job, job.logs, follow=follow, tail=tail,
+                                    output_json=json_, poll_min=poll_min,
+                                    poll_max=poll_max, parallel=parallel,
+                                    cache=job_cache, startafter=startafter,
+                                    query=query)
+        if not json_:
+            entries = (format_log_entry(entry) for entry in entries)
+        return entries
+
+    if output:
+        write_lines_resumable(iter_entries, job.key, output, resume=resume,
+                              stats=stats)
+    else:
+        write_lines(iter_entries(), stats=stats)
+
+
+def _iter_prefixed_entries(jobs, json_, **kwargs):
+    for job, entry in jobs_resource_iter(jobs, 'logs', output_json=json_,
+                                         **kwargs):
         if json_:
-            click.echo(item)
+            yield from add_json_field([entry], '_job', job.key)
         else:
-            click.echo(
-                "{} {} {}".format(
-                    datetime.utcfromtimestamp(item['time']/1000),
-                    logging.getLevelName(int(item['level'])),
-                    item['message']
-                )
-            )
+            yield '{} {}'.format(job.key, format_log_entry(entry))
+
+
+def format_log_entry(entry):
+    return "{} {} {}".format(
+        datetime.utcfromtimestamp(entry['time']/1000),
+        logging.getLevelName(int(entry['level'])),
+        entry['message']
+    )
@@ -1,11 +1,10 @@
 import click
-import requests
 from urllib.parse import urljoin
 
 from shub.config import (load_shub_config, GLOBAL_SCRAPINGHUB_YML_PATH,
                          ShubConfig)
 from shub.exceptions import AlreadyLoggedInException
-from shub.utils import update_yaml_dict
+from shub.utils import get_http_session, update_yaml_dict
 
 
 HELP = """
@@ -54,5 +53,6 @@ def _get_apikey(suggestion='', endpoint=None):
 def _is_valid_apikey(key, endpoint=None):
     endpoint = endpoint or ShubConfig.DEFAULT_ENDPOINT
     validate_api_key_endpoint = urljoin(endpoint, "v2/users/me")
-    r = requests.get(validate_api_key_endpoint, params={'apikey': key})
+    r = get_http_session().get(validate_api_key_endpoint,
+                               params={'apikey': key})
     return r.status_code == 200
@@ -9,9 +9,9 @@ from urllib.parse import urljoin
 from io import BytesIO
 
 import click
-import requests
 
 from shub.config import get_target_conf, ShubConfig
+from shub.utils import get_http_session
 
 HELP = """
 Migrate eggs stored in Dash's "Code & Deploy" section.
@@ -40,7 +40,8 @@ def main(target):
     params = {'project': targetconf.project_id}
     auth = (targetconf.apikey, '')
 
-    response = requests.get(url, auth=auth, params=params, stream=True)
+    response = get_http_session().get(url, auth=auth, params=params,
+                                      stream=True)
 
     with zipfile.ZipFile(BytesIO(response.content), 'r') as mfile:
         Migrator(mfile).start()
@@ -0,0 +1,60 @@
+"""
+Profiling of shub commands, for ``shub --profile[=FILE]``.
+
+The command is run under cProfile, and the functions it spent the most
+cumulative time in are printed to stderr, along with how much wall-clock time
+went into importing shub, resolving the configuration, and running the
+command. Only the main thread is profiled: the time spent in background
+threads (e.g. downloading job data) shows up as time spent waiting for them.
+"""
+import cProfile
+import pstats
+import sys
+import time
+
+import click
+
+import shub
+
+
+# Number of functions listed, by cumulative time
+PROFILE_TOP_ENTRIES = 30
+# Functions resolving the configuration, see CommandProfiler.config_time()
+CONFIG_FUNCTIONS = (('shub/config.py', 'load_shub_config'),)
+
+
+class CommandProfiler:
+    """
+    Profile the code running from its creation until `stop`, then report on
+    it, and dump the profile to `path` in pstats format if given.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.import_time = time.perf_counter() - shub.IMPORT_START
+        self.profile = cProfile.Profile()
+        self._start = time.perf_counter()
+        self.profile.enable()
+
+    def config_time(self, stats):
+        """Return the cumulative time spent in the `CONFIG_FUNCTIONS`."""
+        total = 0
+        for (filename, _, funcname), entry in stats.stats.items():
+            for config_filename, config_funcname in CONFIG_FUNCTIONS:
+                if (funcname == config_funcname and
+                        filename.replace('\\', '/').endswith(config_filename)):
+                    total += entry[3]
+        return total
+
+    def stop(self):
+        self.profile.disable()
+        command_time = time.perf_counter() - self._start
+        stats = pstats.Stats(self.profile, stream=sys.stderr)
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_ENTRIES)
+        click.echo('Wall-clock time: import {:.3f}s, config resolution '
+                   '{:.3f}s, command {:.3f}s (including config resolution)'
+                   ''.format(self.import_time, self.config_time(stats),
+                             command_time), err=True)
+        if self.path:
+            stats.dump_stats(self.path)
+            click.echo('Profile written to {}'.format(self.path), err=True)
@@ -1,6 +1,14 @@
 import click
 
-from shub.utils import job_resource_iter, get_job
+from shub.cache import JobCache
+from shub.exceptions import BadParameterException
+from shub.export import (
+    check_output_options, write_lines, write_lines_resumable,
+)
+from shub.summary import RequestsSummary, SUMMARY_FORMATS, print_summary
+from shub.utils import (
+    job_resource_iter, get_job, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL,
+)
 
 
 HELP = """
@@ -29,6 +37,19 @@ If the job is still running, you can watch the requests as they are being made
 by providing the -f flag:
 
     shub requests -f 2/15
+
+When writing to a file with --output, shub keeps track of its progress, so
+that an interrupted download can be continued with --resume:
+
+    shub requests 2/15 --output requests.jl --resume
+
+Instead of the requests themselves, you can print summary statistics: the
+number of requests per status code and domain, response size and duration
+percentiles, and the slowest requests, as a table or as JSON:
+
+    shub requests 2/15 --summary
+
+    shub requests 2/15 --summary json
 """
 
 SHORT_HELP = "Fetch requests from Scrapy Cloud"
@@ -39,8 +60,49 @@ SHORT_HELP = "Fetch requests from Scrapy Cloud"
 @click.option('-f', '--follow', help='output new requests as they are made',
               is_flag=True)
 @click.option('-n', '--tail', help='output last N requests only', type=int)
-def cli(job_id, follow, tail):
-    job = get_job(job_id)
-    for item in job_resource_iter(job, job.requests, output_json=True,
-                                  follow=follow, tail=tail):
-        click.echo(item)
+@click.option('--poll-min', type=click.FloatRange(min=0, min_open=True),
+              default=POLL_MIN_INTERVAL,
+              help='when following, minimum seconds to wait before polling '
+                   'again after an empty poll')
+@click.option('--poll-max', type=click.FloatRange(min=0, min_open=True),
+              default=POLL_MAX_INTERVAL,
+              help='when following, maximum seconds to wait between polls')
+@click.option('-j', '--parallel', type=click.IntRange(min=1), default=1,
+              help='download finished jobs through N parallel connections')
+@click.option('--stats', is_flag=True,
+              help='print download throughput to stderr when done')
+@click.option('--cache/--no-cache', default=True,
+              help='serve finished jobs from, and store them in, the local '
+                   'job data cache (default: enabled)')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='write the requests to this file')
+@click.option('--resume', is_flag=True,
+              help='continue an interrupted download into the --output file')
+@click.option('--summary', type=click.Choice(SUMMARY_FORMATS), is_flag=False,
+              flag_value='table',
+              help='print summary statistics instead of the requests, as a '
+                   'table (default) or JSON')
+def cli(job_id, follow, tail, poll_min, poll_max, parallel, stats, cache,
+        output, resume, summary):
+    check_output_options(output, resume, tail)
+    if summary and output:
+        raise BadParameterException(
+            '--summary cannot be combined with --output',
+            param_hint='summary')
+    job = get_job(job_id, pool_size=parallel)
+    job_cache = JobCache() if cache else None
+
+    def iter_requests(startafter=None):
+        return job_resource_iter(
+            job, job.requests, output_json=not summary, follow=follow,
+            tail=tail, poll_min=poll_min, poll_max=poll_max,
+            parallel=parallel, cache=job_cache, startafter=startafter,
+        )
+
+    if summary:
+        print_summary(iter_requests(), RequestsSummary(), summary)
+    elif output:
+        write_lines_resumable(iter_requests, job.key, output, resume=resume,
+                              stats=stats)
+    else:
+        write_lines(iter_requests(), stats=stats)
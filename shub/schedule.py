@@ -1,11 +1,21 @@
+import csv
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import click
-from scrapinghub import ScrapinghubClient, ScrapinghubAPIError
+from scrapinghub import ScrapinghubAPIError
 from urllib.parse import urljoin
 
-from shub.exceptions import RemoteErrorException
+from shub.exceptions import (
+    BadParameterException, RemoteErrorException, ShubException,
+)
 from shub.config import get_target_conf
+from shub.log import format_log_entry
+from shub.utils import (
+    POLL_MAX_INTERVAL, POLL_MIN_INTERVAL, TokenBucket, get_hubstorage_client,
+    get_jobs, get_scrapinghub_client, get_scrapinghub_client_from_config,
+    jobs_resource_iter, wait_for_jobs,
+)
 
 
 HELP = """
@@ -33,14 +43,46 @@ Spider arguments can be supplied through the -a option:
 Similarly, job-specific settings can be supplied through the -s option:
 
     shub schedule myspider -s SETTING=VALUE -s LOG_LEVEL=DEBUG
+
+To schedule many jobs at once, describe them in a file, one JSON object per
+line with a "spider" name and optionally "args", "settings" and "env" objects,
+a "priority", "units", and a list of "tags":
+
+    {"spider": "myspider", "args": {"category": "books"}, "tags": ["nightly"]}
+
+And give it to --from-file, optionally with a target. The job key (or the
+error) of each line is printed as JSON lines, in the same order. Options such
+as -a, -s or -t apply to all jobs:
+
+    shub schedule production --from-file jobs.jl -t nightly
+
+The file can also be a CSV file (with a .csv extension) with these columns,
+where cells other than "spider" hold JSON values.
+
+With --wait, shub waits for the scheduled jobs to finish, prints their close
+reasons, and exits with an error if any of them did not finish successfully.
+Add --follow-log to print their logs in the meantime:
+
+    shub schedule myspider --wait --follow-log
 """
 
 SHORT_HELP = "Schedule a spider to run on Scrapy Cloud"
 DEFAULT_PRIORITY = 2
 
+# Fields of the jobs described in a --from-file manifest
+MANIFEST_FIELDS = ('spider', 'args', 'settings', 'priority', 'units', 'tags',
+                   'env')
+# Number of jobs scheduled at once with --from-file
+SCHEDULE_CONCURRENCY = 8
+# Maximum number of jobs scheduled per second with --from-file
+SCHEDULE_RATE = 5
+# Number of times a request to schedule a job is retried after failing to
+# connect or being throttled
+SCHEDULE_RETRIES = 5
+
 
 @click.command(help=HELP, short_help=SHORT_HELP)
-@click.argument('spider', type=click.STRING)
+@click.argument('spider', type=click.STRING, required=False)
 @click.option('-a', '--argument',
               help='Spider argument (-a name=value)', multiple=True)
 @click.option('-s', '--set',
@@ -53,7 +95,65 @@ DEFAULT_PRIORITY = 2
               help='Amount of Scrapy Cloud units (-u number)')
 @click.option('-t', '--tag',
               help='Job tags (-t tag)', multiple=True)
-def cli(spider, argument, set, environment, priority, units, tag):
+@click.option('--from-file', type=click.File(encoding='utf-8'),
+              help='schedule the jobs described in this JSON lines or CSV '
+                   'file')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1),
+              default=SCHEDULE_CONCURRENCY,
+              help='with --from-file, schedule up to N jobs at once')
+@click.option('--rate', type=click.FloatRange(min=0, min_open=True),
+              default=SCHEDULE_RATE,
+              help='with --from-file, schedule at most N jobs per second')
+@click.option('--wait', is_flag=True,
+              help='wait for the jobs to finish, and fail if any of them did '
+                   'not finish successfully')
+@click.option('--follow-log', is_flag=True,
+              help='print the log of the jobs while waiting (implies --wait)')
+@click.option('--poll-interval',
+              type=click.FloatRange(min=POLL_MIN_INTERVAL),
+              default=POLL_MAX_INTERVAL,
+              help='with --wait, seconds between two checks of the job '
+                   'states')
+def cli(spider, argument, set, environment, priority, units, tag, from_file,
+        concurrency, rate, wait, follow_log, poll_interval):
+    wait = wait or follow_log
+    if from_file:
+        target = spider or 'default'
+        if '/' in target:
+            raise BadParameterException(
+                'With --from-file, give a target instead of a spider',
+                param_hint='spider')
+        defaults = {
+            'args': _parse_pairs(argument), 'settings': _parse_pairs(set),
+            'priority': priority, 'units': units, 'tags': list(tag),
+            'env': _parse_pairs(environment),
+        }
+        specs = read_manifest(from_file, defaults)
+        targetconf = get_target_conf(target)
+        client = get_scrapinghub_client_from_config(
+            targetconf, pool_size=concurrency, retries=SCHEDULE_RETRIES)
+        project = client.get_project(targetconf.project_id)
+        job_keys = []
+        for spec, result in schedule_jobs(project, specs, concurrency, rate):
+            if 'key' in result:
+                job_keys.append(result['key'])
+            click.echo(json.dumps({'spider': spec['spider'], **result}))
+        unsuccessful = 0
+        if wait and job_keys:
+            unsuccessful = wait_and_report(targetconf, job_keys, follow_log,
+                                           poll_interval, bulk=True)
+        if len(job_keys) < len(specs):
+            raise RemoteErrorException(
+                '{} of {} jobs could not be scheduled'.format(
+                    len(specs) - len(job_keys), len(specs)))
+        if unsuccessful:
+            raise ShubException(
+                '{} of {} jobs did not finish successfully'.format(
+                    unsuccessful, len(job_keys)))
+        return
+    if not spider:
+        raise BadParameterException('Please provide a spider name',
+                                    param_hint='spider')
     try:
         target, spider = spider.rsplit('/', 1)
     except ValueError:
@@ -74,27 +174,175 @@ def cli(spider, argument, set, environment, priority, units, tag):
                "{}".format(short_key))
     click.echo("or watch it running in Zyte's web interface:\n    {}"
                "".format(watch_url))
+    if wait and wait_and_report(targetconf, [job_key], follow_log,
+                                poll_interval):
+        raise ShubException(
+            'Job {} did not finish successfully'.format(job_key))
+
+
+def wait_and_report(targetconf, job_keys, follow_log=False,
+                    poll_interval=POLL_MAX_INTERVAL, bulk=False):
+    """
+    Wait for the jobs with the given keys to finish, optionally printing their
+    logs first, and print their close reasons, as JSON lines if `bulk` is set,
+    followed by a count per close reason on stderr. Return the number of jobs
+    that did not finish successfully.
+    """
+    if follow_log:
+        jobs = get_jobs([(key, targetconf.apikey) for key in job_keys])
+        for job, entry in jobs_resource_iter(jobs, 'logs',
+                                             poll_max=poll_interval):
+            line = format_log_entry(entry)
+            if len(jobs) > 1:
+                line = '{} {}'.format(job.key, line)
+            # Keep the job keys and close reasons on stdout machine-readable
+            click.echo(line, err=bulk)
+    project = get_hubstorage_client(targetconf.apikey).get_project(
+        targetconf.project_id)
+    close_reasons = {}
+    for key, close_reason in wait_for_jobs(project, job_keys, poll_interval):
+        close_reasons[close_reason] = close_reasons.get(close_reason, 0) + 1
+        if bulk:
+            click.echo(json.dumps({'key': key, 'close_reason': close_reason}))
+        else:
+            click.echo('Job {} closed, reason: {}'.format(key, close_reason))
+    if bulk:
+        click.echo('Close reasons: {}'.format(', '.join(
+            '{} {:,}'.format(close_reason, count)
+            for close_reason, count in sorted(
+                close_reasons.items(), key=lambda item: -item[1]))),
+            err=True)
+    return sum(count for close_reason, count in close_reasons.items()
+               if close_reason != 'finished')
 
 
 def schedule_spider(project, endpoint, apikey, spider, arguments=(), settings=(),
                     priority=DEFAULT_PRIORITY, units=None, tag=(), environment=()):
-    client = ScrapinghubClient(apikey, dash_endpoint=endpoint)
+    client = get_scrapinghub_client(apikey, endpoint)
     try:
         project = client.get_project(project)
-        args = dict(x.split('=', 1) for x in arguments)
-        cmd_args = args.pop('cmd_args', None)
-        meta = args.pop('meta', None)
-        job = project.jobs.run(
-            spider=spider,
-            meta=json.loads(meta) if meta else {},
-            cmd_args=cmd_args,
-            job_args=args,
-            job_settings=dict(x.split('=', 1) for x in settings),
-            priority=priority,
-            units=units,
-            add_tag=tag,
-            environment=dict(x.split('=', 1) for x in environment),
-        )
-        return job.key
+        return _run_job(project, {
+            'spider': spider,
+            'args': _parse_pairs(arguments),
+            'settings': _parse_pairs(settings),
+            'priority': priority,
+            'units': units,
+            'tags': tag,
+            'env': _parse_pairs(environment),
+        })
     except ScrapinghubAPIError as e:
         raise RemoteErrorException(str(e))
+
+
+def _parse_pairs(pairs):
+    return dict(x.split('=', 1) for x in pairs)
+
+
+def _run_job(project, spec):
+    """Schedule a job of a python-scrapinghub `project`, return its key."""
+    args = dict(spec['args'])
+    cmd_args = args.pop('cmd_args', None)
+    meta = args.pop('meta', None)
+    if isinstance(meta, str):
+        meta = json.loads(meta)
+    job = project.jobs.run(
+        spider=spec['spider'],
+        meta=meta or {},
+        cmd_args=cmd_args,
+        job_args=args,
+        job_settings=spec['settings'],
+        priority=spec['priority'],
+        units=spec['units'],
+        add_tag=spec['tags'],
+        environment=spec['env'],
+    )
+    return job.key
+
+
+def _job_spec(entry, defaults):
+    """
+    Validate a job description of a manifest, and return it with all
+    `MANIFEST_FIELDS`, taking missing values from `defaults`. Arguments,
+    settings and environment variables are merged with the default ones, and
+    tags are added to them.
+    """
+    if not isinstance(entry, dict):
+        raise ValueError('expected a JSON object')
+    unknown = set(entry) - set(MANIFEST_FIELDS)
+    if unknown:
+        raise ValueError('unknown fields {}'.format(
+            ', '.join(sorted(map(str, unknown)))))
+    spec = {}
+    spider = entry.get('spider')
+    if not isinstance(spider, str) or not spider:
+        raise ValueError('a spider name is required')
+    spec['spider'] = spider
+    for name in ('args', 'settings', 'env'):
+        value = entry.get(name, {})
+        if not isinstance(value, dict):
+            raise ValueError('{} must be an object'.format(name))
+        spec[name] = {**defaults[name], **value}
+    for name in ('priority', 'units'):
+        value = entry.get(name, defaults[name])
+        if value is not None and not isinstance(value, int):
+            raise ValueError('{} must be an integer'.format(name))
+        spec[name] = value
+    tags = entry.get('tags', [])
+    if isinstance(tags, str):
+        tags = [tags]
+    if not isinstance(tags, list):
+        raise ValueError('tags must be a list')
+    spec['tags'] = list(dict.fromkeys(defaults['tags'] + tags))
+    return spec
+
+
+def read_manifest(f, defaults):
+    """
+    Read job descriptions from the open file `f`, holding either JSON lines,
+    or a CSV file (if its name ends with .csv) whose columns are
+    `MANIFEST_FIELDS`, with cells other than the spider name holding JSON
+    values. Return the validated job specs (see `_job_spec`).
+    """
+    is_csv = getattr(f, 'name', '').endswith('.csv')
+    specs = []
+    # The first line of a CSV file is its header
+    for line_number, row in enumerate(csv.DictReader(f) if is_csv else f,
+                                      start=2 if is_csv else 1):
+        try:
+            if is_csv:
+                entry = {
+                    name: value if name == 'spider' else json.loads(value)
+                    for name, value in row.items() if value
+                }
+            elif not row.strip():
+                continue
+            else:
+                entry = json.loads(row)
+            specs.append(_job_spec(entry, defaults))
+        except ValueError as e:
+            raise BadParameterException(
+                'Invalid job on line {} of {}: {}'.format(
+                    line_number, getattr(f, 'name', 'the manifest'), e),
+                param_hint='from-file')
+    return specs
+
+
+def schedule_jobs(project, specs, concurrency=SCHEDULE_CONCURRENCY,
+                  rate=SCHEDULE_RATE):
+    """
+    Schedule jobs of a python-scrapinghub `project` for the given specs (see
+    `read_manifest`) from up to `concurrency` threads, starting at most `rate`
+    jobs per second. Yield, in order, (spec, result) pairs, where `result` is
+    a dictionary holding either the job ``key`` or an ``error`` message.
+    """
+    bucket = TokenBucket(rate)
+
+    def run(spec):
+        bucket.acquire()
+        try:
+            return spec, {'key': _run_job(project, spec)}
+        except (ScrapinghubAPIError, ValueError) as e:
+            return spec, {'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(run, specs)
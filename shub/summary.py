@@ -0,0 +1,246 @@
+"""
+Summary statistics of job data for ``shub requests --summary`` and ``shub
+items --summary``, computed in a single streaming pass. Memory usage does not
+grow with the number of entries: quantiles are estimated through a sketch, and
+only the most frequent domains and the slowest requests are kept.
+"""
+import heapq
+import json
+import math
+from urllib.parse import urlsplit
+
+import click
+
+from shub.export import BackgroundIterator
+
+
+# Relative error of the quantiles estimated by QuantileSketch
+SKETCH_RELATIVE_ACCURACY = 0.01
+# Reported quantiles
+QUANTILES = (0.5, 0.9, 0.99)
+# Number of distinct domains counted by a requests summary
+DOMAINS_CAPACITY = 1000
+# Number of domains and of slowest requests reported
+TOP_SIZE = 10
+
+SUMMARY_FORMATS = ('table', 'json')
+
+
+class QuantileSketch:
+    """
+    Estimate quantiles of a stream of non-negative numbers with a relative
+    error of at most `relative_accuracy`, by counting values in buckets whose
+    bounds grow geometrically (as in DDSketch). The number of buckets only
+    grows with the logarithm of the range of values.
+    """
+
+    def __init__(self, relative_accuracy=SKETCH_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q):
+        """Return the estimated `q`-quantile, or None if no values were added."""
+        if not self.count:
+            return None
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if seen > rank:
+            return self.min
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        stats = {f'p{round(q * 100)}': self.quantile(q) for q in QUANTILES}
+        stats['max'] = self.max
+        return stats
+
+
+class TopCounter:
+    """
+    Count occurrences of keys, keeping at most `capacity` keys (twice as many
+    between two prunings). Once pruned, the counts of the least frequent keys
+    are lost, so reported counts may be too low by up to `max_error`.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.max_error = 0
+
+    def add(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if len(self.counts) >= 2 * self.capacity:
+            kept = heapq.nlargest(self.capacity, self.counts.items(),
+                                  key=lambda item: item[1])
+            pruned = min(count for _, count in kept)
+            self.max_error = max(self.max_error, pruned)
+            self.counts = dict(kept)
+
+    def most_common(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+
+class RequestsSummary:
+    """
+    Summarize job requests: status code histogram, response size and duration
+    quantiles, request counts of the most frequent domains, and the slowest
+    requests.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.statuses = {}
+        self.sizes = QuantileSketch()
+        self.durations = QuantileSketch()
+        self.domains = TopCounter(DOMAINS_CAPACITY)
+        self._slowest = []
+
+    def add(self, request):
+        self.count += 1
+        status = request.get('status')
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if request.get('rs') is not None:
+            self.sizes.add(request['rs'])
+        duration = request.get('duration')
+        if duration is not None:
+            self.durations.add(duration)
+            entry = (duration, self.count, request.get('url'), status)
+            if len(self._slowest) < TOP_SIZE:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+        url = request.get('url')
+        if url:
+            self.domains.add(urlsplit(url).hostname or '')
+
+    def to_dict(self):
+        return {
+            'requests': self.count,
+            'status': {str(status): count for status, count in sorted(
+                self.statuses.items(), key=lambda item: -item[1])},
+            'size': self.sizes.to_dict(),
+            'duration': self.durations.to_dict(),
+            'domains': dict(self.domains.most_common(TOP_SIZE)),
+            'slowest': [
+                {'url': url, 'status': status, 'duration': duration}
+                for duration, _, url, status in sorted(self._slowest,
+                                                       reverse=True)
+            ],
+        }
+
+    def format_table(self):
+        summary = self.to_dict()
+        lines = ['Requests: {:,}'.format(summary['requests']), '',
+                 '{:<14} {:>12}'.format('Status', 'Requests')]
+        for status, count in summary['status'].items():
+            lines.append('{:<14} {:>12,}'.format(status, count))
+        lines += ['', '{:<14}'.format('') + ''.join(
+            '{:>12}'.format(name) for name in summary['size'])]
+        for label, name in (('Size (bytes)', 'size'),
+                            ('Duration (ms)', 'duration')):
+            lines.append('{:<14}'.format(label) + ''.join(
+                '{:>12}'.format(_format_number(value))
+                for value in summary[name].values()))
+        lines += ['', '{:<40} {:>12}'.format('Domain', 'Requests')]
+        for domain, count in summary['domains'].items():
+            lines.append('{:<40} {:>12,}'.format(domain, count))
+        lines += ['', 'Slowest requests']
+        for request in summary['slowest']:
+            lines.append('{:>10,} ms  {}  {}'.format(
+                request['duration'], request['status'], request['url']))
+        return '\n'.join(lines)
+
+
+class ItemsSummary:
+    """Summarize job items: fill rate and value types of every field."""
+
+    def __init__(self):
+        self.count = 0
+        self.fields = {}
+
+    def add(self, item):
+        self.count += 1
+        for field, value in item.items():
+            types = self.fields.setdefault(field, {})
+            type_name = _TYPE_NAMES.get(type(value), type(value).__name__)
+            types[type_name] = types.get(type_name, 0) + 1
+
+    def to_dict(self):
+        fields = {}
+        for field, types in self.fields.items():
+            filled = sum(count for type_name, count in types.items()
+                         if type_name != 'null')
+            fields[field] = {
+                'fill_rate': filled / self.count,
+                'types': dict(sorted(types.items(), key=lambda item: -item[1])),
+            }
+        return {'items': self.count, 'fields': fields}
+
+    def format_table(self):
+        summary = self.to_dict()
+        lines = ['Items: {:,}'.format(summary['items']), '',
+                 '{:<30} {:>8}  {}'.format('Field', 'Filled', 'Types')]
+        for field, stats in summary['fields'].items():
+            lines.append('{:<30} {:>7.1%}  {}'.format(
+                field, stats['fill_rate'], ', '.join(
+                    '{} {:,}'.format(type_name, count)
+                    for type_name, count in stats['types'].items())))
+        return '\n'.join(lines)
+
+
+_TYPE_NAMES = {
+    type(None): 'null',
+    bool: 'boolean',
+    int: 'integer',
+    float: 'float',
+    str: 'string',
+    list: 'list',
+    dict: 'object',
+}
+
+
+def _format_number(value):
+    if value is None:
+        return '-'
+    return '{:,.0f}'.format(value)
+
+
+def print_summary(entries, summary, fmt='table'):
+    """
+    Add the decoded `entries` to `summary` (a `RequestsSummary` or
+    `ItemsSummary`), consuming them in a background thread, and print the
+    result in the given format.
+    """
+    producer = BackgroundIterator(entries)
+    try:
+        for entry in producer:
+            summary.add(entry)
+    finally:
+        producer.stop()
+    if fmt == 'json':
+        click.echo(json.dumps(summary.to_dict(), indent=2))
+    else:
+        click.echo(summary.format_table())
@@ -5,7 +5,9 @@ import click
 from dotenv import dotenv_values, find_dotenv
 
 import shub
-from shub.utils import update_available
+from shub.profiling import CommandProfiler
+from shub.trace import start_tracing, stop_tracing
+from shub.utils import disable_http_cache, update_available
 
 
 HELP = """
@@ -40,14 +42,50 @@ def _load_dotenv_apikey(dotenv_path: str | None) -> None:
         os.environ['SHUB_APIKEY'] = apikey
 
 
-@click.group(help=HELP, short_help=SHORT_HELP, epilog=EPILOG,
+class ShubGroup(click.Group):
+
+    def parse_args(self, ctx, args):
+        # --profile only takes a value as --profile=FILE, so that a bare
+        # --profile is not given the command name as value
+        args = list(args)
+        for i, arg in enumerate(args):
+            if arg in self.commands:
+                break
+            if arg == '--profile':
+                args[i] = '--profile='
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=ShubGroup, help=HELP, short_help=SHORT_HELP, epilog=EPILOG,
              context_settings=CONTEXT_SETTINGS)
 @click.option('--dotenv-path', default=None, type=click.Path(dir_okay=False),
               help="Path to a .env file to read the SHUB_APIKEY environment variable from."
                    " Defaults to the '.env' file in the current directory.")
+@click.option('--no-http-cache', is_flag=True,
+              help="Do not serve the responses of read-only API calls (e.g."
+                   " project settings or egg lists) from the local cache. See"
+                   " the --no-cache option of items, log, requests and jobs"
+                   " for the cached job data.")
+@click.option('--trace', 'trace_path', envvar='SHUB_TRACE', default=None,
+              type=click.Path(dir_okay=False, writable=True),
+              help="Write a JSON line per HTTP request to this file, and print"
+                   " a summary per endpoint at exit. Can also be set through"
+                   " the SHUB_TRACE environment variable.")
+@click.option('--profile', 'profile_path', default=None, metavar='[=FILE]',
+              help="Profile the command, print the functions it spent the"
+                   " most time in, and save the profile to FILE if given.")
 @click.version_option(shub.__version__)
-def cli(dotenv_path: str | None) -> None:
+def cli(dotenv_path: str | None, no_http_cache: bool, trace_path: str | None,
+        profile_path: str | None) -> None:
+    if profile_path is not None:
+        profiler = CommandProfiler(profile_path or None)
+        click.get_current_context().call_on_close(profiler.stop)
     _load_dotenv_apikey(dotenv_path)
+    if no_http_cache:
+        disable_http_cache()
+    if trace_path:
+        start_tracing(trace_path)
+        click.get_current_context().call_on_close(stop_tracing)
     update_url = update_available()
     if update_url:
         click.echo("INFO: A newer version of shub is available. Update "
@@ -71,6 +109,7 @@ commands = [
     "migrate_eggs",
     "image",
     "cancel",
+    "jobs",
 ]
 
 for command in commands:
@@ -0,0 +1,98 @@
+"""
+Tracing of the HTTP requests sent by shub, for ``shub --trace FILE`` or the
+``SHUB_TRACE`` environment variable.
+
+Every request is written to the trace file as a JSON line once its response
+has been consumed, with its method, URL template (the URL without its query
+string and with numeric path segments replaced by ``{id}``), status, number of
+bytes sent and received, time to first byte, total time, and number of
+retries. Times are in milliseconds, and the total time includes reading the
+response body, and thereby the time spent processing it while it streams in.
+
+A summary of the requests per endpoint is printed when tracing stops.
+"""
+import json
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+import click
+
+
+_tracer = None
+
+_ID_SEGMENT_RE = re.compile(r'(?<=/)\d+(?=/|\.|$)')
+
+
+def url_template(url):
+    """Return `url` without its query string, and with numeric path segments
+    replaced by ``{id}``."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc,
+                       _ID_SEGMENT_RE.sub('{id}', parts.path), '', ''))
+
+
+class HTTPTracer:
+    """Write traced requests to `path`, and count them per endpoint."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, entry):
+        line = json.dumps(entry)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            stats = self.endpoints.setdefault(
+                (entry['method'], entry['url']),
+                {'requests': 0, 'errors': 0, 'retries': 0, 'bytes_sent': 0,
+                 'bytes_received': 0, 'ttfb_ms': 0, 'time_ms': 0})
+            stats['requests'] += 1
+            if entry['error'] or (entry['status'] or 0) >= 400:
+                stats['errors'] += 1
+            for name in ('retries', 'bytes_sent', 'bytes_received', 'ttfb_ms',
+                         'time_ms'):
+                stats[name] += entry[name] or 0
+
+    def format_summary(self):
+        row = '{:<8} {:<60} {:>8} {:>7} {:>8} {:>12} {:>10} {:>10}'
+        lines = [row.format('Method', 'Endpoint', 'Requests', 'Errors',
+                            'Retries', 'Received', 'Avg TTFB', 'Total')]
+        for (method, url), stats in sorted(
+                self.endpoints.items(), key=lambda item: -item[1]['time_ms']):
+            lines.append(row.format(
+                method, url, stats['requests'], stats['errors'],
+                stats['retries'], '{:,}'.format(stats['bytes_received']),
+                '{:,.0f} ms'.format(stats['ttfb_ms'] / stats['requests']),
+                '{:,.0f} ms'.format(stats['time_ms'])))
+        return '\n'.join(lines)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def get_tracer():
+    """Return the active `HTTPTracer`, or `None` if tracing is off."""
+    return _tracer
+
+
+def start_tracing(path):
+    global _tracer
+    _tracer = HTTPTracer(path)
+    return _tracer
+
+
+def stop_tracing():
+    """Stop tracing, and print the summary of the traced requests."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return
+    tracer.close()
+    if tracer.endpoints:
+        click.echo(tracer.format_summary(), err=True)
+    click.echo('HTTP trace written to {}'.format(tracer.path), err=True)
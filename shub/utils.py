@@ -2,15 +2,22 @@ import setuptools  # noqa: F401
 import contextlib
 import datetime
 import errno
+import functools
+import heapq
 import json
+import logging
 import os
+import random
 import subprocess
 import sys
 import re
+import threading
 import time
 
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
+from itertools import islice
 from shutil import which
 from packaging.version import Version
 from glob import glob
@@ -23,6 +30,8 @@ import pip
 import requests
 import yaml
 from click import ParamType
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # https://github.com/scrapinghub/shub/pull/309#pullrequestreview-113977920
 try:
@@ -41,18 +50,48 @@ except:  # noqa
 from scrapinghub import ScrapinghubClient, ScrapinghubAPIError, HubstorageClient
 
 import shub
+from shub.cache import HTTPCache
 from shub.compat import to_native_str
 from shub.exceptions import (
     BadParameterException, InvalidAuthException, NotFoundException,
     RemoteErrorException, SubcommandException, DeployRequestTooLargeException,
     print_warning,
 )
+from shub.trace import get_tracer, url_template
 
 SCRAPY_CFG_FILE = os.path.expanduser("~/.scrapy.cfg")
 FALLBACK_ENCODING = 'utf-8'
 STDOUT_ENCODING = sys.stdout.encoding or FALLBACK_ENCODING
 LAST_N_LOGS = 30
 
+# Workers only upload data to hubstorage every 15 seconds, so there is no point
+# in waiting longer than that between two polls of a running job
+POLL_MIN_INTERVAL = 1
+POLL_MAX_INTERVAL = 15
+# Number of entries fetched per request when downloading a job in parallel
+PARALLEL_CHUNK_SIZE = 10000
+# Number of job summaries fetched per request when listing a project's jobs
+JOBS_PAGE_SIZE = 1000
+# Number of jobs whose state is fetched per request when waiting for jobs
+JOBSUMMARY_BATCH_SIZE = 100
+# Wire formats for downloading job data, see job_resource_iter()
+TRANSPORTS = ('auto', 'json', 'msgpack')
+# Number of consecutive entries fetched per random offset when sampling a job
+SAMPLE_RANGE_SIZE = 100
+# Number of ranges fetched concurrently when sampling a job
+SAMPLE_PARALLEL = 4
+
+# HTTP status codes of the responses to idempotent requests that are retried
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Base of the exponential backoff between retries, in seconds
+RETRY_BACKOFF_FACTOR = 0.5
+# Number of connections per host kept alive by the shared HTTP connection
+# pool, see get_http_session(). Can be overridden through SHUB_HTTP_POOL_SIZE
+HTTP_POOL_SIZE = 10
+# Number of times idempotent requests sent through the shared HTTP connection
+# pool are retried
+HTTP_RETRIES = 3
+
 # 50MB for a whole request, reserve 5KB for meta info (e.g. headers)
 REQUEST_FILES_SIZE_LIMIT = 50 * 1024 * 1024 - 5 * 1024
 
@@ -79,10 +118,289 @@ def remember_cwd():
         os.chdir(current_dir)
 
 
-def get_scrapinghub_client_from_config(conf):
-    return ScrapinghubClient(
-        conf.apikey, dash_endpoint=conf.endpoint
-    )
+def get_scrapinghub_client_from_config(conf, pool_size=None, retries=0):
+    """
+    Return a python-scrapinghub client for the given target configuration.
+    See `get_scrapinghub_client` for `pool_size` and `retries`.
+    """
+    return get_scrapinghub_client(conf.apikey, conf.endpoint, pool_size,
+                                  retries)
+
+
+def get_scrapinghub_client(apikey, endpoint=None, pool_size=None, retries=0):
+    """
+    Return a python-scrapinghub client whose Dash and hubstorage requests go
+    through the shared HTTP connection pool (see `get_http_session`), or
+    through a dedicated one if `pool_size` or `retries` are given (see
+    `mount_http_adapter`).
+    """
+    client = ScrapinghubClient(apikey, dash_endpoint=endpoint)
+    for session in (client._connection._session, client._hsclient.session):
+        if pool_size or retries:
+            mount_http_adapter(session, pool_size, retries)
+        else:
+            _mount_adapter(session, get_http_adapter())
+    return client
+
+
+def get_hubstorage_client(apikey, pool_size=None):
+    """
+    Return a python-hubstorage client using the shared HTTP connection pool,
+    or a dedicated one keeping up to `pool_size` connections.
+    """
+    hsc = HubstorageClient(auth=apikey)
+    if pool_size:
+        mount_http_adapter(hsc.session, pool_size)
+    else:
+        _mount_adapter(hsc.session, get_http_adapter())
+    return hsc
+
+
+def mount_http_adapter(session, pool_size=None, retries=0):
+    """
+    Mount an adapter on the requests `session` that keeps up to `pool_size`
+    connections per host, and retries requests up to `retries` times, with
+    exponential backoff and honouring ``Retry-After`` headers (see
+    `ThrottledRetry`).
+    """
+    _mount_adapter(session, _make_http_adapter(pool_size, retries,
+                                               retry_class=ThrottledRetry))
+
+
+class ThrottledRetry(Retry):
+    """
+    Retry idempotent requests that could not connect, failed to read the
+    response or got one of the `RETRY_STATUSES`, and other requests (e.g. a
+    POST scheduling a job) only if they could not connect or were throttled
+    (429), as the server may have processed them otherwise.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _make_http_adapter(pool_size=None, retries=0,
+                       retry_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                       retry_class=Retry, adapter_class=None, **kwargs):
+    if pool_size:
+        kwargs['pool_maxsize'] = pool_size
+    if retries:
+        kwargs['max_retries'] = retry_class(
+            total=retries, status_forcelist=RETRY_STATUSES,
+            allowed_methods=retry_methods,
+            backoff_factor=RETRY_BACKOFF_FACTOR, raise_on_status=False,
+        )
+    return (adapter_class or TracingHTTPAdapter)(**kwargs)
+
+
+def _mount_adapter(session, adapter):
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+class TracingHTTPAdapter(HTTPAdapter):
+    """
+    HTTP adapter reporting the requests it sends to the active
+    `shub.trace.HTTPTracer`, if any, once their response has been consumed.
+    """
+
+    def send(self, request, **kwargs):
+        tracer = get_tracer()
+        if tracer is None:
+            return super().send(request, **kwargs)
+        entry = {
+            'method': request.method,
+            'url': url_template(request.url),
+            'status': None,
+            'bytes_sent': _body_size(request.body),
+            'bytes_received': 0,
+            'ttfb_ms': None,
+            'time_ms': None,
+            'retries': 0,
+            'error': None,
+        }
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception as e:
+            entry['error'] = '{}: {}'.format(type(e).__name__, e)
+            entry['time_ms'] = _elapsed_ms(start)
+            tracer.record(entry)
+            raise
+        entry['ttfb_ms'] = _elapsed_ms(start)
+        entry['status'] = response.status_code
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None:
+            entry['retries'] = len(retries.history)
+        response.raw = _TracedBody(response.raw, tracer, entry, start)
+        return response
+
+
+class _TracedBody:
+    """Wrap the urllib3 response of a traced request, recording the request
+    once its body has been read or it is closed."""
+
+    def __init__(self, raw, tracer, entry, start):
+        self._raw = raw
+        self._tracer = tracer
+        self._entry = entry
+        self._start = start
+        self._recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _record(self):
+        if self._recorded:
+            return
+        self._recorded = True
+        self._entry['bytes_received'] = self._raw.tell()
+        self._entry['time_ms'] = _elapsed_ms(self._start)
+        self._tracer.record(self._entry)
+
+    def stream(self, *args, **kwargs):
+        yield from self._raw.stream(*args, **kwargs)
+        self._record()
+
+    def read(self, amt=None, *args, **kwargs):
+        data = self._raw.read(amt, *args, **kwargs)
+        if amt is None or not data:
+            self._record()
+        return data
+
+    def close(self):
+        self._raw.close()
+        self._record()
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, bytes):
+        return len(body)
+    return None
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class CachingHTTPAdapter(TracingHTTPAdapter):
+    """
+    HTTP adapter serving GET requests to the endpoints cached by `cache` (a
+    `shub.cache.HTTPCache`, or `None` to disable caching) from it, and
+    revalidating expired responses through ``If-None-Match``.
+    """
+
+    def __init__(self, cache=None, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        ttl = None
+        if self.cache is not None and request.method == 'GET':
+            ttl = self.cache.ttl(request.url)
+        if not ttl:
+            return super().send(request, **kwargs)
+        key = self.cache.key(request.method, request.url,
+                             request.headers.get('Authorization'))
+        entry = self.cache.get(key)
+        if entry and entry['expires'] > time.time():
+            return _build_cached_response(request, entry)
+        if entry and entry['etag']:
+            request.headers['If-None-Match'] = entry['etag']
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry:
+            response.close()
+            entry['expires'] = time.time() + ttl
+            self.cache.set(key, entry)
+            return _build_cached_response(request, entry)
+        if (response.status_code == 200 and
+                'no-store' not in response.headers.get('Cache-Control', '')):
+            self.cache.set(key, {
+                'expires': time.time() + ttl,
+                'etag': response.headers.get('ETag'),
+                'headers': dict(response.headers),
+                'content': response.content,
+            })
+        return response
+
+
+def _build_cached_response(request, entry):
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.headers = requests.structures.CaseInsensitiveDict(
+        entry['headers'])
+    response.encoding = requests.utils.get_encoding_from_headers(
+        response.headers)
+    response._content = entry['content']
+    response.url = request.url
+    response.request = request
+    return response
+
+
+_http_lock = threading.Lock()
+_http_adapter = None
+_http_session = None
+
+
+def get_http_pool_size():
+    value = os.environ.get('SHUB_HTTP_POOL_SIZE')
+    if not value:
+        return HTTP_POOL_SIZE
+    try:
+        pool_size = int(value)
+    except ValueError:
+        pool_size = 0
+    if pool_size < 1:
+        raise BadParameterException(
+            "SHUB_HTTP_POOL_SIZE must be a positive integer, got %r" % value)
+    return pool_size
+
+
+def get_http_adapter():
+    """
+    Return the process-wide HTTP adapter. It keeps up to `get_http_pool_size()`
+    connections alive per host, and retries idempotent requests that could not
+    connect or got a response with one of the `RETRY_STATUSES` up to
+    `HTTP_RETRIES` times. Requests that could not connect are retried whatever
+    their method, as they never reached the server.
+
+    The responses of read-only API calls are cached on disk, see
+    `CachingHTTPAdapter` and `disable_http_cache`.
+    """
+    global _http_adapter
+    with _http_lock:
+        if _http_adapter is None:
+            _http_adapter = _make_http_adapter(
+                get_http_pool_size(), HTTP_RETRIES,
+                adapter_class=CachingHTTPAdapter, cache=HTTPCache())
+        return _http_adapter
+
+
+def disable_http_cache():
+    """Neither serve responses from, nor store them in, the HTTP cache."""
+    get_http_adapter().cache = None
+
+
+def get_http_session():
+    """
+    Return the process-wide requests session, which sends its requests
+    through the shared connection pool of `get_http_adapter()`, so that
+    connections are reused across the requests of a command.
+    """
+    global _http_session
+    adapter = get_http_adapter()
+    with _http_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            _mount_adapter(_http_session, adapter)
+        return _http_session
 
 
 def create_default_setup_py(**kwargs):
@@ -101,8 +419,8 @@ def make_deploy_request(url, data, files, auth, verbose, keep_log):
     _check_deploy_files_size(files)
     last_logs = deque(maxlen=LAST_N_LOGS)
     try:
-        rsp = requests.post(url=url, auth=auth, data=data, files=files,
-                            stream=True, timeout=300)
+        rsp = get_http_session().post(url=url, auth=auth, data=data,
+                                      files=files, stream=True, timeout=300)
         rsp.raise_for_status()
         write_and_echo_logs(keep_log, last_logs, rsp, verbose)
         return True
@@ -449,15 +767,119 @@ def get_job_specs(job):
             targetconf.apikey)
 
 
-def get_job(job):
+def get_job(job, pool_size=None):
+    """
+    Return the python-hubstorage job of the given job ID (see
+    `get_job_specs`). Its client uses the shared HTTP connection pool, or a
+    dedicated one if `pool_size` connections, e.g. one per thread of a
+    parallel download, would not fit in it.
+    """
     jobid, apikey = get_job_specs(job)
-    hsc = HubstorageClient(auth=apikey)
+    if pool_size is not None and pool_size <= get_http_pool_size():
+        pool_size = None
+    hsc = get_hubstorage_client(apikey, pool_size)
+    return _get_hubstorage_job(hsc, jobid)
+
+
+def get_jobs(job_specs, pool_size=None):
+    """
+    Given a list of (job ID, API key) pairs as returned by `get_job_specs`,
+    return the corresponding python-hubstorage jobs. Jobs sharing an API key
+    share one client, which uses the shared HTTP connection pool, or a
+    dedicated one holding up to `pool_size` connections if given.
+    """
+    clients = {}
+    jobs = []
+    for jobid, apikey in job_specs:
+        if apikey not in clients:
+            clients[apikey] = get_hubstorage_client(apikey, pool_size)
+        jobs.append(_get_hubstorage_job(clients[apikey], jobid))
+    return jobs
+
+
+def _get_hubstorage_job(hsc, jobid):
     job = hsc.get_job(jobid)
     if not job.metadata:
         raise NotFoundException(f'Job {jobid} does not exist')
     return job
 
 
+def iter_job_summaries(project, page_size=JOBS_PAGE_SIZE, **filters):
+    """
+    Iterate through the summaries of all jobs of a python-scrapinghub
+    `project` that match the given `filters` (see
+    ``scrapinghub.client.jobs.Jobs.iter``), fetching them page by page.
+    """
+    start = 0
+    while True:
+        page = list(project.jobs.iter(start=start, count=page_size,
+                                      **filters))
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def wait_for_jobs(project, job_keys, poll_interval=POLL_MAX_INTERVAL):
+    """
+    Wait for the jobs of a python-hubstorage `project` with the given keys to
+    finish, and yield (job key, close reason) pairs as they do. The states of
+    all jobs are polled every `poll_interval` seconds, through one request per
+    `JOBSUMMARY_BATCH_SIZE` jobs rather than one per job.
+    """
+    pending = list(job_keys)
+    while True:
+        summaries = {}
+        for start in range(0, len(pending), JOBSUMMARY_BATCH_SIZE):
+            for summary in project.jobq.jobsummary(
+                    pending[start:start + JOBSUMMARY_BATCH_SIZE],
+                    ['state', 'close_reason']):
+                summaries[summary['key']] = summary
+        still_pending = []
+        for key in pending:
+            # Jobs that were just scheduled may not be listed yet
+            summary = summaries.get(key, {})
+            if summary.get('state') in ('finished', 'deleted'):
+                yield key, summary.get('close_reason') or summary['state']
+            else:
+                still_pending.append(key)
+        pending = still_pending
+        if not pending:
+            return
+        time.sleep(poll_interval)
+
+
+def select_job_specs(target, spider=None, tags=(), states=(), since=None,
+                     until=None):
+    """
+    Return (job ID, API key) pairs, like `get_job_specs`, for all jobs of the
+    given target's project matching a spider name, any of the given tags and
+    states, and that entered their state after `since` and before `until`
+    (datetimes).
+    """
+    # XXX: Lazy import due to circular dependency
+    from shub.config import get_target_conf
+    targetconf = get_target_conf(target)
+    client = get_scrapinghub_client_from_config(targetconf)
+    filters = {}
+    if spider:
+        filters['spider'] = spider
+    if tags:
+        filters['has_tag'] = list(tags)
+    if states:
+        filters['state'] = list(states)
+    if since:
+        filters['startts'] = int(since.timestamp() * 1000)
+    if until:
+        filters['endts'] = int(until.timestamp() * 1000)
+    try:
+        project = client.get_project(targetconf.project_id)
+        return [(summary['key'], targetconf.apikey)
+                for summary in iter_job_summaries(project, **filters)]
+    except ScrapinghubAPIError as e:
+        raise RemoteErrorException(str(e))
+
+
 def closest_file(filename, path='.', prevpath=None):
     """
     Return the path to the closest file with the given filename by traversing
@@ -547,8 +969,104 @@ def job_live(job, refresh_meta_after=60):
     return job.metadata['state'] in ('pending', 'running')
 
 
+class AdaptivePoller:
+    """
+    Decide how long to wait before polling a live job resource again: poll
+    immediately while new data keeps coming in, and back off exponentially,
+    from `poll_min` up to `poll_max` seconds, while polls come back empty.
+    """
+
+    def __init__(self, poll_min=POLL_MIN_INTERVAL, poll_max=POLL_MAX_INTERVAL,
+                 backoff_factor=2):
+        self.poll_min = poll_min
+        self.poll_max = max(poll_min, poll_max)
+        self.backoff_factor = backoff_factor
+        self.interval = 0
+
+    def next_interval(self, got_data):
+        if got_data:
+            self.interval = 0
+        else:
+            self.interval = min(
+                self.poll_max,
+                max(self.poll_min, self.interval * self.backoff_factor),
+            )
+        return self.interval
+
+
+class TokenBucket:
+    """
+    Thread-safe rate limiter letting through `rate` calls per second on
+    average, in bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a call is allowed, and take its token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def build_resource_query(fields=(), filters=(), level=None, start_time=None,
+                         end_time=None):
+    """
+    Return the hubstorage query parameters selecting only the given `fields`
+    of the entries of a job resource that match all `filters`, given as JSON
+    filter expressions (e.g. ``'["size", ">", [30000]]'``). For logs, `level`
+    is the minimum level name (e.g. ``'WARNING'``), and `start_time` and
+    `end_time` (datetimes) bound the time range of the entries.
+    """
+    query = {}
+    if fields:
+        query['fields'] = [field.strip() for spec in fields
+                           for field in spec.split(',') if field.strip()]
+    filter_data = []
+    for expr in filters:
+        try:
+            parsed = json.loads(expr)
+        except ValueError:
+            parsed = None
+        if (not isinstance(parsed, list) or len(parsed) != 3 or
+                not isinstance(parsed[2], list)):
+            raise BadParameterException(
+                "Filters must be JSON lists of a field name, an operator "
+                "and a list of values, e.g. '[\"size\", \">\", [30000]]', "
+                "got {}".format(expr),
+                param_hint='filter')
+        filter_data.append(json.dumps(parsed))
+    if level:
+        filter_data.append(json.dumps(
+            ['level', '>=', [logging.getLevelName(level.upper())]]))
+    if filter_data:
+        query['filter'] = filter_data
+    if start_time:
+        query['startts'] = int(start_time.timestamp() * 1000)
+    if end_time:
+        query['endts'] = int(end_time.timestamp() * 1000)
+    return query
+
+
 def job_resource_iter(job, resource, output_json=False, follow=True,
-                      tail=None):
+                      tail=None, poll_min=POLL_MIN_INTERVAL,
+                      poll_max=POLL_MAX_INTERVAL, parallel=1, cache=None,
+                      startafter=None, query=None, transport='auto',
+                      stop=None):
     """
     Given a python-hubstorage job and resource (e.g. job.items), return a
     generator that periodically checks the job resource and yields its items.
@@ -556,32 +1074,366 @@ def job_resource_iter(job, resource, output_json=False, follow=True,
 
     As a handy shortcut, iter_func will be iterated through only once if
     `follow` is set to `False`.
+
+    While following, the resource is polled again right away if the last poll
+    returned new data, and otherwise after a delay growing from `poll_min` to
+    `poll_max` seconds (see `AdaptivePoller`). The job state is refreshed on
+    the same cadence.
+
+    If `parallel` is greater than one and the job is no longer live, the
+    resource is downloaded through that many concurrent connections (see
+    `_iter_parallel`).
+
+    If a `shub.cache.JobCache` is given and the job is no longer live, the
+    resource is served from the cache if available. Otherwise, complete
+    downloads (i.e. without `tail` or `startafter`) are stored in the cache.
+
+    Entries up to the `startafter` key (e.g. ``'1/2/3/41'``) are skipped, and
+    if `stop` is given, only entries before the entry number `stop` are
+    fetched, without following. Neither can be combined with `tail`.
+
+    `query` holds additional hubstorage query parameters, such as those
+    returned by `build_resource_query`, so that the server only sends the
+    requested data. With a query, the cache is not used. With a query
+    filtering entries, `tail` counts the entries before filtering, and
+    parallel downloads are not used, since they rely on sequential keys.
+
+    `transport` selects the wire format of downloads that are not followed:
+    'json', or 'msgpack', which is cheaper to decode and smaller but only
+    served for items and logs, and requires the msgpack package (the client
+    silently falls back to JSON otherwise). 'auto' uses msgpack unless the
+    caller wants JSON lines, which can then be passed through undecoded, or
+    the download fills the cache.
     """
-    last_item_key = None
+    query = query or {}
+    if query:
+        cache = None
+    if _query_skips_entries(query):
+        parallel = 1
+    if stop is not None:
+        follow = False
+    # Entry keys are sequential: {job.key}/0, {job.key}/1, ...
+    first = 0 if startafter is None else int(startafter.rsplit('/', 1)[1]) + 1
+    live = job_live(job)
+    if not live:
+        follow = False
+        if cache is not None:
+            cached = cache.get(job.key, resource.resource_type)
+            if cached is not None:
+                if tail is not None:
+                    first = cached.total - tail
+                for json_line in cached.iter_lines(first, stop):
+                    yield json_line if output_json else json.loads(json_line)
+                return
+    last_item_key = startafter
+    total_nr_items = None
     if tail is not None:
         total_nr_items = resource.stats()['totals']['input_values']
         # This is the last entry to be skipped, i.e. it will NOT be displayed
         last_item = total_nr_items - tail - 1
         if last_item >= 0:
             last_item_key = f'{job.key}/{last_item}'
-    if not job_live(job):
-        follow = False
-    resource_iter = resource.iter_json if output_json else resource.iter_values
+    fill_cache = (cache is not None and not live and tail is None and
+                  startafter is None and stop is None)
+    fetch_values = _fetches_values(
+        transport, output_json, fill_cache,
+        ranged=not follow and (parallel > 1 or stop is not None))
+    resource_iter = _get_resource_iter(resource, fetch_values, query)
     if not follow:
-        for item in resource_iter(startafter=last_item_key):
-            yield item
+        if parallel > 1:
+            if total_nr_items is None:
+                total_nr_items = resource.stats()['totals']['input_values']
+            if tail is not None:
+                first = max(total_nr_items - tail, 0)
+            end = total_nr_items if stop is None else min(stop,
+                                                          total_nr_items)
+            chunk_size = PARALLEL_CHUNK_SIZE
+            entries = _iter_parallel(
+                job, resource_iter,
+                ((start, min(start + chunk_size, end))
+                 for start in range(first, end, chunk_size)),
+                parallel,
+            )
+        elif stop is not None:
+            count = max(stop - first, 0)
+            # The client's retries of JSON downloads resume from the last
+            # received key but keep the original count, so cap the range here
+            entries = islice(
+                resource_iter(startafter=last_item_key, count=count), count)
+        else:
+            entries = resource_iter(startafter=last_item_key)
+        if fill_cache:
+            try:
+                cache_writer = cache.writer(job.key, resource.resource_type)
+            except OSError as e:
+                _warn_cache_not_written(e)
+                fill_cache = False
+        if fill_cache:
+            if total_nr_items is None:
+                total_nr_items = resource.stats()['totals']['input_values']
+            entries = _iter_filling_cache(
+                entries, cache_writer, json_lines=not fetch_values,
+                total=total_nr_items,
+            )
+        yield from _convert_entries(entries, fetch_values, output_json)
         return
+    poller = AdaptivePoller(poll_min, poll_max)
+    live = True
     while True:
+        last_json_line = None
         # XXX: Always use iter_json until Kumo team fixes iter_values to also
         # return '_key'
-        for json_line in resource.iter_json(startafter=last_item_key):
-            item = json.loads(json_line)
-            last_item_key = item['_key']
-            yield json_line if output_json else item
-        if not job_live(job):
+        for json_line in resource.iter_json(startafter=last_item_key,
+                                            **query):
+            last_json_line = json_line
+            yield json_line if output_json else json.loads(json_line)
+        if last_json_line is not None:
+            # We only need the key to resume from, so there is no need to
+            # decode every entry when the caller wants JSON
+            last_item_key = json.loads(last_json_line)['_key']
+        if not live:
             break
-        # Workers only upload data to hubstorage every 15 seconds
-        time.sleep(15)
+        interval = poller.next_interval(last_json_line is not None)
+        if interval:
+            time.sleep(interval)
+        # Once the job is reported as finished, we poll one last time to catch
+        # the data uploaded between our previous poll and the job's end
+        live = job_live(job, refresh_meta_after=interval)
+
+
+def job_resource_sample(job, resource, size, output_json=False,
+                        parallel=SAMPLE_PARALLEL, cache=None, query=None,
+                        transport='auto', range_size=None):
+    """
+    Return a generator yielding a uniform random sample of `size` entries of a
+    python-hubstorage job resource, in key order, without downloading all of
+    it: the sample is made of ranges of `range_size` consecutive entries at
+    random offsets, fetched through `parallel` concurrent connections, so that
+    the transfer only depends on the sample size.
+
+    The other arguments are those of `job_resource_iter`.
+    """
+    range_size = range_size or SAMPLE_RANGE_SIZE
+    query = query or {}
+    if query:
+        cache = None
+    cached = None
+    if cache is not None and not job_live(job):
+        cached = cache.get(job.key, resource.resource_type)
+    if cached is not None:
+        total = cached.total
+    else:
+        total = resource.stats()['totals']['input_values']
+    ranges = _sample_ranges(total, size, range_size)
+    if cached is not None:
+        entries = (json_line for start, stop in ranges
+                   for json_line in cached.iter_lines(start, stop))
+        yield from islice(_convert_entries(entries, False, output_json), size)
+        return
+    fetch_values = _fetches_values(transport, output_json, False, ranged=True)
+    entries = _iter_parallel(
+        job, _get_resource_iter(resource, fetch_values, query), ranges,
+        parallel)
+    yield from islice(_convert_entries(entries, fetch_values, output_json),
+                      size)
+
+
+def _sample_ranges(total, size, range_size):
+    """
+    Return the sorted (start, stop) offsets of the ranges of at most
+    `range_size` entries making up a uniform random sample of `size` of
+    `total` entries.
+    """
+    nr_ranges = -(-size // range_size)
+    # Only full ranges are drawn, so that every one holds `range_size`
+    # entries, and the entries in excess are taken off a random one of them
+    full_starts = range(0, total - range_size + 1, range_size)
+    if len(full_starts) < nr_ranges:
+        # The sample is (almost) the whole resource
+        return [(start, min(start + range_size, total))
+                for start in range(0, total, range_size)]
+    starts = random.sample(full_starts, nr_ranges)
+    surplus = nr_ranges * range_size - size
+    ranges = [(start, start + range_size) for start in starts]
+    ranges[0] = (starts[0], starts[0] + range_size - surplus)
+    return sorted(ranges)
+
+
+def _query_skips_entries(query):
+    """
+    Return whether the given hubstorage query parameters filter out entries,
+    so that the keys of those returned are not sequential.
+    """
+    return any(param in query for param in ('filter', 'startts', 'endts'))
+
+
+def _fetches_values(transport, output_json, fill_cache, ranged=False):
+    """
+    Return whether to fetch decoded values rather than JSON lines. Ranges of
+    entries (`ranged`) are always fetched as JSON lines: when retried, the
+    client resumes JSON downloads after the last received entry, but restarts
+    msgpack ones from the start of the range, feeding the same entries again.
+    """
+    if ranged:
+        return False
+    if transport == 'auto':
+        # The cache stores JSON lines, and encoding decoded values costs more
+        # than decoding JSON saves (see tests/benchmarks/transport.py)
+        return not output_json and not fill_cache
+    return transport == 'msgpack'
+
+
+def _get_resource_iter(resource, fetch_values, query):
+    # iter_values() decodes msgpack if available, iter_json() yields raw lines
+    resource_iter = resource.iter_values if fetch_values else resource.iter_json
+    if query:
+        return functools.partial(resource_iter, **query)
+    return resource_iter
+
+
+def _convert_entries(entries, values, output_json):
+    """
+    Convert `entries`, decoded values if `values` is set or JSON lines
+    otherwise, to JSON lines if `output_json` is set, or to values otherwise.
+    """
+    if values and output_json:
+        return map(json.dumps, entries)
+    if not values and not output_json:
+        return map(json.loads, entries)
+    return entries
+
+
+class _FollowedJob:
+    """Polling state of one of the jobs followed by `jobs_resource_iter`."""
+
+    def __init__(self, job, poll_min, poll_max):
+        self.job = job
+        self.poller = AdaptivePoller(poll_min, poll_max)
+        self.last_item_key = None
+        # The metadata of freshly loaded jobs needs no refresh
+        self.refresh_meta_after = 60
+
+
+def jobs_resource_iter(jobs, resource_name, output_json=False, follow=True,
+                       poll_min=POLL_MIN_INTERVAL, poll_max=POLL_MAX_INTERVAL,
+                       query=None):
+    """
+    Like `job_resource_iter`, but for the resource called `resource_name`
+    (e.g. 'items') of several python-hubstorage jobs at once, yielding
+    (job, entry) pairs.
+
+    A single scheduler polls all jobs, each whenever its own `AdaptivePoller`
+    says it is due, so that the jobs share the connection pool of their client
+    (see `get_jobs`). Jobs are dropped after one last poll once `job_live`
+    reports them finished, or after their first poll if `follow` is not set.
+    """
+    query = query or {}
+    # Heap of (next poll time, position, job)
+    schedule = [(0, idx, _FollowedJob(job, poll_min, poll_max))
+                for idx, job in enumerate(jobs)]
+    while schedule:
+        due, idx, followed = heapq.heappop(schedule)
+        delay = due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        job = followed.job
+        live = job_live(job, refresh_meta_after=followed.refresh_meta_after)
+        resource = getattr(job, resource_name)
+        last_json_line = None
+        for json_line in resource.iter_json(
+                startafter=followed.last_item_key, **query):
+            last_json_line = json_line
+            yield job, json_line if output_json else json.loads(json_line)
+        if last_json_line is not None:
+            followed.last_item_key = json.loads(last_json_line)['_key']
+        if not follow or not live:
+            continue
+        interval = followed.poller.next_interval(last_json_line is not None)
+        followed.refresh_meta_after = interval
+        heapq.heappush(schedule, (time.time() + interval, idx, followed))
+
+
+def _warn_cache_not_written(error):
+    print_warning("Cannot write to the job data cache ({}), not caching this "
+                  "download".format(error))
+
+
+def _iter_filling_cache(entries, cache_writer, json_lines=True, total=None):
+    """
+    Yield the given entries while writing them through `cache_writer`, which
+    is only committed once all entries have been consumed, and if there are
+    `total` of them. Entries are JSON lines, or decoded values that are encoded
+    for the cache if `json_lines` is not set. Failing to write to the cache
+    does not stop the download, which is then just not cached.
+    """
+    committed = False
+    count = 0
+    try:
+        for entry in entries:
+            if cache_writer is not None:
+                try:
+                    cache_writer.write(
+                        entry if json_lines else json.dumps(entry))
+                except OSError as e:
+                    _warn_cache_not_written(e)
+                    cache_writer.abort()
+                    cache_writer = None
+            count += 1
+            yield entry
+        if cache_writer is None:
+            return
+        # The client gives up silently after failing to read entries a few
+        # times, don't serve such a truncated download as the whole job
+        if total is not None and count != total:
+            print_warning("Received {:,} of {:,} entries, not caching the "
+                          "incomplete download".format(count, total))
+            return
+        try:
+            cache_writer.commit()
+        except OSError as e:
+            _warn_cache_not_written(e)
+            return
+        committed = True
+    finally:
+        if not committed and cache_writer is not None:
+            cache_writer.abort()
+
+
+def _iter_parallel(job, resource_iter, ranges, parallel):
+    """
+    Yield the entries of a finished job's resource within the given (start,
+    stop) ranges of entry numbers, in order. Ranges are fetched by `parallel`
+    concurrent threads, using `startafter` and `count` since entry keys are
+    sequential (``{job.key}/{n}``).
+
+    Ranges are yielded in the order they were submitted, and only up to twice
+    as many ranges as there are threads are fetched ahead of the consumer, so
+    memory usage is bounded by the range size rather than by the job size.
+    """
+    ranges = iter(ranges)
+
+    def fetch(entry_range):
+        start, stop = entry_range
+        startafter = f'{job.key}/{start - 1}' if start else None
+        # The client's retries of JSON downloads resume from the last received
+        # key but keep the original count, so cap the range here
+        return list(islice(
+            resource_iter(startafter=startafter, count=stop - start),
+            stop - start,
+        ))
+
+    executor = ThreadPoolExecutor(max_workers=parallel)
+    try:
+        pending = deque(executor.submit(fetch, entry_range)
+                        for entry_range in islice(ranges, 2 * parallel))
+        while pending:
+            chunk = pending.popleft().result()
+            entry_range = next(ranges, None)
+            if entry_range is not None:
+                pending.append(executor.submit(fetch, entry_range))
+            yield from chunk
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def latest_github_release(force_update=False, timeout=1., cache=None):
@@ -694,7 +1546,7 @@ def has_project_access(project, endpoint, apikey):
     """Check whether an API key has access to a given project. May raise
     InvalidAuthException if the API key is invalid (but not if it is valid but
     lacks access to the project)"""
-    client = ScrapinghubClient(apikey, dash_endpoint=endpoint)
+    client = get_scrapinghub_client(apikey, endpoint)
     try:
         return project in client.projects.list()
     except ScrapinghubAPIError as e:
@@ -0,0 +1,325 @@
+"""
+Local stand-in for the Scrapy Cloud (Dash) and hubstorage HTTP APIs used by
+shub, with configurable latency and bandwidth, so that shub's network code
+paths can be exercised end to end without mocking `requests`.
+
+It implements:
+
+* ``POST /api/scrapyd/addversion.json`` and ``POST /api/eggs/add.json``, which
+  read the uploaded body and stream back a deploy log;
+* ``GET /api/eggs/bundle.zip`` and ``GET /api/eggs/list.json``;
+* ``POST /api/releases/deploy.json``, pointing to a status URL that reports
+  progress for `status_polls` polls before the release succeeds;
+* ``GET /jobs/P/S/J`` (job metadata) and ``GET /items/P/S/J``, ``/logs/...``
+  and ``/requests/...``, with ``startafter``, ``start`` and ``count``, their
+  ``stats``, and msgpack responses for items and logs.
+
+Each response is delayed by `latency` seconds, and request and response
+bodies are transferred at up to `bandwidth` bytes per second.
+"""
+import io
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Size of the blocks in which bodies are throttled to the bandwidth
+TRANSFER_BLOCK_SIZE = 64 * 1024
+
+_JOB_RESOURCE_RE = re.compile(
+    r'^/(items|logs|requests)/(\d+/\d+/\d+)(/stats)?/?$')
+_JOB_META_RE = re.compile(r'^/jobs/(\d+/\d+/\d+)/?$')
+_RELEASE_STATUS_RE = re.compile(r'^/api/releases/deploy/(\d+)\.json$')
+
+
+def make_entries(job_key, resource, start, count):
+    """Return `count` synthetic entries of a job resource, numbered from
+    `start`."""
+    if resource == 'items':
+        return [{
+            '_key': f'{job_key}/{idx}',
+            '_type': 'ProductItem',
+            'url': f'https://example.com/products/{idx}',
+            'name': f'Product number {idx}',
+            'price': idx * 1.25,
+            'in_stock': idx % 3 != 0,
+            'tags': ['electronics', 'sale', f'batch-{idx % 50}'],
+            'description': 'Lorem ipsum dolor sit amet. ' * 8,
+        } for idx in range(start, start + count)]
+    if resource == 'logs':
+        return [{
+            '_key': f'{job_key}/{idx}',
+            'time': 1700000000000 + idx,
+            'level': 20,
+            'message': f'Crawled (200) <GET https://example.com/{idx}>',
+        } for idx in range(start, start + count)]
+    return [{
+        '_key': f'{job_key}/{idx}',
+        'time': 1700000000000 + idx,
+        'url': f'https://example.com/products/{idx}',
+        'method': 'GET',
+        'status': 200,
+        'rs': 20000 + idx % 1000,
+        'duration': 100 + idx % 400,
+        'fp': f'{idx:040x}',
+    } for idx in range(start, start + count)]
+
+
+class _Job:
+
+    def __init__(self, key, state):
+        self.key = key
+        self.state = state
+        self.entries = {'items': [], 'logs': [], 'requests': []}
+
+
+class FakeScrapyCloud:
+    """
+    Serve the stand-in APIs on a local port from a background thread. Use as
+    a context manager, or call `start` and `stop`.
+    """
+
+    def __init__(self, latency=0, bandwidth=None, egg_bundle_size=1024 ** 2,
+                 status_polls=3):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.egg_bundle_size = egg_bundle_size
+        self.status_polls = status_polls
+        self.requests_count = 0
+        self.bytes_uploaded = 0
+        self._jobs = {}
+        self._releases = {}
+        self._egg_bundle = None
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def endpoint(self):
+        """Dash endpoint, as used in scrapinghub.yml."""
+        return self.url + '/api/'
+
+    @property
+    def storage_endpoint(self):
+        """hubstorage endpoint, as set through SHUB_STORAGE."""
+        return self.url + '/'
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.app = self
+        threading.Thread(target=self._httpd.serve_forever, daemon=True,
+                         name='fakeserver').start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_job(self, key, state='finished', items=0, logs=0, requests=0):
+        """Add a job with the given numbers of synthetic entries."""
+        job = _Job(key, state)
+        for resource, count in (('items', items), ('logs', logs),
+                                ('requests', requests)):
+            job.entries[resource] = [
+                json.dumps(entry)
+                for entry in make_entries(key, resource, 0, count)]
+        with self._lock:
+            self._jobs[key] = job
+
+    def append(self, key, resource, entries):
+        """Append entries (dicts, whose '_key' is set here) to a job."""
+        with self._lock:
+            job_entries = self._jobs[key].entries[resource]
+            for entry in entries:
+                entry = dict(entry, _key=f'{key}/{len(job_entries)}')
+                job_entries.append(json.dumps(entry))
+
+    def set_state(self, key, state):
+        with self._lock:
+            self._jobs[key].state = state
+
+    def egg_bundle(self):
+        with self._lock:
+            if self._egg_bundle is None:
+                buf = io.BytesIO()
+                with zipfile.ZipFile(buf, 'w') as bundle:
+                    bundle.writestr('project-1.0-py3.egg',
+                                    os.urandom(self.egg_bundle_size))
+                self._egg_bundle = buf.getvalue()
+            return self._egg_bundle
+
+    def job_meta(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            return {'state': job.state, 'spider': 'spider',
+                    'items_count': len(job.entries['items'])}
+
+    def job_entries(self, key, resource, query):
+        """Return the JSON lines of a job resource selected by `query`."""
+        first = 0
+        if 'startafter' in query:
+            first = int(query['startafter'][0].rsplit('/', 1)[1]) + 1
+        elif 'start' in query:
+            first = int(query['start'][0].rsplit('/', 1)[1])
+        last = None
+        if 'count' in query:
+            last = first + int(query['count'][0])
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            return job.entries[resource][first:last]
+
+    def new_release(self):
+        with self._lock:
+            release_id = len(self._releases) + 1
+            self._releases[release_id] = 0
+        return release_id
+
+    def poll_release(self, release_id):
+        with self._lock:
+            polls = self._releases[release_id] = self._releases[release_id] + 1
+        if polls >= self.status_polls:
+            return {'status': 'ok', 'project': 1, 'version': 'test',
+                    'spiders': 1}
+        return {'status': 'progress', 'progress': polls * 100 //
+                self.status_polls, 'total': 100}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections alive, as Scrapy Cloud does
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't let Nagle's algorithm
+    # hold back the body until the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def app(self):
+        return self.server.app
+
+    def _transfer_time(self, nbytes):
+        if not self.app.bandwidth:
+            return 0
+        return nbytes / self.app.bandwidth
+
+    def _read_body(self):
+        remaining = int(self.headers.get('Content-Length') or 0)
+        started = time.perf_counter()
+        received = 0
+        while remaining:
+            block = self.rfile.read(min(remaining, TRANSFER_BLOCK_SIZE))
+            if not block:
+                break
+            remaining -= len(block)
+            received += len(block)
+            delay = (self._transfer_time(received) -
+                     (time.perf_counter() - started))
+            if delay > 0:
+                time.sleep(delay)
+        with self.app._lock:
+            self.app.bytes_uploaded += received
+
+    def _respond(self, status, body=b'', content_type='application/json',
+                 headers=()):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        started = time.perf_counter()
+        for offset in range(0, len(body), TRANSFER_BLOCK_SIZE):
+            self.wfile.write(body[offset:offset + TRANSFER_BLOCK_SIZE])
+            sent = min(offset + TRANSFER_BLOCK_SIZE, len(body))
+            delay = (self._transfer_time(sent) -
+                     (time.perf_counter() - started))
+            if delay > 0:
+                time.sleep(delay)
+
+    def _handle(self):
+        with self.app._lock:
+            self.app.requests_count += 1
+        self._read_body()
+        if self.app.latency:
+            time.sleep(self.app.latency)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        route = (self.command, path)
+        if route in (('POST', '/api/scrapyd/addversion.json'),
+                     ('POST', '/api/eggs/add.json')):
+            log = [b'Building egg...', b'Uploading egg...',
+                   json.dumps({'status': 'ok', 'project': 1,
+                               'version': 'test', 'spiders': 1}).encode()]
+            return self._respond(200, b'\n'.join(log) + b'\n', 'text/plain')
+        if route == ('GET', '/api/eggs/bundle.zip'):
+            return self._respond(200, self.app.egg_bundle(),
+                                 'application/zip')
+        if route == ('GET', '/api/eggs/list.json'):
+            return self._respond(200, {'status': 'ok', 'eggs': [
+                {'name': 'project', 'version': '1.0'}]})
+        if route == ('POST', '/api/releases/deploy.json'):
+            release_id = self.app.new_release()
+            return self._respond(200, {}, headers=[(
+                'Location',
+                f'{self.app.url}/api/releases/deploy/{release_id}.json')])
+        match = _RELEASE_STATUS_RE.match(path)
+        if self.command == 'GET' and match:
+            return self._respond(
+                200, self.app.poll_release(int(match.group(1))))
+        match = _JOB_META_RE.match(path)
+        if self.command == 'GET' and match:
+            meta = self.app.job_meta(match.group(1))
+            if meta is None:
+                return self._respond(404, {'message': 'Not found'})
+            return self._respond(200, json.dumps(meta).encode() + b'\n')
+        match = _JOB_RESOURCE_RE.match(path)
+        if self.command == 'GET' and match:
+            return self._respond_job_resource(*match.groups(), query)
+        self._respond(404, {'message': 'Not found'})
+
+    def _respond_job_resource(self, resource, key, stats, query):
+        lines = self.app.job_entries(key, resource, {} if stats else query)
+        if lines is None:
+            return self._respond(404, {'message': 'Not found'})
+        if stats:
+            totals = {'input_values': len(lines)}
+            return self._respond(
+                200, json.dumps({'totals': totals}).encode() + b'\n')
+        if (msgpack is not None and resource != 'requests' and
+                'application/x-msgpack' in self.headers.get('Accept', '')):
+            body = b''.join(msgpack.packb(json.loads(line)) for line in lines)
+            return self._respond(200, body, 'application/x-msgpack')
+        body = ''.join(line + '\n' for line in lines).encode('utf-8')
+        self._respond(200, body, 'application/x-jsonlines')
+
+    do_GET = _handle
+    do_POST = _handle
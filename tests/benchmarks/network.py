@@ -0,0 +1,236 @@
+"""
+Measure the throughput of shub's network code paths end to end, against the
+local Scrapy Cloud stand-in of `tests.benchmarks.fakeserver`:
+
+* job items downloaded by `shub.utils.job_resource_iter`, as JSON lines, as
+  decoded values, and through parallel connections (items/s);
+* eggs uploaded by `shub.utils.make_deploy_request`, and downloaded by
+  `shub.fetch_eggs.fetch_eggs` (MB/s);
+* deploy status polls of ``shub image deploy`` (polls/s);
+* the delay between an item being stored and `job_resource_iter` yielding it
+  while following a running job (ms).
+
+Run with ``python -m tests.benchmarks.network``, see ``--help`` for the
+simulated latency and bandwidth and the sizes. Use ``--save FILE`` to store
+the results, and ``--baseline FILE`` to exit with an error when a result is
+worse than the stored one by more than ``--tolerance``.
+"""
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import urljoin
+
+import click
+
+from shub import utils
+from shub.fetch_eggs import fetch_eggs
+from shub.image import deploy as image_deploy
+
+from tests.benchmarks.fakeserver import FakeScrapyCloud
+
+
+DEFAULT_ITEMS = 50000
+DEFAULT_UPLOAD_MB = 20
+DEFAULT_EGGS_MB = 20
+DEFAULT_STATUS_POLLS = 100
+DEFAULT_FOLLOW_SECONDS = 5
+# Seconds between two items stored while following a job
+FOLLOW_ITEM_INTERVAL = 0.05
+# Relative change from the baseline above which a result is a regression
+DEFAULT_TOLERANCE = 0.2
+
+APIKEY = 'ffffffffffffffffffffffffffffffff'
+
+# Unit of every result, and whether higher values are better
+METRICS = {
+    'items_json': ('items/s', True),
+    'items_values': ('items/s', True),
+    'items_parallel': ('items/s', True),
+    'deploy_upload': ('MB/s', True),
+    'fetch_eggs': ('MB/s', True),
+    'image_status_polls': ('polls/s', True),
+    'follow_latency_p50': ('ms', False),
+    'follow_latency_max': ('ms', False),
+}
+
+
+@contextlib.contextmanager
+def _quiet():
+    # shub echoes deploy logs as bytes, which needs a file with a buffer
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def _get_job(job_key):
+    return utils.get_jobs([(job_key, APIKEY)])[0]
+
+
+def bench_items(server, items):
+    server.add_job('1/1/1', items=items)
+    results = {}
+    for name, kwargs in (
+            ('items_json', {'output_json': True}),
+            ('items_values', {'transport': 'msgpack'}),
+            ('items_parallel', {'output_json': True, 'parallel': 4})):
+        job = _get_job('1/1/1')
+        started = time.perf_counter()
+        count = sum(1 for _ in utils.job_resource_iter(
+            job, job.items, follow=False, **kwargs))
+        elapsed = time.perf_counter() - started
+        assert count == items, count
+        results[name] = count / elapsed
+    return results
+
+
+def bench_deploy_upload(server, upload_mb):
+    url = urljoin(server.endpoint, 'scrapyd/addversion.json')
+    with tempfile.TemporaryFile() as egg:
+        egg.write(os.urandom(int(upload_mb * 1024 ** 2)))
+        egg.seek(0)
+        started = time.perf_counter()
+        with _quiet():
+            utils.make_deploy_request(
+                url, {'project': 1, 'version': 'test'}, [('eggs', egg)],
+                (APIKEY, ''), verbose=False, keep_log=False)
+        elapsed = time.perf_counter() - started
+    return {'deploy_upload': upload_mb / elapsed}
+
+
+def bench_fetch_eggs(server):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        destfile = os.path.join(tmpdir, 'eggs.zip')
+        started = time.perf_counter()
+        with _quiet():
+            fetch_eggs(1, server.endpoint, APIKEY, destfile)
+        elapsed = time.perf_counter() - started
+        size_mb = os.path.getsize(destfile) / 1024 ** 2
+    return {'fetch_eggs': size_mb / elapsed}
+
+
+def bench_image_status(server, polls):
+    server.status_polls = polls
+    rsp = utils.get_http_session().post(
+        urljoin(server.endpoint, '/api/releases/deploy.json'),
+        auth=(APIKEY, ''), data={'project': 1})
+    status_url = rsp.headers['location']
+    started = time.perf_counter()
+    with mock.patch.object(image_deploy, 'SYNC_DEPLOY_REFRESH_TIMEOUT', 0):
+        events = list(
+            image_deploy._convert_status_requests_to_events(status_url))
+    elapsed = time.perf_counter() - started
+    assert events[-1]['status'] == 'ok', events
+    return {'image_status_polls': polls / elapsed}
+
+
+def bench_follow(server, seconds):
+    server.add_job('1/1/2', state='running')
+    job = _get_job('1/1/2')
+
+    def produce():
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            server.append('1/1/2', 'items', [{'stored': time.time()}])
+            time.sleep(FOLLOW_ITEM_INTERVAL)
+        server.set_state('1/1/2', 'finished')
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    latencies = [
+        (time.time() - item['stored']) * 1000
+        for item in utils.job_resource_iter(job, job.items, follow=True)
+    ]
+    producer.join()
+    return {'follow_latency_p50': statistics.median(latencies),
+            'follow_latency_max': max(latencies)}
+
+
+def run_benchmarks(latency=0, bandwidth=None, items=DEFAULT_ITEMS,
+                   upload_mb=DEFAULT_UPLOAD_MB, eggs_mb=DEFAULT_EGGS_MB,
+                   status_polls=DEFAULT_STATUS_POLLS,
+                   follow_seconds=DEFAULT_FOLLOW_SECONDS):
+    """
+    Run all benchmarks against a stand-in server adding `latency` seconds to
+    every response and transferring `bandwidth` bytes per second, and return
+    the results by metric name (see `METRICS`).
+    """
+    results = {}
+    with FakeScrapyCloud(latency=latency, bandwidth=bandwidth,
+                         egg_bundle_size=int(eggs_mb * 1024 ** 2)) as server:
+        with mock.patch.dict(os.environ,
+                             {'SHUB_STORAGE': server.storage_endpoint}):
+            results.update(bench_items(server, items))
+            results.update(bench_deploy_upload(server, upload_mb))
+            results.update(bench_fetch_eggs(server))
+            results.update(bench_image_status(server, status_polls))
+            results.update(bench_follow(server, follow_seconds))
+    return results
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return the (name, baseline value, value) of the results that are worse
+    than their baseline by more than `tolerance` (a fraction of it).
+    """
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (value - base) / base
+        if not METRICS[name][1]:
+            change = -change
+        if change < -tolerance:
+            regressions.append((name, base, value))
+    return regressions
+
+
+@click.command(help=__doc__)
+@click.option('--latency', type=float, default=0,
+              help='milliseconds added to every response (default: 0)')
+@click.option('--bandwidth', type=float,
+              help='MB/s of request and response bodies (default: unlimited)')
+@click.option('--items', type=int, default=DEFAULT_ITEMS,
+              help='number of items downloaded')
+@click.option('--upload-mb', type=float, default=DEFAULT_UPLOAD_MB,
+              help='size of the deployed egg')
+@click.option('--eggs-mb', type=float, default=DEFAULT_EGGS_MB,
+              help='size of the fetched egg bundle')
+@click.option('--status-polls', type=int, default=DEFAULT_STATUS_POLLS,
+              help='number of deploy status polls')
+@click.option('--follow-seconds', type=float, default=DEFAULT_FOLLOW_SECONDS,
+              help='duration of the followed job')
+@click.option('--save', type=click.File('w'),
+              help='write the results to this JSON file')
+@click.option('--baseline', type=click.File(),
+              help='compare the results to those saved in this JSON file')
+@click.option('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+              help='relative change from the baseline allowed (default: 0.2)')
+def main(latency, bandwidth, items, upload_mb, eggs_mb, status_polls,
+         follow_seconds, save, baseline, tolerance):
+    results = run_benchmarks(
+        latency / 1000, bandwidth and bandwidth * 1024 ** 2, items,
+        upload_mb, eggs_mb, status_polls, follow_seconds)
+    baseline = json.load(baseline) if baseline else {}
+    for name, value in results.items():
+        line = f'{name:<20} {value:12,.1f} {METRICS[name][0]:<8}'
+        if baseline.get(name):
+            line += f' (baseline {baseline[name]:,.1f})'
+        print(line)
+    if save:
+        json.dump(results, save, indent=2)
+    regressions = find_regressions(results, baseline, tolerance)
+    for name, base, value in regressions:
+        print(f'Regression: {name} is {value:,.1f} {METRICS[name][0]}, '
+              f'baseline {base:,.1f}', file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
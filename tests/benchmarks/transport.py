@@ -0,0 +1,86 @@
+"""
+Compare the cost of downloading job items as JSON lines and as msgpack, as
+done by `shub.utils.job_resource_iter`, on a local fixture of synthetic items.
+
+Run with ``python -m tests.benchmarks.transport [NUMBER_OF_ITEMS]``. The
+msgpack package needs to be installed.
+"""
+import io
+import json
+import sys
+import time
+
+import msgpack
+from scrapinghub.hubstorage.resourcetype import CHUNK_SIZE
+from scrapinghub.hubstorage.serialization import mpdecode
+
+
+DEFAULT_ITEMS = 100000
+
+
+def make_items(count):
+    return [
+        {
+            '_key': f'1/2/3/{idx}',
+            '_type': 'ProductItem',
+            'url': f'https://example.com/products/{idx}',
+            'name': f'Product number {idx}',
+            'price': idx * 1.25,
+            'in_stock': idx % 3 != 0,
+            'tags': ['electronics', 'sale', f'batch-{idx % 50}'],
+            'description': 'Lorem ipsum dolor sit amet. ' * 8,
+            'specs': {'weight': idx % 1000, 'colour': 'black'},
+        }
+        for idx in range(count)
+    ]
+
+
+def iter_chunks(data):
+    """Split a response body like requests' iter_content() does."""
+    stream = io.BytesIO(data)
+    return iter(lambda: stream.read(CHUNK_SIZE), b'')
+
+
+def json_passthrough(json_body, msgpack_body):
+    # JSON lines consumers, e.g. 'shub items' without --format
+    return sum(1 for _ in json_body.decode('utf-8').split('\n'))
+
+
+def json_decode(json_body, msgpack_body):
+    # Other consumers before msgpack was used, or with --transport json
+    return sum(1 for line in json_body.decode('utf-8').split('\n')
+               if json.loads(line))
+
+
+def msgpack_decode(json_body, msgpack_body):
+    # Other consumers, e.g. 'shub items -F csv'
+    return sum(1 for _ in mpdecode(iter_chunks(msgpack_body)))
+
+
+def msgpack_decode_and_cache(json_body, msgpack_body):
+    # Other consumers, when also filling the job data cache with JSON lines
+    return sum(1 for item in mpdecode(iter_chunks(msgpack_body))
+               if json.dumps(item))
+
+
+BENCHMARKS = [
+    json_passthrough, json_decode, msgpack_decode, msgpack_decode_and_cache,
+]
+
+
+def main(count=DEFAULT_ITEMS):
+    items = make_items(count)
+    json_body = '\n'.join(json.dumps(item) for item in items).encode('utf-8')
+    msgpack_body = b''.join(msgpack.packb(item) for item in items)
+    print(f'{count:,} items: {len(json_body) / 1024 ** 2:.2f} MB as JSON '
+          f'lines, {len(msgpack_body) / 1024 ** 2:.2f} MB as msgpack')
+    for benchmark in BENCHMARKS:
+        started = time.perf_counter()
+        assert benchmark(json_body, msgpack_body) == count
+        elapsed = time.perf_counter() - started
+        print(f'{benchmark.__name__:<26} {elapsed:6.3f}s '
+              f'{count / elapsed:12,.0f} items/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
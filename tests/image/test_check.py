@@ -11,7 +11,7 @@ from .utils import FakeProjectDirectory
 
 class TestCheckCli(TestCase):
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_cli(self, mocked):
         # the test creates .releases file locally
         # this context manager cleans it in the end
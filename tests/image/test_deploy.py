@@ -18,18 +18,18 @@ from ..utils import clean_progress_output, format_expected_progress
 
 @pytest.fixture
 def mocked_post(monkeypatch):
-    """Mock requests.post to return a HTTP 200 response with location header."""
+    """Mock requests.Session.post to return a HTTP 200 response with location header."""
     def fake_post(self, *args, **kwargs):
         fake_response = Response()
         fake_response.status_code = 200
         fake_response.headers = {'location': 'http://deploy/url/123'}
         return fake_response
-    monkeypatch.setattr('requests.post', fake_post)
+    monkeypatch.setattr('requests.Session.post', fake_post)
 
 
 @pytest.mark.usefixtures('project_dir')
-@mock.patch('requests.get')
-@mock.patch('requests.post')
+@mock.patch('requests.Session.get')
+@mock.patch('requests.Session.post')
 @mock.patch('shub.image.list.list_cmd')
 def test_cli(list_mocked, post_mocked, get_mocked):
     list_mocked.return_value = {
@@ -62,8 +62,8 @@ def test_cli(list_mocked, post_mocked, get_mocked):
 
 
 @pytest.mark.usefixtures('project_dir')
-@mock.patch('requests.get')
-@mock.patch('requests.post')
+@mock.patch('requests.Session.get')
+@mock.patch('requests.Session.post')
 @mock.patch('shub.image.list.list_cmd')
 def test_cli_insecure_registry(list_mocked, post_mocked, get_mocked):
     list_mocked.return_value = {
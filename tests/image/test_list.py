@@ -46,7 +46,7 @@ def test_cli_no_scrapinghub_config():
 @pytest.mark.usefixtures('project_dir')
 @pytest.mark.parametrize('is_binary_logs', [True, False])
 @mock.patch('shub.image.utils.get_docker_client')
-@mock.patch('requests.get')
+@mock.patch('requests.Session.get')
 def test_cli(requests_get_mock, get_docker_client_mock, is_binary_logs):
     """Case when shub-image-info succeeded."""
     requests_get_mock.return_value = _get_settings_mock()
@@ -66,7 +66,7 @@ def test_cli(requests_get_mock, get_docker_client_mock, is_binary_logs):
 
 @pytest.mark.usefixtures('project_dir')
 @mock.patch('shub.image.utils.get_docker_client')
-@mock.patch('requests.get')
+@mock.patch('requests.Session.get')
 def test_cli_image_info_error(requests_get_mock, get_docker_client_mock):
     """Case when shub-image-info command failed with unknown exit code."""
     requests_get_mock.return_value = _get_settings_mock()
@@ -79,7 +79,7 @@ def test_cli_image_info_error(requests_get_mock, get_docker_client_mock):
 
 @pytest.mark.usefixtures('project_dir')
 @mock.patch('shub.image.utils.get_docker_client')
-@mock.patch('requests.get')
+@mock.patch('requests.Session.get')
 def test_cli_image_info_not_found(requests_get_mock, get_docker_client_mock):
     """Case when shub-image-info cmd not found with fallback to list-spiders."""
     requests_get_mock.return_value = _get_settings_mock({'SETTING': 'VALUE'})
@@ -97,7 +97,7 @@ def test_cli_image_info_not_found(requests_get_mock, get_docker_client_mock):
 
 @pytest.mark.usefixtures('project_dir')
 @mock.patch('shub.image.utils.get_docker_client')
-@mock.patch('requests.get')
+@mock.patch('requests.Session.get')
 def test_cli_both_commands_failed(requests_get_mock, get_docker_client_mock):
     """Case when shub-image-info cmd not found with fallback to list-spiders."""
     requests_get_mock.return_value = _get_settings_mock({'SETTING': 'VALUE'})
@@ -0,0 +1,45 @@
+import unittest
+
+from tests.benchmarks import network
+from tests.benchmarks.fakeserver import FakeScrapyCloud
+
+
+class FakeScrapyCloudTest(unittest.TestCase):
+
+    def test_job_entries(self):
+        server = FakeScrapyCloud()
+        server.add_job('1/2/3', items=10)
+        self.assertEqual(len(server.job_entries('1/2/3', 'items', {})), 10)
+        entries = server.job_entries(
+            '1/2/3', 'items', {'startafter': ['1/2/3/4'], 'count': ['2']})
+        self.assertEqual(len(entries), 2)
+        self.assertIn('"_key": "1/2/3/5"', entries[0])
+        self.assertIsNone(server.job_entries('1/2/4', 'items', {}))
+
+    def test_poll_release(self):
+        server = FakeScrapyCloud(status_polls=2)
+        release_id = server.new_release()
+        self.assertEqual(server.poll_release(release_id)['status'], 'progress')
+        self.assertEqual(server.poll_release(release_id)['status'], 'ok')
+
+
+class NetworkBenchmarkTest(unittest.TestCase):
+
+    def test_run_benchmarks(self):
+        results = network.run_benchmarks(
+            items=200, upload_mb=0.1, eggs_mb=0.1, status_polls=3,
+            follow_seconds=0.2)
+        self.assertEqual(set(results), set(network.METRICS))
+        for value in results.values():
+            self.assertGreater(value, 0)
+
+    def test_find_regressions(self):
+        baseline = {'items_json': 1000, 'follow_latency_p50': 100,
+                    'deploy_upload': 10}
+        results = {'items_json': 700, 'follow_latency_p50': 130,
+                   'deploy_upload': 9, 'fetch_eggs': 1}
+        self.assertEqual(
+            network.find_regressions(results, baseline, tolerance=0.2),
+            [('items_json', 1000, 700), ('follow_latency_p50', 100, 130)])
+        self.assertEqual(
+            network.find_regressions(results, baseline, tolerance=0.5), [])
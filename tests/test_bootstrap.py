@@ -29,7 +29,7 @@ REPO_ZIP_PATH = os.path.join(os.path.dirname(__file__), 'samples',
 
 @pytest.fixture
 def requests_get_mock():
-    with mock.patch('shub.bootstrap.requests.get') as m:
+    with mock.patch('requests.Session.get') as m:
         yield m
 
 
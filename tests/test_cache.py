@@ -0,0 +1,170 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from shub import cache
+
+
+class JobCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache = cache.JobCache(path=tmpdir.name, max_size=10 ** 6)
+        patcher = mock.patch.object(cache, 'CACHE_CHUNK_SIZE', 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fill(self, job_key, resource='items', count=25):
+        lines = [json.dumps({'_key': f'{job_key}/{idx}', 'text': ' '})
+                 for idx in range(count)]
+        writer = self.cache.writer(job_key, resource)
+        for line in lines:
+            writer.write(line)
+        writer.commit()
+        return lines
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('1/2/3', 'items'))
+
+    def test_read_ranges(self):
+        lines = self._fill('1/2/3')
+        cached = self.cache.get('1/2/3', 'items')
+        self.assertEqual(cached.total, 25)
+        self.assertEqual(len(cached.offsets), 4)
+        self.assertEqual(list(cached.iter_lines()), lines)
+        self.assertEqual(list(cached.iter_lines(5, 22)), lines[5:22])
+        self.assertEqual(list(cached.iter_lines(20)), lines[20:])
+        self.assertEqual(list(cached.iter_lines(-5, 3)), lines[:3])
+        self.assertEqual(list(cached.iter_lines(30)), [])
+        self.assertIsNone(self.cache.get('1/2/3', 'logs'))
+
+    def test_abort_leaves_nothing(self):
+        writer = self.cache.writer('1/2/3', 'items')
+        writer.write('{}')
+        writer.abort()
+        self.assertIsNone(self.cache.get('1/2/3', 'items'))
+        self.assertEqual(os.listdir(self.cache.path), [])
+
+    def test_too_large_is_not_cached(self):
+        self.cache.max_size = 100
+        self._fill('1/2/3', count=100)
+        self.assertIsNone(self.cache.get('1/2/3', 'items'))
+
+    def test_evicts_least_recently_used(self):
+        self._fill('1/2/3')
+        entry_size = os.path.getsize(os.path.join(
+            self.cache.path, '1', '2', '3', 'items', cache.DATA_FILENAME))
+        self.cache.max_size = 2 * entry_size
+        self._fill('1/2/4')
+        # Make sure the access times differ
+        past = time.time() - 10
+        for job in ('3', '4'):
+            os.utime(os.path.join(self.cache.path, '1', '2', job, 'items',
+                                  cache.INDEX_FILENAME), (past, past))
+        self.cache.get('1/2/3', 'items')
+        self._fill('1/2/5')
+        self.assertIsNotNone(self.cache.get('1/2/3', 'items'))
+        self.assertIsNone(self.cache.get('1/2/4', 'items'))
+        self.assertIsNotNone(self.cache.get('1/2/5', 'items'))
+
+
+class JobListCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache = cache.JobListCache(path=tmpdir.name)
+        self.jobs = [{'key': f'1/1/{n}', 'ts': n * 1000} for n in range(10)]
+        self.fetches = []
+
+    def _fetch(self, startts):
+        self.fetches.append(startts)
+        return [job for job in reversed(self.jobs)
+                if startts is None or job['ts'] >= startts]
+
+    def _list(self, filters=None, since=None, until=None):
+        return [job['key'] for job in self.cache.iter_finished(
+            self._fetch, '1', filters or {}, since, until)]
+
+    def test_fetches_newer_jobs_only(self):
+        expected = [f'1/1/{n}' for n in range(9, -1, -1)]
+        self.assertEqual(self._list(), expected)
+        self.jobs.append({'key': '1/1/10', 'ts': 10000})
+        self.assertEqual(self._list(), ['1/1/10'] + expected)
+        # The job at the high-water mark is fetched again, but not duplicated
+        self.assertEqual(self.fetches, [None, 9000])
+        self.assertEqual(self._list(since=4000, until=6000),
+                         ['1/1/6', '1/1/5', '1/1/4'])
+        self.assertEqual(self.fetches[-1], 10000)
+
+    def test_unwritable_cache(self):
+        self._list(since=5000)
+        with mock.patch('shub.cache.tempfile.mkstemp',
+                        side_effect=OSError(28, 'No space left')), \
+                mock.patch.object(cache, 'print_warning') as mock_warning:
+            self.jobs.append({'key': '1/1/10', 'ts': 10000})
+            self.assertEqual(self._list(since=8000),
+                             ['1/1/10', '1/1/9', '1/1/8'])
+        self.assertIn('No space left', mock_warning.call_args[0][0])
+        # The listing cached before is left as it was
+        self.assertEqual(os.listdir(self.cache.path),
+                         [os.path.basename(self.cache._file_path('1', {}))])
+
+    def test_filters_have_their_own_cache(self):
+        self._list()
+        self._list(filters={'spider': 'other'})
+        self.assertEqual(self.fetches, [None, None])
+
+    def test_older_jobs_than_cached_are_fetched(self):
+        self.assertEqual(self._list(since=8000), ['1/1/9', '1/1/8'])
+        self.assertEqual(self._list(since=9000), ['1/1/9'])
+        self.assertEqual(self.fetches, [8000, 9000])
+        self.assertEqual(len(self._list()), 10)
+        self.assertEqual(self.fetches[-1], None)
+        self._list(since=1000)
+        self.assertEqual(self.fetches[-1], 9000)
+
+
+class HTTPCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache = cache.HTTPCache(path=tmpdir.name)
+
+    def test_ttl(self):
+        self.assertEqual(
+            self.cache.ttl('https://app.zyte.com/api/settings/get.json'
+                           '?project=1'),
+            cache.HTTP_CACHE_TTLS['/api/settings/get.json'])
+        self.assertIsNone(
+            self.cache.ttl('https://app.zyte.com/api/releases/deploy.json'))
+
+    def test_key(self):
+        url = 'https://app.zyte.com/api/eggs/list.json?project=1'
+        key = self.cache.key('GET', url, 'Basic abc')
+        self.assertEqual(key, self.cache.key('GET', url, 'Basic abc'))
+        self.assertNotEqual(key, self.cache.key('GET', url, 'Basic def'))
+        self.assertNotEqual(key, self.cache.key('GET', url + '2', 'Basic abc'))
+        self.assertNotIn('abc', key)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('abc'))
+        entry = {'expires': 100, 'etag': '"v1"',
+                 'headers': {'Content-Type': 'application/json'},
+                 'content': b'{"eggs": []}'}
+        self.cache.set('abc', entry)
+        self.assertEqual(self.cache.get('abc'), entry)
+        self.assertEqual(os.listdir(self.cache.path), ['abc.json'])
+
+    def test_set_unwritable(self):
+        not_a_dir = os.path.join(self.cache.path, 'file')
+        open(not_a_dir, 'w').close()
+        http_cache = cache.HTTPCache(path=os.path.join(not_a_dir, 'http'))
+        http_cache.set('abc', {'expires': 100, 'etag': None, 'headers': {},
+                               'content': b'{}'})
+        self.assertIsNone(http_cache.get('abc'))
@@ -1,3 +1,4 @@
+import time
 import unittest
 from collections import namedtuple
 from unittest import mock
@@ -105,3 +106,46 @@ class CancelTest(AssertInvokeRaisesMixin, unittest.TestCase):
 
         with self.assertRaises(BadParameterException):
             cancel.validate_job_key('123456', '')
+
+    @mock.patch('shub.cancel.select_job_specs', autospec=True)
+    @mock.patch('shub.cancel.get_scrapinghub_client_from_config')
+    def test_cancel_selected_jobs(self, mock_client, mock_select):
+        mock_proj = mock_client.return_value.get_project.return_value
+        mock_proj.jobs.cancel.side_effect = lambda keys: {'count': len(keys)}
+        mock_select.return_value = [('123456/1/%s' % i, 'key')
+                                    for i in range(5)]
+
+        result = self.runner.invoke(cancel.cli, (
+            '123456', '--spider', 'myspider', '--older-than', '2h',
+            '--dry-run'))
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('5 jobs would be cancelled', result.output)
+        self.assertFalse(mock_proj.jobs.cancel.called)
+        args, kwargs = mock_select.call_args
+        self.assertEqual(args, ('123456', 'myspider', (),
+                                ('running', 'pending')))
+        self.assertAlmostEqual(
+            kwargs['until'].timestamp(), time.time() - 7200, delta=60)
+
+        with mock.patch.object(cancel, 'CANCEL_BATCH_SIZE', 2):
+            result = self.runner.invoke(cancel.cli, (
+                '123456', '--state', 'pending', '--force'))
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(mock_select.call_args[0][3], ('pending',))
+        self.assertEqual(mock_proj.jobs.cancel.call_count, 3)
+        cancelled = sorted(key for call in mock_proj.jobs.cancel.call_args_list
+                           for key in call[1]['keys'])
+        self.assertEqual(cancelled, ['123456/1/%s' % i for i in range(5)])
+        self.assertIn('Cancelled 5 of 5 jobs', result.output)
+        self.assertIn("{'count': 5}", result.output)
+
+    @mock.patch('shub.cancel.get_scrapinghub_client_from_config')
+    def test_invalid_selectors(self, mock_client):
+        for args, error in (
+                (('123456', '1/1', '--spider', 'a'), 'cannot be combined'),
+                (('123456',), 'Please provide job keys or selectors'),
+                (('--older-than', '2 hours'), 'Durations must be given'),
+        ):
+            result = self.runner.invoke(cancel.cli, args)
+            self.assertNotEqual(0, result.exit_code)
+            self.assertIn(error, result.output)
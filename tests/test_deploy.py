@@ -133,9 +133,9 @@ class DeployTest(AssertInvokeRaisesMixin, unittest.TestCase):
             result = self.runner.invoke(deploy.cli)
             self.assertEqual(result.exit_code, 0)
 
-    @patch('shub.utils.requests')
+    @patch('shub.utils.get_http_session')
     @patch('shub.utils.write_and_echo_logs')
-    def test_deploy_with_single_large_file(self, mock_logs, mock_requests):
+    def test_deploy_with_single_large_file(self, mock_logs, mock_session):
         with self.runner.isolated_filesystem():
             self._make_project()
             # patch setup_py to include package data files
@@ -154,7 +154,7 @@ class DeployTest(AssertInvokeRaisesMixin, unittest.TestCase):
                 manifest_f.write('include files/file.large')
             fake_response = requests.Response()
             fake_response.status_code = 200
-            mock_requests.post.return_value = fake_response
+            mock_session.return_value.post.return_value = fake_response
             self.assertInvokeRaises(DeployRequestTooLargeException,
                                     deploy.cli)
 
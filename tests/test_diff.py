@@ -0,0 +1,118 @@
+import json
+import unittest
+from unittest import mock
+
+from shub import diff
+
+
+def _lines(items):
+    return iter([json.dumps(item) for item in items])
+
+
+class BucketCountTest(unittest.TestCase):
+
+    def test_bucket_count(self):
+        self.assertEqual(diff.bucket_count(0), 1)
+        self.assertEqual(diff.bucket_count(diff.DIFF_BUCKET_SIZE + 1), 2)
+        self.assertEqual(diff.bucket_count(10 ** 12), diff.DIFF_MAX_BUCKETS)
+
+
+class DiffItemsTest(unittest.TestCase):
+
+    old = [
+        {'url': 'a', 'price': 1},
+        {'url': 'b', 'price': 2},
+        {'url': 'c', 'price': 3, 'name': 'C'},
+        {'url': 'c', 'price': 4},
+        {'price': 5},
+    ]
+    new = [
+        {'price': 1, 'url': 'a'},
+        {'url': 'c', 'price': 30},
+        {'url': 'd', 'price': 4},
+    ]
+
+    def _diff(self, buckets):
+        with mock.patch.object(diff, 'print_warning') as mock_warning:
+            items_diff = diff.diff_items(
+                _lines(self.old), _lines(self.new), 'url', ['1/2/3', '1/2/4'],
+                buckets=buckets)
+        self.assertIn('1 items of job 1/2/3 have no url field',
+                      mock_warning.call_args[0][0])
+        return items_diff.to_dict()
+
+    def test_diff(self):
+        for buckets in (1, 7):
+            result = self._diff(buckets)
+            self.assertEqual(result['jobs'], {
+                '1/2/3': {'items': 5, 'missing_key': 1, 'duplicate_keys': 1},
+                '1/2/4': {'items': 3, 'missing_key': 0, 'duplicate_keys': 0},
+            })
+            self.assertEqual(
+                [result[name] for name in
+                 ('added', 'removed', 'changed', 'unchanged')],
+                [1, 1, 1, 1])
+            self.assertEqual(result['changed_fields'], {'name': 1, 'price': 1})
+            self.assertEqual(result['samples'], {
+                'added': [{'url': 'd', 'price': 4}],
+                'removed': [{'url': 'b', 'price': 2}],
+                'changed': [{'key': 'c', 'changes': {
+                    'name': ['C', None], 'price': [3, 30]}}],
+            })
+
+    def test_format_table(self):
+        items_diff = diff.diff_items(_lines(self.old[:3]), _lines(self.new),
+                                     'url', ['1/2/3', '1/2/4'])
+        table = items_diff.format_table()
+        self.assertIn('Key: url', table)
+        self.assertIn('Added items (sample)', table)
+        self.assertIn('{"url": "d", "price": 4}', table)
+
+    def test_sample_size(self):
+        with mock.patch.object(diff, 'DIFF_SAMPLE_SIZE', 2):
+            items_diff = diff.diff_items(
+                _lines([]), _lines({'url': i} for i in range(10)), 'url',
+                ['1/2/3', '1/2/4'], buckets=3)
+        self.assertEqual(items_diff.added, 10)
+        self.assertEqual(len(items_diff.samples['added']), 2)
+
+    def test_meta_fields_ignored(self):
+        old = [{'_key': '1/2/3/{}'.format(i), '_type': 'Item', 'url': i}
+               for i in range(5)]
+        new = [{'_key': '1/2/4/{}'.format(i), 'url': i} for i in range(5)]
+        new[0]['price'] = 1
+        items_diff = diff.diff_items(_lines(old), _lines(new), 'url',
+                                     ['1/2/3', '1/2/4'], buckets=2)
+        self.assertEqual(items_diff.changed, 1)
+        self.assertEqual(items_diff.unchanged, 4)
+        self.assertEqual(items_diff.changed_fields, {'price': 1})
+
+    def test_large_buckets_are_split(self):
+        old = [{'url': i, 'price': i} for i in range(100)]
+        new = [{'url': i, 'price': i + (i % 10 == 0)} for i in range(5, 105)]
+        compared_sizes = []
+        compare_buckets = diff.ItemsDiff.compare_buckets
+
+        def count_and_compare(items_diff, path_a, path_b):
+            with open(path_a) as f:
+                compared_sizes.append(len(f.readlines()))
+            compare_buckets(items_diff, path_a, path_b)
+
+        with mock.patch.object(diff, 'DIFF_BUCKET_SIZE', 10), \
+                mock.patch.object(diff.ItemsDiff, 'compare_buckets',
+                                  count_and_compare):
+            items_diff = diff.diff_items(_lines(old), _lines(new), 'url',
+                                         ['1/2/3', '1/2/4'], buckets=2)
+        self.assertEqual([items_diff.added, items_diff.removed,
+                          items_diff.changed, items_diff.unchanged],
+                         [5, 5, 9, 86])
+        self.assertEqual(sum(compared_sizes), 100)
+        self.assertLessEqual(max(compared_sizes), 10)
+
+    def test_same_key_buckets_are_not_split_forever(self):
+        with mock.patch.object(diff, 'DIFF_BUCKET_SIZE', 2):
+            items_diff = diff.diff_items(
+                _lines([{'url': 'a'}] * 20), _lines([{'url': 'a'}]), 'url',
+                ['1/2/3', '1/2/4'])
+        self.assertEqual(items_diff.duplicate_keys, [19, 0])
+        self.assertEqual(items_diff.unchanged, 1)
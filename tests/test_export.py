@@ -0,0 +1,417 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from shub import export
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BackgroundIteratorTest(unittest.TestCase):
+
+    def test_yields_entries_in_order(self):
+        producer = export.BackgroundIterator(iter(range(100)), maxsize=5)
+        self.assertEqual(list(producer), list(range(100)))
+
+    def test_reraises_producer_errors(self):
+        def failing():
+            yield 1
+            raise ValueError('boom')
+
+        producer = export.BackgroundIterator(failing())
+        with self.assertRaisesRegex(ValueError, 'boom'):
+            list(producer)
+
+    def test_stop_releases_blocked_producer(self):
+        producer = export.BackgroundIterator(iter(range(100)), maxsize=1)
+        next(iter(producer))
+        producer.stop()
+        producer._thread.join(timeout=5)
+        self.assertFalse(producer._thread.is_alive())
+
+
+class IterConcurrentlyTest(unittest.TestCase):
+
+    def test_yields_all_entries_keeping_relative_order(self):
+        iterables = [range(idx * 100, idx * 100 + 50) for idx in range(5)]
+        result = list(export.iter_concurrently(iterables, 2))
+        self.assertEqual(sorted(result), sorted(x for it in iterables for x in it))
+        for iterable in iterables:
+            self.assertEqual([x for x in result if x in iterable],
+                             list(iterable))
+
+    def test_reraises_errors(self):
+        def failing():
+            yield 1
+            raise ValueError('boom')
+
+        with self.assertRaisesRegex(ValueError, 'boom'):
+            list(export.iter_concurrently([range(3), failing()], 2))
+
+    def test_add_json_field(self):
+        lines = ['{"a": 1}', '{}', '{ }']
+        result = list(export.add_json_field(lines, '_job', '1/2/3'))
+        self.assertEqual([json.loads(line) for line in result], [
+            {'_job': '1/2/3', 'a': 1},
+            {'_job': '1/2/3'},
+            {'_job': '1/2/3'},
+        ])
+
+
+class WriteLinesTest(unittest.TestCase):
+
+    def test_writes_newline_terminated_utf8(self):
+        stream = io.BytesIO()
+        export.write_lines(['a', 'jarzębina', b'raw'], stream=stream)
+        self.assertEqual(stream.getvalue(), 'a\njarzębina\nraw\n'.encode())
+
+    def test_writes_in_batches(self):
+        release = threading.Event()
+
+        def lines():
+            for idx in range(50):
+                yield 'x' * 9
+            # Keep the consumer waiting so that it flushes what it has
+            release.wait(5)
+            yield 'last'
+
+        writes = []
+
+        def write(data):
+            writes.append(bytes(data))
+            release.set()
+
+        stream = mock.Mock()
+        stream.write.side_effect = write
+        export.write_lines(lines(), stream=stream, buffer_size=100)
+        self.assertEqual(b''.join(writes), b'xxxxxxxxx\n' * 50 + b'last\n')
+        self.assertLess(len(writes), 50)
+
+    def test_stats(self):
+        stream = io.BytesIO()
+        with mock.patch.object(export.click, 'echo') as mock_echo:
+            export.write_lines(['abc', 'def'], stream=stream, stats=True)
+        summary = mock_echo.call_args[0][0]
+        self.assertIn('2 items', summary)
+        self.assertIn('items/s', summary)
+        self.assertIn('MB/s', summary)
+        self.assertTrue(mock_echo.call_args[1]['err'])
+
+
+class WriteLinesResumableTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'out.jl')
+        self.state_path = self.path + export.STATE_FILE_SUFFIX
+
+    def _iter_lines(self, fail_after=None):
+        def iter_lines(startafter):
+            first = int(startafter.rsplit('/', 1)[1]) + 1 if startafter else 0
+            for idx in range(first, 10):
+                if idx == fail_after:
+                    raise ValueError('connection lost')
+                yield json.dumps({'_key': f'1/2/3/{idx}'})
+        return iter_lines
+
+    def _read_keys(self):
+        with open(self.path) as f:
+            return [json.loads(line)['_key'] for line in f]
+
+    def test_writes_and_removes_state(self):
+        export.write_lines_resumable(self._iter_lines(), '1/2/3', self.path)
+        self.assertEqual(len(self._read_keys()), 10)
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_resumes_after_checkpoint(self):
+        with self.assertRaises(ValueError):
+            export.write_lines_resumable(self._iter_lines(fail_after=4),
+                                         '1/2/3', self.path)
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.assertEqual(state['last_key'], '1/2/3/3')
+        self.assertEqual(state['offset'], os.path.getsize(self.path))
+        # Simulate a partially written line after the checkpoint
+        with open(self.path, 'ab') as f:
+            f.write(b'{"_key": "1/2')
+        export.write_lines_resumable(self._iter_lines(), '1/2/3', self.path,
+                                     resume=True)
+        self.assertEqual(self._read_keys(),
+                         [f'1/2/3/{idx}' for idx in range(10)])
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_resume_without_checkpoint_starts_over(self):
+        with open(self.path, 'w') as f:
+            f.write('garbage\n')
+        with mock.patch.object(export, 'print_warning') as mock_warning:
+            export.write_lines_resumable(self._iter_lines(), '1/2/3',
+                                         self.path, resume=True)
+        self.assertIn('No checkpoint found', mock_warning.call_args[0][0])
+        self.assertEqual(len(self._read_keys()), 10)
+
+    def test_resume_other_job(self):
+        with open(self.state_path, 'w') as f:
+            json.dump({'job': '1/2/4', 'last_key': '1/2/4/0', 'offset': 0}, f)
+        with self.assertRaisesRegex(export.BadParameterException, '1/2/4'):
+            export.write_lines_resumable(self._iter_lines(), '1/2/3',
+                                         self.path, resume=True)
+
+
+class WriteFilesTest(unittest.TestCase):
+
+    def test_writes_each_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, name) for name in ('a.jl', 'b.jl')]
+            with mock.patch.object(export.click, 'echo') as mock_echo:
+                total = export.write_files(
+                    [(paths[0], ['1', '2']), (paths[1], ['3'])], 2,
+                    stats=True)
+            for path, expected in zip(paths, (b'1\n2\n', b'3\n')):
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(), expected)
+        self.assertEqual(total.items, 3)
+        self.assertEqual(total.bytes, 6)
+        self.assertIn('3 items', mock_echo.call_args[0][0])
+
+
+class WriteItemsTest(unittest.TestCase):
+
+    items = [
+        {'a': 1, 'b': {'x': 1}, 'c': 'jarzębina'},
+        {'a': 2, 'c': None},
+        {'a': 3, 'd': [1, 2]},
+    ]
+
+    def _write(self, fmt, items=None, **kwargs):
+        items = self.items if items is None else items
+        if export.format_needs_json(fmt):
+            items = [json.dumps(item) for item in items]
+        stream = io.BytesIO()
+        transfer_stats = export.write_items(iter(items), fmt, stream=stream,
+                                            **kwargs)
+        self.assertEqual(transfer_stats.items, 3)
+        return stream.getvalue()
+
+    def test_jsonl_gz(self):
+        data = gzip.decompress(self._write('jsonl.gz'))
+        self.assertEqual([json.loads(line) for line in data.splitlines()],
+                         self.items)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_jsonl_zst(self):
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(
+            self._write('jsonl.zst'))
+        self.assertEqual([json.loads(line) for line in data.splitlines()],
+                         self.items)
+
+    def test_csv(self):
+        data = self._write('csv').decode('utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(data))), [
+            ['a', 'b', 'c', 'd'],
+            ['1', '{"x": 1}', 'jarzębina', ''],
+            ['2', '', '', ''],
+            ['3', '', '', '[1, 2]'],
+        ])
+
+    def test_csv_late_columns(self):
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2), \
+                mock.patch.object(export, 'print_warning') as mock_warning:
+            data = self._write('csv').decode('utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(data))), [
+            ['a', 'b', 'c'],
+            ['1', '{"x": 1}', 'jarzębina'],
+            ['2', '', ''],
+            ['3', '', ''],
+        ])
+        self.assertIn('were not exported: d', mock_warning.call_args[0][0])
+
+    def test_csv_columns(self):
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2), \
+                mock.patch.object(export, 'print_warning') as mock_warning:
+            data = self._write('csv', columns=['d', 'a']).decode('utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(data))), [
+            ['d', 'a'],
+            ['', '1'],
+            ['', '2'],
+            ['[1, 2]', '3'],
+        ])
+        self.assertIn('were not exported: b, c', mock_warning.call_args[0][0])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2), \
+                mock.patch.object(export, 'print_warning') as mock_warning:
+            data = self._write('parquet')
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        table = parquet_file.read()
+        self.assertEqual(table.column_names, ['a', 'b', 'c'])
+        self.assertEqual(table.column('a').to_pylist(), [1, 2, 3])
+        self.assertIn('were not exported: d', mock_warning.call_args[0][0])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_null_fields(self):
+        import pyarrow.parquet
+        items = [{'a': 1, 'b': None}, {'a': 2, 'b': 'x'}, {'a': 3, 'b': [1]}]
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 1):
+            data = self._write('parquet', items=items)
+        table = pyarrow.parquet.read_table(io.BytesIO(data))
+        self.assertEqual(table.column('b').to_pylist(), [None, 'x', '[1]'])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        table = pyarrow.ipc.open_stream(self._write('arrow')).read_all()
+        self.assertEqual(table.column('a').to_pylist(), [1, 2, 3])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow_incompatible_types(self):
+        items = [{'a': 1}, {'a': 'text'}, {'a': 3}]
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 1), \
+                self.assertRaises(export.ShubException):
+            self._write('arrow', items=items)
+
+
+class WriteItemsInProcessesTest(unittest.TestCase):
+
+    items = WriteItemsTest.items
+
+    def _write(self, fmt, items=None, **kwargs):
+        items = self.items if items is None else items
+        stream = io.BytesIO()
+        transfer_stats = export.write_items(
+            iter([json.dumps(item) for item in items]), fmt, stream=stream,
+            workers=2, **kwargs)
+        self.assertEqual(transfer_stats.items, len(items))
+        return stream.getvalue(), transfer_stats
+
+    def test_map_in_processes_keeps_order(self):
+        results = export.map_in_processes(
+            pow, ((x, 2) for x in range(20)), workers=3)
+        self.assertEqual([result for _, result in results],
+                         [x ** 2 for x in range(20)])
+
+    def test_jsonl_gz(self):
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2):
+            data, transfer_stats = self._write('jsonl.gz')
+        lines = gzip.decompress(data).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.items)
+        # Bytes are counted before compression
+        self.assertEqual(transfer_stats.bytes,
+                         sum(len(line) + 1 for line in lines))
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_jsonl_zst(self):
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2):
+            data, _ = self._write('jsonl.zst')
+        # One frame per batch
+        data = zstandard.ZstdDecompressor().decompressobj(
+            read_across_frames=True).decompress(data)
+        self.assertEqual([json.loads(line) for line in data.splitlines()],
+                         self.items)
+
+    def test_csv(self):
+        data, _ = self._write('csv')
+        self.assertEqual(data, WriteItemsTest._write(self, 'csv'))
+
+    def test_csv_late_columns(self):
+        items = [{'a': 1}, {'a': 2, 'b': 2}, {'a': 3, 'c': 3}, {'d': 4}]
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 1), \
+                mock.patch.object(export, 'print_warning') as mock_warning:
+            data, _ = self._write('csv', items=items)
+        self.assertEqual(list(csv.reader(io.StringIO(data.decode()))), [
+            ['a'],
+            ['1'],
+            ['2'],
+            ['3'],
+            [''],
+        ])
+        self.assertIn('were not exported: b, c, d',
+                      mock_warning.call_args[0][0])
+
+    def test_csv_columns(self):
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 1):
+            data, _ = self._write('csv', columns=['d', 'a'])
+        self.assertEqual(data, WriteItemsTest._write(
+            self, 'csv', columns=['d', 'a']))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(export.BadParameterException):
+            self._write('parquet')
+
+
+class WriteSqliteTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'items.db')
+
+    def _query(self, sql):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_inserts_items_adding_columns(self):
+        items = [
+            {'_job': '1/2/3', 'a': 1, 'b': {'x': 1}},
+            {'_job': '1/2/3', 'a': 2, 'c': 'jarzębina'},
+            {'_job': '1/2/3', 'a': 3, 'd': [1, 2], 'e': True},
+        ]
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2):
+            transfer_stats = export.write_sqlite(iter(items), self.path,
+                                                 'my "items"')
+        self.assertEqual(transfer_stats.items, 3)
+        self.assertGreater(transfer_stats.bytes, 0)
+        self.assertEqual(self._query('SELECT * FROM "my ""items"""'), [
+            ('1/2/3', 1, '{"x": 1}', None, None, None),
+            ('1/2/3', 2, None, 'jarzębina', None, None),
+            ('1/2/3', 3, None, None, '[1, 2]', 1),
+        ])
+
+    def test_appends_and_indexes(self):
+        export.write_sqlite(iter([{'_job': '1/2/3', 'a': 1}]), self.path,
+                            'items')
+        with mock.patch.object(export, 'print_warning') as mock_warning:
+            export.write_sqlite(iter([{'_job': '1/2/4', 'b': 2}]), self.path,
+                                'items', index_fields=('_job', 'missing'))
+        self.assertIn('Not indexing missing', mock_warning.call_args[0][0])
+        self.assertEqual(self._query('SELECT * FROM items'), [
+            ('1/2/3', 1, None),
+            ('1/2/4', None, 2),
+        ])
+        self.assertEqual(
+            self._query("SELECT name FROM sqlite_master WHERE type='index'"),
+            [('items__job',)])
+
+    def test_commits_in_large_transactions(self):
+        def items():
+            for idx in range(7):
+                yield {'a': idx}
+            raise ValueError('connection lost')
+
+        with mock.patch.object(export, 'EXPORT_BATCH_SIZE', 2), \
+                mock.patch.object(export, 'SQLITE_TRANSACTION_SIZE', 4), \
+                self.assertRaises(ValueError):
+            export.write_sqlite(items(), self.path, 'items')
+        # Rows of the uncommitted transaction were rolled back
+        self.assertEqual(self._query('SELECT a FROM items'),
+                         [(0,), (1,), (2,), (3,)])
@@ -13,19 +13,19 @@ from .utils import AssertInvokeRaisesMixin, mock_conf
 FakeResponse = namedtuple('FakeResponse', ['status_code'])
 
 
-@mock.patch('shub.fetch_eggs.requests', autospec=True)
+@mock.patch('shub.fetch_eggs.get_http_session', autospec=True)
 class FetchEggsTest(AssertInvokeRaisesMixin, unittest.TestCase):
 
     def setUp(self):
         self.runner = CliRunner()
         self.conf = mock_conf(self)
 
-    def test_raises_auth_exception(self, requests_mock):
+    def test_raises_auth_exception(self, mock_session):
         fake_response = FakeResponse(403)
-        requests_mock.get.return_value = fake_response
+        mock_session.return_value.get.return_value = fake_response
         self.assertInvokeRaises(InvalidAuthException, fetch_eggs.cli)
 
-    def test_raises_exception_if_request_error(self, requests_mock):
+    def test_raises_exception_if_request_error(self, mock_session):
         fake_response = FakeResponse(400)
-        requests_mock.get.return_value = fake_response
+        mock_session.return_value.get.return_value = fake_response
         self.assertInvokeRaises(RemoteErrorException, fetch_eggs.cli)
@@ -12,6 +12,11 @@ class JobResourceTest(unittest.TestCase):
 
     def setUp(self):
         self.runner = CliRunner()
+        # Keep the tests away from the local job data cache
+        for cmd_mod in (items, log, requests):
+            patcher = mock.patch.object(cmd_mod, 'JobCache', return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
     def _test_prints_objects(self, cmd_mod, resource_name):
         objects = ['Object 1', 'Object 2']
@@ -22,7 +27,7 @@ class JobResourceTest(unittest.TestCase):
             mock_resource = getattr(mock_gj.return_value, resource_name)
             mock_resource.iter_json.return_value = objects
             result = self.runner.invoke(cmd_mod.cli, (jobid,))
-            mock_gj.assert_called_once_with(jobid)
+            mock_gj.assert_called_once_with(jobid, pool_size=1)
             self.assertIn("\n".join(objects), result.output)
 
     def _test_forwards_follow(self, cmd_mod):
@@ -33,14 +38,290 @@ class JobResourceTest(unittest.TestCase):
             self.assertFalse(mock_jri.call_args[1]['follow'])
             self.runner.invoke(cmd_mod.cli, ('1/2/3', '-f'))
             self.assertTrue(mock_jri.call_args[1]['follow'])
+            self.runner.invoke(cmd_mod.cli, ('1/2/3', '-f', '--poll-min',
+                                             '0.5', '--poll-max', '30'))
+            self.assertEqual(mock_jri.call_args[1]['poll_min'], 0.5)
+            self.assertEqual(mock_jri.call_args[1]['poll_max'], 30)
+            self.assertEqual(mock_jri.call_args[1]['parallel'], 1)
+            # Polling in a tight loop is not allowed
+            for option in ('--poll-min', '--poll-max'):
+                mock_jri.reset_mock()
+                result = self.runner.invoke(cmd_mod.cli,
+                                            ('1/2/3', '-f', option, '0'))
+                self.assertEqual(result.exit_code, 2)
+                self.assertFalse(mock_jri.called)
+            self.runner.invoke(cmd_mod.cli, ('1/2/3', '-j', '4'))
+            self.assertEqual(mock_jri.call_args[1]['parallel'], 4)
+            with mock.patch.object(cmd_mod, 'JobCache') as mock_cache:
+                self.runner.invoke(cmd_mod.cli, ('1/2/3',))
+                self.assertIs(mock_jri.call_args[1]['cache'],
+                              mock_cache.return_value)
+                self.runner.invoke(cmd_mod.cli, ('1/2/3', '--no-cache'))
+                self.assertIsNone(mock_jri.call_args[1]['cache'])
+
+    def _test_prints_stats(self, cmd_mod, *args):
+        with mock.patch.object(cmd_mod, 'get_job'), \
+             mock.patch.object(cmd_mod, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            mock_jri.return_value = iter([json.dumps({'a': 1})])
+            result = self.runner.invoke(cmd_mod.cli,
+                                        ('1/2/3', '--stats') + args)
+            self.assertIn('1 items', result.output)
+            self.assertIn('items/s', result.output)
+
+    def _test_writes_output(self, cmd_mod, *args):
+        with mock.patch.object(cmd_mod, 'get_job') as mock_gj, \
+             mock.patch.object(cmd_mod, 'job_resource_iter', autospec=True) \
+             as mock_jri, self.runner.isolated_filesystem():
+            mock_gj.return_value.key = '1/2/3'
+            mock_jri.side_effect = lambda *a, **kw: iter(
+                [json.dumps({'_key': '1/2/3/0'})])
+            result = self.runner.invoke(cmd_mod.cli,
+                                        ('1/2/3', '--output', 'out') + args)
+            self.assertEqual(result.exit_code, 0)
+            self.assertIsNone(mock_jri.call_args[1]['startafter'])
+            with open('out') as f:
+                self.assertEqual(f.read(), '{"_key": "1/2/3/0"}\n')
+            result = self.runner.invoke(cmd_mod.cli,
+                                        ('1/2/3', '--output', 'out',
+                                         '--resume') + args)
+            self.assertEqual(result.exit_code, 0)
+            result = self.runner.invoke(cmd_mod.cli,
+                                        ('1/2/3', '--resume') + args)
+            self.assertIn('--resume requires --output', result.output)
+            result = self.runner.invoke(cmd_mod.cli,
+                                        ('1/2/3', '--output', 'out',
+                                         '--resume', '-n', '5') + args)
+            self.assertIn('cannot be combined with --tail', result.output)
 
     def test_items(self):
         self._test_prints_objects(items, 'items')
         self._test_forwards_follow(items)
+        self._test_prints_stats(items)
+        self._test_writes_output(items)
+        result = self.runner.invoke(items.cli, ('1/2/3', '--output', 'out',
+                                                '--resume', '-F', 'csv'))
+        self.assertIn('Only jsonl downloads can be resumed', result.output)
+
+    def test_items_query(self):
+        with mock.patch.object(items, 'get_job'), \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            self.runner.invoke(items.cli, ('1/2/3',))
+            self.assertEqual(mock_jri.call_args[1]['query'], {})
+            self.runner.invoke(items.cli, ('1/2/3', '--fields', 'a,b',
+                                           '--filter', '["a", "=", [1]]'))
+            self.assertEqual(mock_jri.call_args[1]['query'], {
+                'fields': ['a', 'b'], 'filter': ['["a", "=", [1]]']})
+            result = self.runner.invoke(items.cli, ('1/2/3', '--filter', 'a'))
+            self.assertIn('Filters must be JSON lists', result.output)
+            result = self.runner.invoke(items.cli, (
+                '1/2/3', '--fields', 'a', '--output', 'out', '--resume'))
+            self.assertIn('cannot be combined with server-side filters',
+                          result.output)
+
+    def test_items_multiple_jobs(self):
+        def make_job(key):
+            job = mock.Mock(key=key)
+            job.items.iter_json.return_value = [
+                json.dumps({'_key': f'{key}/0', 'n': key})]
+            job.metadata = {'state': 'finished'}
+            job._metadata_updated = time.time()
+            return job
+
+        with mock.patch.object(items, 'get_jobs', autospec=True) as mock_gj, \
+                mock.patch.object(items, 'get_job_specs', autospec=True,
+                                  side_effect=lambda x: ('1/' + x, 'key')):
+            mock_gj.side_effect = lambda specs, pool_size: [
+                make_job(key) for key, _ in specs]
+            result = self.runner.invoke(items.cli, ('2/3', '2/4', '-c', '2'))
+            self.assertEqual(result.exit_code, 0)
+            mock_gj.assert_called_once_with(
+                [('1/2/3', 'key'), ('1/2/4', 'key')], pool_size=2)
+            lines = sorted(result.output.splitlines())
+            self.assertEqual([json.loads(line) for line in lines], [
+                {'_job': '1/2/3', '_key': '1/2/3/0', 'n': '1/2/3'},
+                {'_job': '1/2/4', '_key': '1/2/4/0', 'n': '1/2/4'},
+            ])
+
+            result = self.runner.invoke(items.cli, ('2/3', '2/4', '-f'))
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(len(result.output.splitlines()), 2)
+            self.assertIn('"_job": "1/2/4"', result.output)
+            result = self.runner.invoke(items.cli,
+                                        ('2/3', '2/4', '-f', '-o', 'out'))
+            self.assertIn('cannot be followed into --output-dir',
+                          result.output)
+
+            with self.runner.isolated_filesystem():
+                result = self.runner.invoke(items.cli,
+                                            ('2/3', '2/4', '-o', 'out'))
+                self.assertEqual(result.exit_code, 0)
+                with open('out/1_2_4.jl') as f:
+                    self.assertEqual(json.loads(f.read()),
+                                     {'_key': '1/2/4/0', 'n': '1/2/4'})
+
+    def test_items_format(self):
+        with mock.patch.object(items, 'get_job', autospec=True), \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            mock_jri.return_value = iter([{'a': 1, 'b': 'x'}])
+            result = self.runner.invoke(items.cli, ('1/2/3', '-F', 'csv'))
+            self.assertFalse(mock_jri.call_args[1]['output_json'])
+            self.assertEqual(result.output.splitlines(), ['a,b', '1,x'])
+            mock_jri.return_value = iter([{'a': 1, 'b': 'x'}])
+            result = self.runner.invoke(
+                items.cli, ('1/2/3', '-F', 'csv', '--fields', 'c,a'))
+            self.assertEqual(result.output.splitlines()[:2], ['c,a', ',1'])
+            self.assertEqual(mock_jri.call_args[1]['transport'], 'auto')
+            self.runner.invoke(items.cli, ('1/2/3', '--transport', 'json'))
+            self.assertEqual(mock_jri.call_args[1]['transport'], 'json')
+            with mock.patch.object(items, 'MSGPACK_AVAILABLE', False):
+                result = self.runner.invoke(
+                    items.cli, ('1/2/3', '--transport', 'msgpack'))
+            self.assertIn('You need the msgpack package', result.output)
+
+    def test_items_range_and_sample(self):
+        with mock.patch.object(items, 'get_job', autospec=True) as mock_gj, \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri, \
+             mock.patch.object(items, 'job_resource_sample', autospec=True) \
+             as mock_jrs:
+            mock_gj.return_value.key = '1/2/3'
+            mock_jri.return_value = mock_jrs.return_value = iter([])
+            self.runner.invoke(items.cli, ('1/2/3', '--range', '100:150'))
+            self.assertEqual(mock_jri.call_args[1]['startafter'], '1/2/3/99')
+            self.assertEqual(mock_jri.call_args[1]['stop'], 150)
+            self.runner.invoke(items.cli, ('1/2/3', '--range', '0:10'))
+            self.assertIsNone(mock_jri.call_args[1]['startafter'])
+            self.runner.invoke(items.cli, ('1/2/3', '--sample', '10',
+                                           '--fields', 'a'))
+            self.assertEqual(mock_jrs.call_args[0][2], 10)
+            self.assertEqual(mock_jrs.call_args[1]['parallel'], 4)
+            for args in (('--range', '5:5'), ('--range', 'a:b'),
+                         ('--range', '1:5', '--sample', '3'),
+                         ('--sample', '3', '-f'),
+                         ('--sample', '3', '--filter', '["a", "=", [1]]')):
+                result = self.runner.invoke(items.cli, ('1/2/3',) + args)
+                self.assertNotEqual(result.exit_code, 0, args)
+
+    def test_summary(self):
+        with mock.patch.object(items, 'get_job', autospec=True), \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            mock_jri.return_value = iter([{'a': 1}, {'a': None}])
+            result = self.runner.invoke(items.cli, ('1/2/3', '--summary'))
+            self.assertFalse(mock_jri.call_args[1]['output_json'])
+            self.assertIn('Items: 2', result.output)
+            self.assertIn('50.0%', result.output)
+            result = self.runner.invoke(items.cli, (
+                '1/2/3', '--summary', '--to-sqlite', 'items.db'))
+            self.assertIn('cannot be combined', result.output)
+        with mock.patch.object(requests, 'get_job', autospec=True), \
+             mock.patch.object(requests, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            mock_jri.return_value = iter([
+                {'status': 200, 'rs': 10, 'duration': 5,
+                 'url': 'https://example.com/'}])
+            result = self.runner.invoke(requests.cli,
+                                        ('1/2/3', '--summary', 'json'))
+            self.assertFalse(mock_jri.call_args[1]['output_json'])
+            self.assertEqual(json.loads(result.output)['status'], {'200': 1})
+
+    def test_items_diff(self):
+        with mock.patch.object(items, 'get_jobs', autospec=True) as mock_gj, \
+             mock.patch.object(items, 'get_job_specs', autospec=True), \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            jobs = [mock.Mock(key='1/2/3'), mock.Mock(key='1/2/4')]
+            for job in jobs:
+                job.items.stats.return_value = {'totals': {'input_values': 1}}
+            mock_gj.return_value = jobs
+            mock_jri.side_effect = [iter(['{"url": "a", "price": 1}']),
+                                    iter(['{"url": "a", "price": 2}'])]
+            result = self.runner.invoke(items.cli, (
+                '--diff', '1/2/3', '1/2/4', '--key', 'url', '-F', 'csv',
+                '--fields', 'price'))
+            self.assertEqual(result.exit_code, 0)
+            self.assertTrue(mock_jri.call_args[1]['output_json'])
+            self.assertEqual(mock_jri.call_args[1]['query']['fields'],
+                             ['price', 'url'])
+            self.assertIn('"changes": {"price": [1, 2]}', result.output)
+            for args in (('1/2/3', '--key', 'url'),
+                         ('1/2/3', '1/2/4'),
+                         ('1/2/3', '1/2/4', '--key', 'url', '--summary')):
+                result = self.runner.invoke(items.cli, ('--diff',) + args)
+                self.assertNotEqual(result.exit_code, 0)
+            result = self.runner.invoke(items.cli, ('1/2/3', '--key', 'url'))
+            self.assertIn('--key only applies to --diff', result.output)
+
+    def test_items_to_sqlite(self):
+        with mock.patch.object(items, 'get_job', autospec=True) as mock_gj, \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri, \
+             mock.patch.object(items, 'write_sqlite', autospec=True) \
+             as mock_ws:
+            mock_gj.return_value.key = '1/2/3'
+            mock_jri.return_value = iter([{'a': 1}])
+            result = self.runner.invoke(items.cli, (
+                '1/2/3', '--to-sqlite', 'items.db', '--table', 'products',
+                '--index', 'a', '-F', 'jsonl'))
+            self.assertEqual(result.exit_code, 0)
+            args, kwargs = mock_ws.call_args
+            self.assertEqual(list(args[0]), [{'_job': '1/2/3', 'a': 1}])
+            self.assertFalse(mock_jri.call_args[1]['output_json'])
+            self.assertEqual(args[1:], ('items.db', 'products'))
+            self.assertEqual(kwargs['index_fields'], ('a',))
+            result = self.runner.invoke(items.cli, (
+                '1/2/3', '--to-sqlite', 'items.db', '--output', 'out'))
+            self.assertIn('cannot be combined', result.output)
+
+    def test_items_workers(self):
+        with mock.patch.object(items, 'get_job', autospec=True), \
+             mock.patch.object(items, 'job_resource_iter', autospec=True) \
+             as mock_jri, \
+             mock.patch.object(items, 'write_items', autospec=True) \
+             as mock_wi:
+            result = self.runner.invoke(items.cli, (
+                '1/2/3', '-F', 'csv', '--workers', '4'))
+            self.assertEqual(result.exit_code, 0)
+            self.assertTrue(mock_jri.call_args[1]['output_json'])
+            self.assertEqual(mock_wi.call_args[1]['workers'], 4)
+            for args in (('-F', 'parquet'), ('--to-sqlite', 'items.db')):
+                result = self.runner.invoke(
+                    items.cli, ('1/2/3', '--workers', '4') + args)
+                self.assertIn('--workers only supports', result.output)
+
+    def test_items_job_selectors(self):
+        with mock.patch.object(items, 'get_jobs', autospec=True) as mock_gj, \
+                mock.patch.object(items, 'select_job_specs',
+                                  autospec=True) as mock_sjs:
+            mock_gj.return_value = []
+            result = self.runner.invoke(
+                items.cli, ('prod', '--spider', 'myspider', '--tag', 'a',
+                            '--state', 'finished', '--since', '2026-01-02'))
+            self.assertEqual(result.exit_code, 0)
+            args = mock_sjs.call_args[0]
+            self.assertEqual(args[:4], ('prod', 'myspider', ('a',),
+                                        ('finished',)))
+            self.assertEqual(args[4].day, 2)
+            self.runner.invoke(items.cli, ('--spider', 'myspider'))
+            self.assertEqual(mock_sjs.call_args[0][0], 'default')
+            self.runner.invoke(items.cli, ('prod', '--running'))
+            self.assertEqual(mock_sjs.call_args[0][:4],
+                             ('prod', None, (), ('running',)))
+
+            result = self.runner.invoke(items.cli,
+                                        ('2/3', '--spider', 'myspider'))
+            self.assertIn('cannot be combined', result.output)
+            result = self.runner.invoke(items.cli, ())
+            self.assertIn('Please provide a job ID', result.output)
 
     def test_requests(self):
         self._test_prints_objects(requests, 'requests')
         self._test_forwards_follow(requests)
+        self._test_prints_stats(requests)
+        self._test_writes_output(requests)
 
     def test_log(self):
         objects = [
@@ -52,7 +333,7 @@ class JobResourceTest(unittest.TestCase):
             mock_gj.return_value._metadata_updated = time.time()
             mock_gj.return_value.logs.iter_values.return_value = objects
             result = self.runner.invoke(log.cli, (jobid,))
-            mock_gj.assert_called_once_with(jobid)
+            mock_gj.assert_called_once_with(jobid, pool_size=1)
             self.assertIn('1970-01-01 00:00:00 INFO message 1', result.output)
             self.assertIn('2015-12-23 12:41:11 CRITICAL message 2', result.output)
         with mock.patch.object(log, 'get_job', autospec=True) as mock_gj:
@@ -63,6 +344,59 @@ class JobResourceTest(unittest.TestCase):
                 for idx, line in enumerate(result.output.splitlines()):
                     self.assertEqual(json.loads(line), objects[idx])
         self._test_forwards_follow(log)
+        self._test_prints_stats(log, '--json')
+        self._test_writes_output(log, '--json')
+
+    def test_log_query(self):
+        with mock.patch.object(log, 'get_job'), \
+             mock.patch.object(log, 'job_resource_iter', autospec=True) \
+             as mock_jri:
+            self.runner.invoke(log.cli, ('1/2/3', '--level', 'error',
+                                         '--start-time', '2026-01-02'))
+            query = mock_jri.call_args[1]['query']
+            self.assertEqual(query['filter'], ['["level", ">=", [40]]'])
+            self.assertIn('startts', query)
+            self.assertNotIn('endts', query)
+
+    def test_log_multiple_jobs(self):
+        entry = {'time': 0, 'level': 20, 'message': 'message'}
+
+        def make_job(key):
+            job = mock.Mock(key=key)
+            job.logs.iter_json.return_value = [
+                json.dumps(dict(entry, _key=f'{key}/0'))]
+            job.metadata = {'state': 'finished'}
+            job._metadata_updated = time.time()
+            return job
+
+        with mock.patch.object(log, 'get_jobs', autospec=True) as mock_gj, \
+                mock.patch.object(log, 'get_job_specs', autospec=True,
+                                  side_effect=lambda x: ('1/' + x, 'key')), \
+                mock.patch.object(log, 'select_job_specs',
+                                  autospec=True) as mock_sjs:
+            mock_gj.side_effect = lambda specs: [
+                make_job(key) for key, _ in specs]
+            result = self.runner.invoke(log.cli, ('2/3', '2/4', '-f'))
+            self.assertEqual(result.output.splitlines(), [
+                '1/2/3 1970-01-01 00:00:00 INFO message',
+                '1/2/4 1970-01-01 00:00:00 INFO message',
+            ])
+            result = self.runner.invoke(log.cli, ('2/3', '2/4', '--json'))
+            self.assertEqual(json.loads(result.output.splitlines()[1]),
+                             dict(entry, _key='1/2/4/0', _job='1/2/4'))
+
+            mock_sjs.return_value = [('1/2/5', 'key')]
+            result = self.runner.invoke(log.cli, ('-f', '--running'))
+            self.assertEqual(result.output,
+                             '1/2/5 1970-01-01 00:00:00 INFO message\n')
+            mock_sjs.assert_called_once_with('default', states=('running',))
+
+            result = self.runner.invoke(log.cli, ('2/3', '--running'))
+            self.assertIn('only accepts a target', result.output)
+            result = self.runner.invoke(log.cli, ('2/3', '2/4', '-n', '5'))
+            self.assertIn('only support a single job', result.output)
+            result = self.runner.invoke(log.cli, ())
+            self.assertIn('Please provide a job ID', result.output)
 
     def test_log_unicode(self):
         objects = [
@@ -73,5 +407,5 @@ class JobResourceTest(unittest.TestCase):
             mock_gj.return_value._metadata_updated = time.time()
             mock_gj.return_value.logs.iter_values.return_value = objects
             result = self.runner.invoke(log.cli, (jobid,))
-            mock_gj.assert_called_once_with(jobid)
+            mock_gj.assert_called_once_with(jobid, pool_size=1)
             self.assertIn('1970-01-01 00:00:00 INFO jarzębina', result.output)
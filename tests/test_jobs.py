@@ -0,0 +1,89 @@
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+from scrapinghub import ScrapinghubAPIError
+
+from shub import jobs
+from shub.cache import JobListCache
+from shub.utils import JOBS_PAGE_SIZE
+
+from .utils import mock_conf
+
+
+class JobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CliRunner()
+        self.conf = mock_conf(self)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        patcher = mock.patch.object(
+            jobs, 'JobListCache', lambda: JobListCache(path=tmpdir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(jobs, 'get_scrapinghub_client_from_config',
+                                    autospec=True)
+        self.project = patcher.start().return_value.get_project.return_value
+        self.project.key = '1'
+        self.addCleanup(patcher.stop)
+
+    def test_lists_jobs(self):
+        self.project.jobs.iter.return_value = [
+            {'key': '1/2/3', 'spider': 'myspider', 'state': 'finished',
+             'close_reason': 'finished', 'items': 12, 'ts': 1767225600000}]
+        result = self.runner.invoke(jobs.cli, ('--spider', 'myspider'))
+        self.assertEqual(result.exit_code, 0)
+        lines = result.output.splitlines()
+        self.assertEqual(lines[0].split()[:3], ['Job', 'Spider', 'State'])
+        self.assertEqual(lines[1].split(), [
+            '1/2/3', 'myspider', 'finished', 'finished', '12', '0',
+            '2026-01-01', '00:00:00'])
+        self.project.jobs.iter.assert_called_once_with(
+            start=0, count=JOBS_PAGE_SIZE, state='finished',
+            spider='myspider')
+
+        # Only newer jobs are fetched once cached
+        result = self.runner.invoke(jobs.cli, ('--spider', 'myspider',
+                                               '-F', 'jsonl'))
+        self.assertEqual(json.loads(result.output)['key'], '1/2/3')
+        self.assertEqual(self.project.jobs.iter.call_args[1]['startts'],
+                         1767225600000)
+        self.runner.invoke(jobs.cli, ('--spider', 'myspider', '--no-cache'))
+        self.assertNotIn('startts', self.project.jobs.iter.call_args[1])
+
+    def test_live_states(self):
+        self.project.jobs.iter.return_value = [
+            {'key': '1/2/%s' % n, 'state': 'running'} for n in range(3)]
+        result = self.runner.invoke(jobs.cli, (
+            '--state', 'running', '--state', 'pending', '-n', '2', '-F',
+            'jsonl', '--since', '2026-01-01'))
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(result.output.splitlines()), 2)
+        kwargs = self.project.jobs.iter.call_args[1]
+        self.assertEqual(kwargs['state'], ['running', 'pending'])
+        self.assertIn('startts', kwargs)
+
+    def test_states_are_merged(self):
+        def iter_jobs(state, **kwargs):
+            if state == 'finished':
+                return [{'key': '1/2/3', 'state': 'finished', 'ts': 300},
+                        {'key': '1/2/1', 'state': 'finished', 'ts': 100}]
+            return [{'key': '1/2/4', 'state': 'running', 'ts': 400},
+                    {'key': '1/2/2', 'state': 'pending', 'ts': 200}]
+
+        self.project.jobs.iter.side_effect = iter_jobs
+        result = self.runner.invoke(jobs.cli, (
+            '--state', 'running', '--state', 'finished', '--state',
+            'pending', '-F', 'jsonl', '--no-cache'))
+        self.assertEqual(
+            [json.loads(line)['key'] for line in result.output.splitlines()],
+            ['1/2/4', '1/2/3', '1/2/2', '1/2/1'])
+
+    def test_api_error(self):
+        self.project.jobs.iter.side_effect = ScrapinghubAPIError('error')
+        result = self.runner.invoke(jobs.cli, ('--no-cache',))
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('error', result.output)
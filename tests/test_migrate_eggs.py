@@ -35,7 +35,8 @@ class MigrateEggsTest(unittest.TestCase):
     def setUp(self):
         self.clickm = mock.patch('shub.migrate_eggs.click').start()
         gtc = mock.patch('shub.migrate_eggs.get_target_conf').start()
-        self.requestsm = mock.patch('shub.migrate_eggs.requests').start()
+        self.requestsm = mock.patch(
+            'shub.migrate_eggs.get_http_session').start().return_value
 
         self.curr_dir = os.path.dirname(os.path.realpath(__file__))
 
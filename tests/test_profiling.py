@@ -0,0 +1,28 @@
+import os
+import pstats
+import tempfile
+import unittest
+from unittest import mock
+
+from shub import config
+from shub.profiling import CommandProfiler
+
+
+class CommandProfilerTest(unittest.TestCase):
+
+    @mock.patch('shub.profiling.click.echo')
+    def test_stop(self, mock_echo):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'out.pstats')
+            profiler = CommandProfiler(path)
+            config.load_shub_config(load_global=False, load_local=False,
+                                    load_env=False)
+            with mock.patch('sys.stderr'):
+                profiler.stop()
+            stats = pstats.Stats(path)
+            self.assertTrue(any(funcname == 'load_shub_config'
+                                for _, _, funcname in stats.stats))
+            self.assertGreater(profiler.config_time(stats), 0)
+        summary = mock_echo.call_args_list[0][0][0]
+        self.assertRegex(summary, r'^Wall-clock time: import \d+\.\d{3}s, '
+                                  r'config resolution \d+\.\d{3}s, command')
@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest import mock
 
@@ -37,7 +38,7 @@ class ScheduleTest(unittest.TestCase):
         mock_schedule.assert_called_with(
             456, endpoint, apikey, 'spider', (), (), 2, None, (), ())
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_schedule_invalid_spider(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         mock_proj.jobs.run.side_effect = ScrapinghubAPIError('')
@@ -45,14 +46,14 @@ class ScheduleTest(unittest.TestCase):
             schedule.schedule_spider(1, 'https://endpoint/api/',
                                      'FAKE_API_KEY', 'fake_spider')
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_schedule_spider_calls_project_jobs_run(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         schedule.schedule_spider(1, 'https://endpoint/api/',
                                  'FAKE_API_KEY', 'fake_spider')
         self.assertTrue(mock_proj.jobs.run)
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_forwards_args_and_settings(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         self.runner.invoke(
@@ -71,14 +72,14 @@ class ScheduleTest(unittest.TestCase):
             job_settings,
         )
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_forwards_tags(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         self.runner.invoke(schedule.cli, 'testspider -t tag1 -t tag2 --tag tag3'.split())
         call_kwargs = mock_proj.jobs.run.call_args[1]
         assert call_kwargs['add_tag'] == ('tag1', 'tag2', 'tag3')
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_forwards_priority(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         # short option name
@@ -90,7 +91,7 @@ class ScheduleTest(unittest.TestCase):
         call_kwargs = mock_proj.jobs.run.call_args[1]
         assert call_kwargs['priority'] == 1
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_forwards_units(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         # no units specified
@@ -106,7 +107,7 @@ class ScheduleTest(unittest.TestCase):
         call_kwargs = mock_proj.jobs.run.call_args[1]
         assert call_kwargs['units'] == 3
 
-    @mock.patch('shub.schedule.ScrapinghubClient', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client', autospec=True)
     def test_forwards_environment(self, mock_client):
         mock_proj = mock_client.return_value.get_project.return_value
         self.runner.invoke(
@@ -118,3 +119,125 @@ class ScheduleTest(unittest.TestCase):
             {'VAR1': 'VAL1', 'VAR2': 'VAL2'}.items(),
             call_kwargs['environment'].items(),
         )
+
+    @mock.patch('shub.schedule.get_scrapinghub_client_from_config',
+                autospec=True)
+    def test_schedules_jobs_from_file(self, mock_client):
+        mock_run = mock_client.return_value.get_project.return_value.jobs.run
+
+        def run(spider, **kwargs):
+            if spider == 'broken':
+                raise ScrapinghubAPIError('Spider not found')
+            return mock.Mock(key='1/{}/1'.format(len(spider)))
+
+        mock_run.side_effect = run
+        with self.runner.isolated_filesystem():
+            with open('jobs.jl', 'w') as f:
+                f.write('{"spider": "a", "args": {"x": "1"}, "tags": ["t2"]}\n'
+                        '\n'
+                        '{"spider": "bb", "priority": 4, "units": 2}\n')
+            result = self.runner.invoke(schedule.cli, [
+                '--from-file', 'jobs.jl', '-a', 'y=2', '-t', 't1', '-c', '2'])
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(
+                [json.loads(line) for line in result.output.splitlines()],
+                [{'spider': 'a', 'key': '1/1/1'},
+                 {'spider': 'bb', 'key': '1/2/1'}])
+            self.assertEqual(mock_client.call_args[1]['pool_size'], 2)
+            calls = sorted(mock_run.call_args_list,
+                           key=lambda call: call[1]['spider'])
+            self.assertEqual(calls[0][1]['job_args'], {'x': '1', 'y': '2'})
+            self.assertEqual(calls[0][1]['add_tag'], ['t1', 't2'])
+            self.assertEqual(calls[0][1]['priority'], 2)
+            self.assertEqual(calls[1][1]['priority'], 4)
+            self.assertEqual(calls[1][1]['units'], 2)
+
+            with open('jobs.csv', 'w') as f:
+                f.write('spider,settings,tags\n'
+                        'a,"{""LOG_LEVEL"": ""INFO""}",\n'
+                        'broken,,"[""x""]"\n')
+            result = self.runner.invoke(schedule.cli, [
+                'vagrant', '--from-file', 'jobs.csv'])
+            self.assertNotEqual(result.exit_code, 0)
+            self.assertIn('{"spider": "broken", "error": "Spider not found"}',
+                          result.output)
+            self.assertIn('1 of 2 jobs could not be scheduled', result.output)
+            self.assertEqual(mock_run.call_args_list[-2][1]['job_settings'],
+                             {'LOG_LEVEL': 'INFO'})
+
+    def test_invalid_manifest(self):
+        for manifest, error in (
+                ('{"spider": "a"}\n{"args": {}}\n',
+                 'line 2 of jobs.jl: a spider name is required'),
+                ('{"spider": "a", "units": "2"}\n', 'units must be an integer'),
+                ('{"spider": "a", "unit": 2}\n', 'unknown fields unit'),
+                ('spider\n', 'line 1 of jobs.jl'),
+        ):
+            with self.runner.isolated_filesystem():
+                with open('jobs.jl', 'w') as f:
+                    f.write(manifest)
+                result = self.runner.invoke(schedule.cli,
+                                            ['--from-file', 'jobs.jl'])
+                self.assertNotEqual(result.exit_code, 0)
+                self.assertIn(error, result.output)
+        result = self.runner.invoke(schedule.cli, [])
+        self.assertIn('Please provide a spider name', result.output)
+
+    @mock.patch('shub.schedule.wait_for_jobs', autospec=True)
+    @mock.patch('shub.schedule.get_hubstorage_client', autospec=True)
+    @mock.patch('shub.schedule.schedule_spider', autospec=True)
+    def test_wait(self, mock_schedule, mock_hsc, mock_wait):
+        mock_schedule.return_value = '1/2/3'
+        mock_wait.return_value = iter([('1/2/3', 'finished')])
+        result = self.runner.invoke(schedule.cli, ['spider', '--wait',
+                                                   '--poll-interval', '2'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Job 1/2/3 closed, reason: finished', result.output)
+        project = mock_hsc.return_value.get_project.return_value
+        mock_wait.assert_called_once_with(project, ['1/2/3'], 2)
+
+        mock_wait.return_value = iter([('1/2/3', 'failed')])
+        result = self.runner.invoke(schedule.cli, ['spider', '--wait'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Job 1/2/3 did not finish successfully', result.output)
+
+        # Polling JobQ in a tight loop is not allowed
+        mock_wait.reset_mock()
+        result = self.runner.invoke(schedule.cli, ['spider', '--wait',
+                                                   '--poll-interval', '0'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertFalse(mock_wait.called)
+
+    @mock.patch('shub.schedule.wait_for_jobs', autospec=True)
+    @mock.patch('shub.schedule.get_hubstorage_client', autospec=True)
+    @mock.patch('shub.schedule.jobs_resource_iter', autospec=True)
+    @mock.patch('shub.schedule.get_jobs', autospec=True)
+    @mock.patch('shub.schedule.get_scrapinghub_client_from_config',
+                autospec=True)
+    def test_wait_for_jobs_from_file(self, mock_client, mock_get_jobs,
+                                     mock_jri, mock_hsc, mock_wait):
+        mock_run = mock_client.return_value.get_project.return_value.jobs.run
+        mock_run.side_effect = lambda spider, **kwargs: mock.Mock(
+            key='1/{}/1'.format(len(spider)))
+        jobs = [mock.Mock(key='1/1/1'), mock.Mock(key='1/2/1')]
+        mock_get_jobs.return_value = jobs
+        mock_jri.return_value = iter([
+            (jobs[1], {'time': 0, 'level': 20, 'message': 'Spider opened'})])
+        mock_wait.return_value = iter([('1/2/1', 'finished'),
+                                       ('1/1/1', 'cancelled')])
+        with self.runner.isolated_filesystem():
+            with open('jobs.jl', 'w') as f:
+                f.write('{"spider": "a"}\n{"spider": "bb"}\n')
+            result = self.runner.invoke(schedule.cli, [
+                '--from-file', 'jobs.jl', '--follow-log'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertEqual(mock_get_jobs.call_args[0][0],
+                         [('1/1/1', self.conf.apikeys['default']),
+                          ('1/2/1', self.conf.apikeys['default'])])
+        self.assertIn('1/2/1 1970-01-01 00:00:00 INFO Spider opened',
+                      result.output)
+        self.assertIn('{"key": "1/1/1", "close_reason": "cancelled"}',
+                      result.output)
+        self.assertIn('Close reasons: finished 1, cancelled 1', result.output)
+        self.assertIn('1 of 2 jobs did not finish successfully',
+                      result.output)
@@ -0,0 +1,101 @@
+import json
+import random
+import unittest
+from unittest import mock
+
+from shub import summary
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def test_quantiles_within_relative_accuracy(self):
+        values = [random.lognormvariate(5, 2) for _ in range(10000)]
+        sketch = summary.QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0.1, 0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q) / exact, 1, delta=0.02)
+        self.assertEqual(sketch.quantile(1), values[-1])
+        self.assertLess(len(sketch.buckets), 2000)
+
+    def test_zeros_and_empty(self):
+        sketch = summary.QuantileSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        for value in (0, 0, 0, 10):
+            sketch.add(value)
+        self.assertEqual(sketch.quantile(0.5), 0)
+        self.assertEqual(sketch.quantile(1), 10)
+
+
+class TopCounterTest(unittest.TestCase):
+
+    def test_keeps_frequent_keys(self):
+        counter = summary.TopCounter(capacity=5)
+        for idx in range(100):
+            counter.add('frequent')
+            counter.add(f'rare-{idx}')
+        self.assertLess(len(counter.counts), 10)
+        self.assertEqual(counter.most_common(1), [('frequent', 100)])
+        self.assertEqual(counter.max_error, 1)
+
+
+class RequestsSummaryTest(unittest.TestCase):
+
+    requests = [
+        {'status': 200, 'rs': 1000, 'duration': 100,
+         'url': 'https://example.com/a'},
+        {'status': 200, 'rs': 2000, 'duration': 300,
+         'url': 'https://example.com/b'},
+        {'status': 404, 'rs': 0, 'duration': 50,
+         'url': 'http://other.example.org/c'},
+    ]
+
+    def _summarize(self):
+        requests_summary = summary.RequestsSummary()
+        for request in self.requests:
+            requests_summary.add(request)
+        return requests_summary
+
+    def test_to_dict(self):
+        result = self._summarize().to_dict()
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(result['status'], {'200': 2, '404': 1})
+        self.assertEqual(result['domains'], {'example.com': 2,
+                                             'other.example.org': 1})
+        self.assertEqual(result['size']['max'], 2000)
+        self.assertAlmostEqual(result['duration']['p50'], 100, delta=2)
+        self.assertEqual([r['url'] for r in result['slowest']], [
+            'https://example.com/b', 'https://example.com/a',
+            'http://other.example.org/c'])
+
+    def test_format_table(self):
+        table = self._summarize().format_table()
+        self.assertIn('Requests: 3', table)
+        self.assertIn('example.com', table)
+        self.assertIn('300 ms  200  https://example.com/b', table)
+
+    def test_print_summary(self):
+        with mock.patch.object(summary.click, 'echo') as mock_echo:
+            summary.print_summary(iter(self.requests),
+                                  summary.RequestsSummary(), 'json')
+        self.assertEqual(json.loads(mock_echo.call_args[0][0])['requests'], 3)
+
+
+class ItemsSummaryTest(unittest.TestCase):
+
+    def test_fill_rates_and_types(self):
+        items_summary = summary.ItemsSummary()
+        for item in ({'a': 1, 'b': 'x'}, {'a': None, 'b': ['y']},
+                     {'a': 2.5}, {'a': 3}):
+            items_summary.add(item)
+        result = items_summary.to_dict()
+        self.assertEqual(result['items'], 4)
+        self.assertEqual(result['fields']['a'], {
+            'fill_rate': 0.75,
+            'types': {'integer': 2, 'null': 1, 'float': 1},
+        })
+        self.assertEqual(result['fields']['b']['fill_rate'], 0.5)
+        table = items_summary.format_table()
+        self.assertIn('75.0%  integer 2, null 1, float 1', table)
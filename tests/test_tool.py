@@ -90,3 +90,42 @@ def test_cli_dotenv_path_option(runner, tmp_path, monkeypatch):
 
     assert result.exit_code == 0, result.output
     assert os.environ['SHUB_APIKEY'] == 'CLIKEY'
+
+
+def test_cli_no_http_cache_option(runner):
+    with mock.patch('shub.tool.disable_http_cache') as mock_disable:
+        result = runner.invoke(cli, ['version'])
+        assert result.exit_code == 0, result.output
+        assert not mock_disable.called
+        result = runner.invoke(cli, ['--no-http-cache', 'version'])
+        assert result.exit_code == 0, result.output
+        mock_disable.assert_called_once_with()
+
+
+def test_cli_trace_option(runner, tmp_path):
+    trace_path = str(tmp_path / 'trace.jl')
+    with mock.patch('shub.tool.start_tracing') as mock_start, \
+            mock.patch('shub.tool.stop_tracing') as mock_stop:
+        result = runner.invoke(cli, ['--trace', trace_path, 'version'])
+        assert result.exit_code == 0, result.output
+        mock_start.assert_called_once_with(trace_path)
+        mock_stop.assert_called_once_with()
+        mock_start.reset_mock()
+        result = runner.invoke(cli, ['version'], env={'SHUB_TRACE': trace_path})
+        mock_start.assert_called_once_with(trace_path)
+
+
+def test_cli_profile_option(runner, tmp_path):
+    profile_path = str(tmp_path / 'out.pstats')
+    with mock.patch('shub.tool.CommandProfiler') as mock_profiler:
+        result = runner.invoke(cli, ['--profile', 'version'])
+        assert result.exit_code == 0, result.output
+        mock_profiler.assert_called_once_with(None)
+        mock_profiler.return_value.stop.assert_called_once_with()
+        mock_profiler.reset_mock()
+        result = runner.invoke(cli, ['--profile=' + profile_path, 'version'])
+        assert result.exit_code == 0, result.output
+        mock_profiler.assert_called_once_with(profile_path)
+        mock_profiler.reset_mock()
+        result = runner.invoke(cli, ['version'])
+        assert not mock_profiler.called
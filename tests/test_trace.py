@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from shub import trace
+
+
+class TraceTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'trace.jl')
+
+    def _entry(self, **kwargs):
+        entry = {'method': 'GET', 'url': 'https://storage/items/{id}',
+                 'status': 200, 'bytes_sent': 0, 'bytes_received': 100,
+                 'ttfb_ms': 10.0, 'time_ms': 30.0, 'retries': 0,
+                 'error': None}
+        entry.update(kwargs)
+        return entry
+
+    def test_url_template(self):
+        self.assertEqual(
+            trace.url_template('https://storage.scrapinghub.com/items/1/2/3'
+                               '?meta=_key&count=100'),
+            'https://storage.scrapinghub.com/items/{id}/{id}/{id}')
+        self.assertEqual(
+            trace.url_template('https://app.zyte.com/api/releases/deploy/'
+                               '42.json'),
+            'https://app.zyte.com/api/releases/deploy/{id}.json')
+        self.assertEqual(
+            trace.url_template('https://app.zyte.com/api/v2/users/me'),
+            'https://app.zyte.com/api/v2/users/me')
+
+    def test_record(self):
+        tracer = trace.HTTPTracer(self.path)
+        tracer.record(self._entry())
+        tracer.record(self._entry(status=503, retries=2))
+        tracer.record(self._entry(method='POST', url='https://app/run.json',
+                                  status=None, error='ConnectionError: ...'))
+        tracer.close()
+        with open(self.path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[1]['retries'], 2)
+        stats = tracer.endpoints[('GET', 'https://storage/items/{id}')]
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['bytes_received'], 200)
+        self.assertEqual(tracer.endpoints[('POST', 'https://app/run.json')]
+                         ['errors'], 1)
+        summary = tracer.format_summary().splitlines()
+        self.assertEqual(len(summary), 3)
+        self.assertIn('https://storage/items/{id}', summary[1])
+        self.assertIn('60 ms', summary[1])
+
+    @mock.patch('shub.trace.click.echo')
+    def test_start_stop_tracing(self, mock_echo):
+        self.assertIsNone(trace.get_tracer())
+        tracer = trace.start_tracing(self.path)
+        self.assertIs(trace.get_tracer(), tracer)
+        tracer.record(self._entry())
+        trace.stop_tracing()
+        self.assertIsNone(trace.get_tracer())
+        self.assertTrue(tracer._file.closed)
+        self.assertIn('https://storage/items/{id}',
+                      mock_echo.call_args_list[0][0][0])
+        # Stopping twice is harmless
+        trace.stop_tracing()
@@ -1,20 +1,27 @@
+import datetime
+import io
 import json
 import os
 import stat
 import sys
+import tempfile
 import unittest
 import textwrap
 import time
 from io import StringIO
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import Mock, MagicMock, call, patch
 
 import click
+import requests
+import urllib3
 import yaml
 from click.testing import CliRunner
 from collections import deque
 from scrapinghub import ScrapinghubAPIError
+from urllib3.util.retry import Retry
 
 from shub import utils
+from shub.cache import JobCache
 from shub.config import ShubConfig
 from shub.exceptions import (
     BadParameterException, InvalidAuthException, MissingAuthException,
@@ -143,7 +150,7 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
             with self.assertRaises(BadParameterException):
                 utils.get_job_specs(job_id)
 
-    @patch('shub.utils.HubstorageClient', autospec=True)
+    @patch('shub.utils.get_hubstorage_client', autospec=True)
     def test_get_job(self, mock_HSC):
         class MockJob:
             metadata = {'some': 'val'}
@@ -152,7 +159,12 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
         conf = mock_conf(self)
 
         self.assertIs(utils.get_job('1/1/1'), mockjob)
-        mock_HSC.assert_called_once_with(auth=conf.apikeys['default'])
+        mock_HSC.assert_called_once_with(conf.apikeys['default'], None)
+        # Parallel downloads that don't fit in the shared pool get their own
+        utils.get_job('1/1/1', pool_size=utils.HTTP_POOL_SIZE)
+        mock_HSC.assert_called_with(conf.apikeys['default'], None)
+        utils.get_job('1/1/1', pool_size=16)
+        mock_HSC.assert_called_with(conf.apikeys['default'], 16)
 
         with self.assertRaises(BadParameterException):
             utils.get_job('1/1/')
@@ -162,6 +174,64 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
         with self.assertRaises(NotFoundException):
             utils.get_job('1/1/1')
 
+    @patch('shub.utils.HubstorageClient')
+    def test_get_jobs(self, mock_HSC):
+        clients = {}
+
+        def make_client(auth):
+            clients[auth] = MagicMock()
+            clients[auth].get_job.side_effect = lambda key: Mock(
+                key=key, auth=auth, metadata={'state': 'finished'})
+            return clients[auth]
+
+        mock_HSC.side_effect = make_client
+        jobs = utils.get_jobs(
+            [('1/1/1', 'key1'), ('1/1/2', 'key1'), ('2/1/1', 'key2')],
+            pool_size=8,
+        )
+        self.assertEqual([(job.auth, job.key) for job in jobs],
+                         [('key1', '1/1/1'), ('key1', '1/1/2'),
+                          ('key2', '2/1/1')])
+        self.assertEqual(sorted(clients), ['key1', 'key2'])
+        adapter = clients['key1'].session.mount.call_args[0][1]
+        self.assertEqual(adapter._pool_maxsize, 8)
+
+        mock_HSC.side_effect = None
+        mock_HSC.return_value.get_job.return_value.metadata = None
+        with self.assertRaises(NotFoundException):
+            utils.get_jobs([('1/1/1', 'key1')])
+
+    def test_iter_job_summaries(self):
+        project = Mock()
+        project.jobs.iter.side_effect = lambda start, count, **kw: iter(
+            [{'key': f'1/1/{idx}'} for idx in range(start, min(start + count, 5))])
+        summaries = list(utils.iter_job_summaries(project, page_size=2,
+                                                  spider='spider'))
+        self.assertEqual([s['key'] for s in summaries],
+                         [f'1/1/{idx}' for idx in range(5)])
+        project.jobs.iter.assert_called_with(start=4, count=2,
+                                             spider='spider')
+
+    @patch('shub.utils.get_scrapinghub_client_from_config')
+    def test_select_job_specs(self, mock_client):
+        conf = mock_conf(self)
+        project = mock_client.return_value.get_project.return_value
+        project.jobs.iter.return_value = iter([{'key': '2/1/1'},
+                                               {'key': '2/1/2'}])
+        since = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        specs = utils.select_job_specs('prod', spider='spider', tags=['a'],
+                                       states=['finished'], since=since)
+        apikey = conf.apikeys['default']
+        self.assertEqual(specs, [('2/1/1', apikey), ('2/1/2', apikey)])
+        mock_client.return_value.get_project.assert_called_once_with(2)
+        project.jobs.iter.assert_called_once_with(
+            start=0, count=utils.JOBS_PAGE_SIZE, spider='spider',
+            has_tag=['a'], state=['finished'], startts=1767225600000)
+
+        project.jobs.iter.side_effect = ScrapinghubAPIError('error')
+        with self.assertRaises(RemoteErrorException):
+            utils.select_job_specs('prod')
+
     def test_is_deploy_successful(self):
         # no results
         last_logs = deque(maxlen=5)
@@ -210,19 +280,209 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
             utils.job_live(job, refresh_meta_after=5)
             self.assertFalse(job.metadata.expire.called)
 
+    def test_adaptive_poller(self):
+        poller = utils.AdaptivePoller(poll_min=1, poll_max=10)
+        self.assertEqual(poller.next_interval(True), 0)
+        intervals = [poller.next_interval(False) for _ in range(6)]
+        self.assertEqual(intervals, [1, 2, 4, 8, 10, 10])
+        self.assertEqual(poller.next_interval(True), 0)
+        self.assertEqual(poller.next_interval(False), 1)
+        # poll_max is never lower than poll_min
+        poller = utils.AdaptivePoller(poll_min=5, poll_max=2)
+        self.assertEqual(poller.next_interval(False), 5)
+        self.assertEqual(poller.next_interval(False), 5)
+
+    @patch('shub.utils.time.sleep')
+    def test_wait_for_jobs(self, mock_sleep):
+        states = {
+            '1/1/1': ['running', 'finished'],
+            '1/1/2': [None, 'running', 'finished'],
+            '1/1/3': ['deleted'],
+        }
+        project = Mock()
+
+        def jobsummary(keys, jobmeta):
+            self.assertEqual(jobmeta, ['state', 'close_reason'])
+            for key in keys:
+                state = states[key].pop(0)
+                # Unknown jobs are not returned
+                if state:
+                    yield {'key': key, 'state': state,
+                           'close_reason': 'failed' if key == '1/1/2' else
+                           None if state == 'deleted' else 'finished'}
+
+        project.jobq.jobsummary.side_effect = jobsummary
+        with patch.object(utils, 'JOBSUMMARY_BATCH_SIZE', 2):
+            finished = list(utils.wait_for_jobs(
+                project, ['1/1/1', '1/1/2', '1/1/3'], poll_interval=5))
+        self.assertEqual(finished, [('1/1/3', 'deleted'),
+                                    ('1/1/1', 'finished'),
+                                    ('1/1/2', 'failed')])
+        # Two requests for the first poll, one for each of the two others
+        self.assertEqual(project.jobq.jobsummary.call_count, 4)
+        self.assertEqual(mock_sleep.call_args_list, [call(5), call(5)])
+
+    @patch('shub.utils.time.sleep')
+    @patch('shub.utils.time.monotonic')
+    def test_token_bucket(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 100
+        mock_sleep.side_effect = lambda seconds: setattr(
+            mock_monotonic, 'return_value',
+            mock_monotonic.return_value + seconds)
+        bucket = utils.TokenBucket(rate=4, burst=2)
+        for _ in range(4):
+            bucket.acquire()
+        # The first two calls went through right away, the two next ones
+        # waited for a new token each
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(mock_monotonic.return_value, 100.5)
+
+    def test_mount_http_adapter(self):
+        session = requests.Session()
+        utils.mount_http_adapter(session, pool_size=7, retries=3)
+        adapter = session.get_adapter('https://app.zyte.com/api/run.json')
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+        self.assertTrue(adapter.max_retries.is_retry('GET', 503))
+        # The server may have processed non-idempotent requests that failed
+        self.assertFalse(adapter.max_retries.is_retry('POST', 503))
+        self.assertTrue(adapter.max_retries.is_retry('POST', 429))
+        self.assertTrue(adapter.max_retries.new().is_retry('POST', 429))
+        with self.assertRaises(urllib3.exceptions.ReadTimeoutError):
+            adapter.max_retries.increment(
+                'POST', '/api/run.json',
+                error=urllib3.exceptions.ReadTimeoutError(None, '', ''))
+        self.assertEqual(adapter.max_retries.increment(
+            'POST', '/api/run.json',
+            error=urllib3.exceptions.ConnectTimeoutError()).total, 2)
+
+    @patch('shub.utils._http_adapter', None)
+    @patch('shub.utils._http_session', None)
+    def test_get_http_session(self):
+        with patch.dict(os.environ, {'SHUB_HTTP_POOL_SIZE': '4'}):
+            session = utils.get_http_session()
+        self.assertIs(utils.get_http_session(), session)
+        adapter = session.get_adapter('https://app.zyte.com/api/run.json')
+        self.assertIs(adapter, utils.get_http_adapter())
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, utils.HTTP_RETRIES)
+        self.assertTrue(adapter.max_retries.is_retry('GET', 503))
+        self.assertFalse(adapter.max_retries.is_retry('POST', 503))
+
+        client = utils.get_scrapinghub_client('abcdef')
+        self.assertIs(client._connection._session.get_adapter(
+            'https://app.zyte.com/api/'), adapter)
+        self.assertIs(client._hsclient.session.get_adapter(
+            'https://storage.scrapinghub.com/'), adapter)
+        client = utils.get_scrapinghub_client('abcdef', pool_size=2)
+        self.assertIsNot(client._hsclient.session.get_adapter(
+            'https://storage.scrapinghub.com/'), adapter)
+        hsc = utils.get_hubstorage_client('abcdef')
+        self.assertIs(hsc.session.get_adapter(
+            'https://storage.scrapinghub.com/'), adapter)
+
+    def test_caching_http_adapter(self):
+        url = 'https://app.zyte.com/api/eggs/list.json?project=1'
+        sent = []
+
+        def send(adapter, request, **kwargs):
+            sent.append(dict(request.headers))
+            response = requests.Response()
+            response.status_code = 304 if 'If-None-Match' in request.headers else 200
+            response.headers['ETag'] = '"v1"'
+            response._content = b'{"eggs": []}'
+            response.raw = Mock()
+            return response
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = utils.CachingHTTPAdapter(
+                utils.HTTPCache(path=tmpdir, ttls={'/eggs/list.json': 60}))
+            session = requests.Session()
+            utils._mount_adapter(session, adapter)
+            with patch('requests.adapters.HTTPAdapter.send', send):
+                for _ in range(2):
+                    rsp = session.get(url, auth=('abcdef', ''))
+                    self.assertEqual(rsp.json(), {'eggs': []})
+                self.assertEqual(len(sent), 1)
+                session.get(url, auth=('ghijkl', ''))
+                self.assertEqual(len(sent), 2)
+                with patch('shub.utils.time.time', return_value=time.time() + 61):
+                    rsp = session.get(url, auth=('abcdef', ''))
+                self.assertEqual(rsp.status_code, 200)
+                self.assertEqual(rsp.json(), {'eggs': []})
+                self.assertEqual(sent[-1]['If-None-Match'], '"v1"')
+                session.post(url, auth=('abcdef', ''))
+                session.get(url.replace('eggs/list', 'eggs/add'))
+                self.assertEqual(len(sent), 5)
+                adapter.cache = None
+                session.get(url, auth=('abcdef', ''))
+                self.assertEqual(len(sent), 6)
+
+    def test_tracing_http_adapter(self):
+        def send(adapter, request, **kwargs):
+            raw = urllib3.HTTPResponse(
+                body=io.BytesIO(b'{"a": 1}\n{"a": 2}\n'), status=200,
+                preload_content=False,
+                retries=Retry(3).increment('GET', request.url))
+            return adapter.build_response(request, raw)
+
+        session = requests.Session()
+        utils._mount_adapter(session, utils.TracingHTTPAdapter())
+        tracer = Mock()
+        with patch('requests.adapters.HTTPAdapter.send', send), \
+                patch('shub.utils.get_tracer', return_value=tracer):
+            rsp = session.get('https://storage.scrapinghub.com/items/1/2/3',
+                              params={'count': 2}, stream=True)
+            self.assertFalse(tracer.record.called)
+            self.assertEqual(len(list(rsp.iter_lines())), 2)
+            session.post('https://app.zyte.com/api/run.json', data='abc')
+        entry = tracer.record.call_args_list[0][0][0]
+        self.assertEqual(entry['method'], 'GET')
+        self.assertEqual(entry['url'],
+                         'https://storage.scrapinghub.com/items/{id}/{id}/{id}')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['bytes_received'], 18)
+        self.assertEqual(entry['retries'], 1)
+        self.assertGreaterEqual(entry['time_ms'], entry['ttfb_ms'])
+        entry = tracer.record.call_args_list[1][0][0]
+        self.assertEqual((entry['method'], entry['bytes_sent']), ('POST', 3))
+
+        with patch('requests.adapters.HTTPAdapter.send',
+                   side_effect=requests.ConnectionError('refused')), \
+                patch('shub.utils.get_tracer', return_value=tracer):
+            with self.assertRaises(requests.ConnectionError):
+                session.get('https://app.zyte.com/api/run.json')
+        entry = tracer.record.call_args[0][0]
+        self.assertEqual(entry['error'], 'ConnectionError: refused')
+        self.assertIsNone(entry['status'])
+
+    def test_get_http_pool_size(self):
+        with patch.dict(os.environ, {'SHUB_HTTP_POOL_SIZE': ''}):
+            self.assertEqual(utils.get_http_pool_size(), utils.HTTP_POOL_SIZE)
+        for value in ('0', 'many'):
+            with patch.dict(os.environ, {'SHUB_HTTP_POOL_SIZE': value}):
+                with self.assertRaises(BadParameterException):
+                    utils.get_http_pool_size()
+
     @patch('shub.utils.time.sleep')
     def test_job_resource_iter(self, mock_sleep):
+        class JobMeta(dict):
+            def expire(self):
+                pass
+
         job = MagicMock(spec=['key', 'metadata', 'resource'])
         job.key = 'jobkey'
-        job.metadata = {'state': 'running'}
+        job.metadata = JobMeta(state='running')
 
         def make_items(iterable):
             return [json.dumps({'_key': x}) for x in iterable]
 
         def magic_iter(*args, **kwargs):
             """
-            Return two different iterators on the first two calls, set job's
-            state to 'finished' after the second call.
+            Return items on the first call, nothing on the second call, more
+            items on the third call (setting the job's state to 'finished'),
+            and nothing on the final call.
             """
             if magic_iter.stage == 0:
                 if 'startafter' in kwargs:
@@ -231,10 +491,18 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
                 return iter(make_items([1, 2, 3]))
             elif magic_iter.stage == 1:
                 self.assertEqual(kwargs['startafter'], 3)
-                magic_iter.stage = 0
-                job.metadata = {'state': 'finished'}
-                return iter(make_items([4, 5, 6]))
+                magic_iter.stage = 2
+                return iter([])
             elif magic_iter.stage == 2:
+                self.assertEqual(kwargs['startafter'], 3)
+                magic_iter.stage = 3
+                job.metadata = JobMeta(state='finished')
+                return iter(make_items([4, 5, 6]))
+            elif magic_iter.stage == 3:
+                self.assertEqual(kwargs['startafter'], 6)
+                magic_iter.stage = 0
+                return iter([])
+            elif magic_iter.stage == 4:
                 self.assertEqual(kwargs['startafter'], 'jobkey/996')
                 return iter([])
 
@@ -245,6 +513,8 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
                 follow=follow,
                 tail=tail,
                 output_json=True,
+                poll_min=2,
+                poll_max=8,
             ))
 
         job.resource.iter_json = magic_iter
@@ -255,16 +525,341 @@ class UtilsTest(AssertInvokeRaisesMixin, unittest.TestCase):
 
         magic_iter.stage = 0
         self.assertEqual(jri_result(True), make_items([1, 2, 3, 4, 5, 6]))
-        self.assertTrue(mock_sleep.called)
+        # Only the empty poll is followed by a delay
+        mock_sleep.assert_called_once_with(2)
 
         magic_iter.stage = 0
-        job.metadata = {'state': 'finished'}
+        job.metadata = JobMeta(state='finished')
         self.assertEqual(jri_result(True), make_items([1, 2, 3]))
 
-        magic_iter.stage = 2
+        magic_iter.stage = 4
         job.resource.stats.return_value = {'totals': {'input_values': 1000}}
         self.assertEqual(jri_result(True, tail=3), [])
 
+    @patch('shub.utils.time.sleep')
+    def test_jobs_resource_iter(self, mock_sleep):
+        class JobMeta(dict):
+            def expire(self):
+                pass
+
+        def make_job(key, state, responses):
+            job = MagicMock(spec=['key', 'metadata', 'items'])
+            job.key = key
+            job.metadata = JobMeta(state=state)
+            startafters = []
+
+            def iter_json(startafter=None):
+                startafters.append(startafter)
+                keys, new_state = responses.pop(0)
+                if new_state:
+                    job.metadata = JobMeta(state=new_state)
+                return iter([json.dumps({'_key': k}) for k in keys])
+
+            job.items.iter_json.side_effect = iter_json
+            return job, startafters
+
+        job_a, startafters_a = make_job('1/1/1', 'running', [
+            (['1/1/1/0'], None),
+            ([], None),
+            (['1/1/1/1'], 'finished'),
+            # Last poll after the job finished
+            ([], None),
+        ])
+        job_b, startafters_b = make_job('1/1/2', 'finished', [
+            (['1/1/2/0', '1/1/2/1'], None),
+        ])
+        result = [(job.key, entry['_key']) for job, entry in
+                  utils.jobs_resource_iter([job_a, job_b], 'items',
+                                           poll_min=2, poll_max=8)]
+        self.assertEqual(result, [
+            ('1/1/1', '1/1/1/0'),
+            ('1/1/2', '1/1/2/0'),
+            ('1/1/2', '1/1/2/1'),
+            ('1/1/1', '1/1/1/1'),
+        ])
+        self.assertEqual(startafters_a, [None, '1/1/1/0', '1/1/1/0',
+                                         '1/1/1/1'])
+        self.assertEqual(startafters_b, [None])
+        # Only the empty poll is followed by a delay
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 2, places=1)
+
+    @patch('shub.utils.time.sleep')
+    def test_job_resource_iter_follow_decodes_last_line_only(self, mock_sleep):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = 'jobkey'
+        job.metadata = {'state': 'running'}
+        batches = iter([
+            [json.dumps({'_key': f'jobkey/{x}'}) for x in range(3)],
+            [json.dumps({'_key': f'jobkey/{x}'}) for x in range(3, 5)],
+        ])
+
+        def iter_json(startafter=None):
+            try:
+                return iter(next(batches))
+            except StopIteration:
+                job.metadata = {'state': 'finished'}
+                return iter([])
+
+        job.resource.iter_json.side_effect = iter_json
+        with patch('shub.utils.job_live', side_effect=lambda job, **kw: (
+                job.metadata['state'] == 'running')), \
+                patch('shub.utils.json.loads', wraps=json.loads) as mock_loads:
+            result = list(utils.job_resource_iter(
+                job, job.resource, output_json=True, follow=True))
+        self.assertEqual(len(result), 5)
+        self.assertEqual(mock_loads.call_count, 2)
+        startafters = [c[1]['startafter']
+                       for c in job.resource.iter_json.call_args_list]
+        self.assertEqual(startafters[:3], [None, 'jobkey/2', 'jobkey/4'])
+
+    def test_job_resource_iter_cache(self):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = '1/2/3'
+        job.metadata = {'state': 'running'}
+        job.resource.resource_type = 'items'
+        lines = [json.dumps({'_key': f'1/2/3/{idx}'}) for idx in range(5)]
+        job.resource.iter_json.side_effect = lambda **kw: iter(lines)
+        job.resource.iter_values.side_effect = lambda **kw: (
+            json.loads(line) for line in lines)
+        job.resource.stats.return_value = {'totals': {'input_values': 5}}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            job_cache = JobCache(path=tmpdir)
+
+            def jri_result(**kwargs):
+                return list(utils.job_resource_iter(
+                    job, job.resource, follow=False, cache=job_cache,
+                    **kwargs))
+
+            # Running jobs are not cached
+            self.assertEqual(jri_result(output_json=True), lines)
+            self.assertIsNone(job_cache.get('1/2/3', 'items'))
+            # Neither are partial downloads
+            job.metadata = {'state': 'finished'}
+            jri_result(output_json=True, tail=2)
+            self.assertIsNone(job_cache.get('1/2/3', 'items'))
+            # Complete downloads of finished jobs are, even if not as JSON
+            self.assertEqual(jri_result(), [json.loads(x) for x in lines])
+            self.assertEqual(
+                list(job_cache.get('1/2/3', 'items').iter_lines()), lines)
+            # And they're then served from the cache
+            job.resource.reset_mock()
+            self.assertEqual(jri_result(output_json=True), lines)
+            self.assertEqual(jri_result(output_json=True, tail=2), lines[3:])
+            self.assertEqual(jri_result(tail=1), [json.loads(lines[4])])
+            self.assertEqual(jri_result(output_json=True,
+                                        startafter='1/2/3/2'), lines[3:])
+            self.assertFalse(job.resource.iter_json.called)
+            self.assertFalse(job.resource.stats.called)
+            # Truncated downloads are not cached
+            job_cache = JobCache(path=os.path.join(tmpdir, 'truncated'))
+            job.resource.stats.return_value = {'totals': {'input_values': 6}}
+            with patch('shub.utils.print_warning') as mock_warning:
+                self.assertEqual(jri_result(output_json=True), lines)
+            self.assertIn('Received 5 of 6 entries',
+                          mock_warning.call_args[0][0])
+            self.assertIsNone(job_cache.get('1/2/3', 'items'))
+            # Downloads go on if the cache cannot be written
+            job.resource.stats.return_value = {'totals': {'input_values': 5}}
+            not_a_dir = os.path.join(tmpdir, 'file')
+            open(not_a_dir, 'w').close()
+            job_cache = JobCache(path=os.path.join(not_a_dir, 'cache'))
+            with patch('shub.utils.print_warning') as mock_warning:
+                self.assertEqual(jri_result(output_json=True), lines)
+            self.assertIn('Cannot write to the job data cache',
+                          mock_warning.call_args[0][0])
+            job_cache = JobCache(path=os.path.join(tmpdir, 'full'))
+            with patch('shub.utils.print_warning') as mock_warning, \
+                    patch('shub.cache.CacheWriter.commit',
+                          side_effect=OSError(28, 'No space left')):
+                self.assertEqual(jri_result(output_json=True), lines)
+            self.assertIn('No space left', mock_warning.call_args[0][0])
+            self.assertIsNone(job_cache.get('1/2/3', 'items'))
+
+    def test_job_resource_iter_query(self):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = '1/2/3'
+        job.metadata = {'state': 'finished'}
+        job.resource.iter_json.return_value = iter(['{"_key": "1/2/3/4"}'])
+        job_cache = MagicMock()
+        query = {'filter': ['["a", "=", [1]]']}
+        result = list(utils.job_resource_iter(
+            job, job.resource, output_json=True, follow=False, parallel=4,
+            cache=job_cache, query=query))
+        self.assertEqual(result, ['{"_key": "1/2/3/4"}'])
+        job.resource.iter_json.assert_called_once_with(
+            startafter=None, filter=['["a", "=", [1]]'])
+        self.assertFalse(job_cache.get.called)
+        self.assertFalse(job.resource.stats.called)
+
+    def test_job_resource_iter_transport(self):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = '1/2/3'
+        job.metadata = {'state': 'finished'}
+        values = [{'_key': '1/2/3/0', 'a': 1}]
+        job.resource.iter_json.side_effect = lambda **kw: iter(
+            [json.dumps(value) for value in values])
+        job.resource.iter_values.side_effect = lambda **kw: iter(values)
+
+        def jri_result(output_json, transport):
+            job.resource.reset_mock()
+            return list(utils.job_resource_iter(
+                job, job.resource, output_json=output_json, follow=False,
+                transport=transport))
+
+        self.assertEqual(jri_result(False, 'auto'), values)
+        self.assertFalse(job.resource.iter_json.called)
+        self.assertEqual(jri_result(True, 'auto'), [json.dumps(values[0])])
+        self.assertFalse(job.resource.iter_values.called)
+        self.assertEqual(jri_result(False, 'json'), values)
+        self.assertFalse(job.resource.iter_values.called)
+        self.assertEqual(jri_result(True, 'msgpack'), [json.dumps(values[0])])
+        self.assertFalse(job.resource.iter_json.called)
+        # Ranges are fetched as JSON, whose downloads resume when retried
+        job.resource.stats.return_value = {'totals': {'input_values': 1}}
+        for kwargs in ({'stop': 1}, {'parallel': 2}):
+            job.resource.reset_mock()
+            self.assertEqual(list(utils.job_resource_iter(
+                job, job.resource, follow=False, transport='msgpack',
+                **kwargs)), values)
+            self.assertFalse(job.resource.iter_values.called)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            job.resource.resource_type = 'items'
+            job.resource.reset_mock()
+            job.resource.stats.return_value = {'totals': {'input_values': 1}}
+            job_cache = JobCache(path=tmpdir)
+            self.assertEqual(list(utils.job_resource_iter(
+                job, job.resource, follow=False, cache=job_cache,
+                transport='msgpack')), values)
+            self.assertEqual(list(job_cache.get('1/2/3', 'items').iter_lines()),
+                             [json.dumps(values[0])])
+
+    def test_build_resource_query(self):
+        self.assertEqual(utils.build_resource_query(), {})
+        query = utils.build_resource_query(
+            fields=('a,b', ' c'), filters=('["size", ">", [3]]',),
+            level='warning', start_time=datetime.datetime(2026, 1, 2),
+            end_time=datetime.datetime(2026, 1, 3))
+        self.assertEqual(query['fields'], ['a', 'b', 'c'])
+        self.assertEqual([json.loads(x) for x in query['filter']],
+                         [['size', '>', [3]], ['level', '>=', [30]]])
+        self.assertEqual(query['endts'] - query['startts'], 86400000)
+        for expr in ('size > 3', '["size", ">"]', '["size", ">", 3]'):
+            with self.assertRaises(BadParameterException):
+                utils.build_resource_query(filters=(expr,))
+
+    def test_job_resource_iter_parallel(self):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = 'jobkey'
+        job.metadata = {'state': 'finished'}
+        job.resource.stats.return_value = {'totals': {'input_values': 10}}
+
+        def iter_json(startafter=None, count=None, **query):
+            start = 0 if startafter is None else int(startafter.split('/')[-1]) + 1
+            # Stop short of 10 entries to make sure the range is capped
+            for idx in range(start, min(start + count + 1, 10)):
+                yield json.dumps({'_key': f'jobkey/{idx}'})
+
+        job.resource.iter_json.side_effect = iter_json
+
+        def jri_result(tail=None, startafter=None, **kwargs):
+            return [json.loads(x)['_key'] for x in utils.job_resource_iter(
+                job, job.resource, output_json=True, follow=False, tail=tail,
+                parallel=3, startafter=startafter, **kwargs
+            )]
+
+        with patch('shub.utils.PARALLEL_CHUNK_SIZE', 3):
+            self.assertEqual(jri_result(),
+                             [f'jobkey/{idx}' for idx in range(10)])
+            startafters = sorted(
+                (c[1]['startafter'] or '', c[1]['count'])
+                for c in job.resource.iter_json.call_args_list
+            )
+            self.assertEqual(startafters, [
+                ('', 3), ('jobkey/2', 3), ('jobkey/5', 3), ('jobkey/8', 1),
+            ])
+            self.assertEqual(jri_result(tail=4),
+                             [f'jobkey/{idx}' for idx in range(6, 10)])
+            self.assertEqual(jri_result(tail=20),
+                             [f'jobkey/{idx}' for idx in range(10)])
+            self.assertEqual(jri_result(startafter='jobkey/6'),
+                             [f'jobkey/{idx}' for idx in range(7, 10)])
+            self.assertEqual(jri_result(startafter='jobkey/1', stop=7),
+                             [f'jobkey/{idx}' for idx in range(2, 7)])
+            # Projections keep keys sequential, so they don't prevent
+            # parallel downloads
+            job.resource.iter_json.reset_mock()
+            jri_result(query={'fields': ['a']})
+            self.assertEqual(job.resource.iter_json.call_count, 4)
+            self.assertEqual(
+                job.resource.iter_json.call_args[1]['fields'], ['a'])
+
+    def test_job_resource_iter_stop(self):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = '1/2/3'
+        job.metadata = {'state': 'running'}
+        job.resource.iter_json.side_effect = lambda **kw: iter(
+            [json.dumps({'_key': f'1/2/3/{idx}'}) for idx in range(5, 10)])
+        result = list(utils.job_resource_iter(
+            job, job.resource, output_json=True, startafter='1/2/3/4',
+            stop=8))
+        self.assertEqual(len(result), 3)
+        job.resource.iter_json.assert_called_once_with(
+            startafter='1/2/3/4', count=3)
+
+    @patch('shub.utils.random.sample')
+    def test_job_resource_sample(self, mock_sample):
+        job = MagicMock(spec=['key', 'metadata', 'resource'])
+        job.key = 'jobkey'
+        job.metadata = {'state': 'finished'}
+        job.resource.resource_type = 'items'
+        job.resource.stats.return_value = {'totals': {'input_values': 1000}}
+
+        def iter_json(startafter=None, count=None):
+            start = 0 if startafter is None else int(startafter.split('/')[-1]) + 1
+            for idx in range(start, min(start + count, 1000)):
+                yield json.dumps({'_key': f'jobkey/{idx}'})
+
+        job.resource.iter_json.side_effect = iter_json
+        mock_sample.side_effect = lambda population, k: list(population)[-k:]
+
+        def sample_keys(**kwargs):
+            return [json.loads(x)['_key'] for x in utils.job_resource_sample(
+                job, job.resource, 25, output_json=True, range_size=10,
+                **kwargs)]
+
+        # Three ranges of ten entries are fetched, the first one drawn being
+        # cut to five entries
+        expected = [f'jobkey/{idx}' for idx in
+                    list(range(970, 975)) + list(range(980, 1000))]
+        self.assertEqual(sample_keys(), expected)
+        self.assertEqual(mock_sample.call_args[0][1], 3)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            job_cache = JobCache(path=tmpdir)
+            writer = job_cache.writer('jobkey', 'items')
+            for idx in range(1000):
+                writer.write(json.dumps({'_key': f'jobkey/{idx}'}))
+            writer.commit()
+            job.resource.reset_mock()
+            self.assertEqual(sample_keys(cache=job_cache), expected)
+            self.assertFalse(job.resource.iter_json.called)
+
+    def test_sample_ranges(self):
+        self.assertEqual(utils._sample_ranges(25, 100, 10),
+                         [(0, 10), (10, 20), (20, 25)])
+        for total, size in ((1000, 25), (1005, 30), (18, 15)):
+            ranges = utils._sample_ranges(total, size, 10)
+            self.assertEqual(ranges, sorted(ranges))
+            self.assertGreaterEqual(sum(stop - start for start, stop in ranges),
+                                    size)
+        # The sampled entries are spread uniformly over the resource
+        offsets = [offset for _ in range(2000)
+                   for start, stop in utils._sample_ranges(100000, 250, 100)
+                   for offset in range(start, stop)]
+        self.assertEqual(len(offsets), 2000 * 250)
+        self.assertAlmostEqual(sum(offsets) / len(offsets), 50000, delta=2500)
+
     @patch('shub.utils.requests.get', autospec=True)
     def test_latest_github_release(self, mock_get):
         with self.runner.isolated_filesystem():